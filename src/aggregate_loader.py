@@ -2,30 +2,25 @@
 """This is the main entry-point for running the ETL pipeline."""
 
 import argparse
+import gc
 import logging
 import multiprocessing
 import os
+import sys
 import time
 import coloredlogs
 import json
 
-from etl import (BGIETL, DOETL, ECOMAPETL, ETL, GOETL, MIETL, VEPETL,
-                 AffectedGenomicModelETL, AlleleETL, BiogridOrcsXrefETL,
-                 ClosureETL, ConstructETL, DiseaseETL, ExpressionAtlasETL,
-                 ExpressionETL, ExpressionRibbonETL, ExpressionRibbonOtherETL,
-                 GeneDescriptionsETL, GeneDiseaseOrthoETL, GenericOntologyETL,
-                 GeoXrefETL, GOAnnotETL, GeneticInteractionETL,
-                 MolecularInteractionETL, Neo4jHelper, NodeCountETL,
-                 OrthologyETL, ParalogyETL, PhenoTypeETL, SequenceTargetingReagentETL,
-                 SpeciesETL, TranscriptETL, VariationETL, VEPTranscriptETL,
-                 ProteinSequenceETL, HTPMetaDatasetSampleETL,
-                 HTPMetaDatasetETL, GenePhenoCrossReferenceETL,
-                 CategoryTagETL)
-
-from transactors import FileTransactor, Neo4jTransactor
+import etl as etl_package
+from etl import ETLHelper, Neo4jHelper
+
+from transactors import (AsyncNeo4jTransactor, CSVTransactor, FileTransactor, ImportTransactor, Neo4jTransactor,
+                         ParameterTransactor)
 
 from data_manager import DataFileManager
 from files import Download
+from scheduler import (CommitSizes, DeadLetterJournal, ETLScheduler, ProcessWaiter, QueryMetrics, RunManifest,
+                       TransactionJournal, TransactorQueue, WorkerPool)
 from loader_common import ContextInfo  # Must be the last timeport othersize program fails
 
 
@@ -43,6 +38,28 @@ def main():
                         '--verbose',
                         help='Enable DEBUG mode for logging.',
                         action='store_true')
+    parser.add_argument('-r',
+                        '--resume',
+                        help='Resume an interrupted load from its run manifest, skipping finished work.',
+                        action='store_true')
+    parser.add_argument('--resume-partial-loads',
+                        help='With --resume, run the ETLs that partly loaded rows again from the start, '
+                             'once what they loaded was deleted from the database.',
+                        action='store_true')
+    parser.add_argument('--replay-dead-letters',
+                        help='Only rerun the query batches of the dead letter journal, e.g. after fixing their cause.',
+                        action='store_true')
+    parser.add_argument('--bulk-import',
+                        help='Build a new database offline with neo4j-admin from the BULK_IMPORT_ETLS, '
+                             'then load the rest with --resume.',
+                        action='store_true')
+    parser.add_argument('--replay-journal',
+                        help='Only rerun the queries of the transaction journal against a fresh database, '
+                             'to benchmark Neo4j without the ETLs.',
+                        action='store_true')
+    parser.add_argument('--replay-threads',
+                        help='Neo4j transactor processes of --replay-journal, instead of the configured ones.',
+                        type=int)
     args = parser.parse_args()
 
     # set context info
@@ -74,90 +91,124 @@ class AggregateLoader():
 
     # This is the list of ETLs used for loading data.
     # The key (left) is derived from a value in the config YAML file.
-    # The value (right) is hard-coded by a developer as the name of an ETL class.
+    # 'etl' is hard-coded by a developer as the name of an ETL class. It is
+    # only imported by the process running the ETL, see run_etl.
+    # 'reads' lists the ETLs whose data must be loaded before this ETL starts
+    # ('*' means every ETL declared above it).
+    # 'locks' lists the node labels this ETL writes to heavily; ETLs sharing a
+    # lock never run at the same time.
+    # 'extract_ahead' marks ETLs that only read their input files while
+    # parsing, so they can write their CSV files early. Their other writes
+    # (e.g. ModFileMetadata) are held back until they are scheduled, see
+    # Neo4jHelper.set_submit_gate, so ETLs whose queries depend on such writes
+    # (e.g. the algorithm nodes of ORTHO and PARALOGY) are not flagged.
+    # Any ETL whose reads have finished and whose locks are free starts
+    # straight away, see ETLScheduler.
     etl_dispatch = {
-        'SPECIES': SpeciesETL,
-        'HTP': CategoryTagETL,
-        'MI': MIETL,  # Special case. Grouped under "Ontology" but has a unique ETL.
-        'DOID': DOETL,  # Special case. Grouped under "Ontology" but has a unique ETL.
-        'BGI': BGIETL,
-        'CONSTRUCT': ConstructETL,
-        'GENEEEXPRESSIONATLASSITEMAP': ExpressionAtlasETL,
-        'ONTOLOGY': GenericOntologyETL,
-        'ECOMAP': ECOMAPETL,
-        'ALLELE': AlleleETL,
-        'VARIATION': VariationETL,
-        'SQTR': SequenceTargetingReagentETL,
-        'AGM': AffectedGenomicModelETL,
-        'HTPDATASET': HTPMetaDatasetETL,
-        'HTPDATASAMPLE': HTPMetaDatasetSampleETL,
-        'PHENOTYPE': PhenoTypeETL,
-        'GFF': TranscriptETL,
-        'GO': GOETL,
-        'EXPRESSION': ExpressionETL,
-        'ExpressionRibbon': ExpressionRibbonETL,
-        'ExpressionRibbonOther': ExpressionRibbonOtherETL,
-        'DAF': DiseaseETL,
-        'ORTHO': OrthologyETL,
-        'PARALOGY' : ParalogyETL,
-        'Closure': ClosureETL,
-        'GAF': GOAnnotETL,
-        'GEOXREF': GeoXrefETL,
-        'BIOGRID-ORCS': BiogridOrcsXrefETL,
-        'GeneDiseaseOrtho': GeneDiseaseOrthoETL,
-        'INTERACTION-GEN': GeneticInteractionETL,
-        'INTERACTION-MOL': MolecularInteractionETL,
-        'GeneDescriptions': GeneDescriptionsETL,
-        'VEPGENE': VEPETL,
-        'VEPTRANSCRIPT': VEPTranscriptETL,
-        'DB-SUMMARY': NodeCountETL,
-        'ProteinSequence': ProteinSequenceETL,
-        'GENEPHENOCROSSREFERENCE': GenePhenoCrossReferenceETL
+        'SPECIES': {'etl': 'SpeciesETL', 'reads': [], 'locks': ['Species']},
+        'HTP': {'etl': 'CategoryTagETL', 'reads': [], 'locks': ['CategoryTag']},
+        # Special cases. Grouped under "Ontology" but have unique ETLs.
+        'DOID': {'etl': 'DOETL', 'reads': [], 'locks': ['DOTerm']},
+        'MI': {'etl': 'MIETL', 'reads': [], 'locks': ['MITerm']},
+        'GO': {'etl': 'GOETL', 'reads': [], 'locks': ['GOTerm']},
+        'ONTOLOGY': {'etl': 'GenericOntologyETL', 'reads': [], 'locks': ['Ontology']},
+        'ECOMAP': {'etl': 'ECOMAPETL', 'reads': ['ONTOLOGY'], 'locks': ['ECOTerm']},
+        'BGI': {'etl': 'BGIETL',
+                'reads': ['SPECIES', 'ONTOLOGY'],
+                'locks': ['Gene', 'Chromosome', 'Assembly', 'GenomicLocation'],
+                'extract_ahead': True},
+        'CONSTRUCT': {'etl': 'ConstructETL',
+                      'reads': ['BGI'],
+                      'locks': ['Construct'],
+                      'extract_ahead': True},
+        'ALLELE': {'etl': 'AlleleETL',
+                   'reads': ['BGI', 'CONSTRUCT'],
+                   'locks': ['Allele'],
+                   'extract_ahead': True},
+        'VARIATION': {'etl': 'VariationETL',
+                      'reads': ['ALLELE', 'ONTOLOGY'],
+                      'locks': ['Variant', 'Assembly', 'GenomicLocation', 'Publication'],
+                      'extract_ahead': True},
+        'SQTR': {'etl': 'SequenceTargetingReagentETL',
+                 'reads': ['BGI'],
+                 'locks': ['SequenceTargetingReagent'],
+                 'extract_ahead': True},
+        'AGM': {'etl': 'AffectedGenomicModelETL',
+                'reads': ['ALLELE', 'SQTR'],
+                'locks': ['AffectedGenomicModel'],
+                'extract_ahead': True},
+        'HTPDATASET': {'etl': 'HTPMetaDatasetETL',
+                       'reads': ['HTP'],
+                       'locks': ['HTPDataset', 'Publication'],
+                       'extract_ahead': True},
+        'HTPDATASAMPLE': {'etl': 'HTPMetaDatasetSampleETL',
+                          'reads': ['HTPDATASET', 'AGM', 'ONTOLOGY'],
+                          'locks': ['HTPDatasetSample', 'ExpressionBioEntity', 'Stage'],
+                          'extract_ahead': True},
+        'PHENOTYPE': {'etl': 'PhenoTypeETL',
+                      'reads': ['AGM', 'ONTOLOGY'],
+                      'locks': ['Gene', 'Phenotype', 'Publication'],
+                      'extract_ahead': True},
+        'DAF': {'etl': 'DiseaseETL',
+                'reads': ['AGM', 'DOID', 'ECOMAP'],
+                'locks': ['Gene', 'DiseaseEntityJoin', 'Publication'],
+                'extract_ahead': True},
+        'ORTHO': {'etl': 'OrthologyETL',
+                  'reads': ['BGI'],
+                  'locks': ['Gene', 'OrthologyGeneJoin']},
+        'PARALOGY': {'etl': 'ParalogyETL',
+                     'reads': ['BGI'],
+                     'locks': ['ParalogyGeneJoin']},
+        'GeneDiseaseOrtho': {'etl': 'GeneDiseaseOrthoETL',
+                             'reads': ['DAF', 'ORTHO'],
+                             'locks': ['DiseaseEntityJoin', 'Publication']},
+        'GFF': {'etl': 'TranscriptETL',
+                'reads': ['BGI', 'ONTOLOGY'],
+                'locks': ['Transcript', 'Chromosome', 'Assembly', 'GenomicLocation'],
+                'extract_ahead': True},
+        'EXPRESSION': {'etl': 'ExpressionETL',
+                       'reads': ['BGI', 'GO', 'ONTOLOGY'],
+                       'locks': ['ExpressionBioEntity', 'Stage', 'Publication']},
+        'ExpressionRibbon': {'etl': 'ExpressionRibbonETL',
+                             'reads': ['EXPRESSION', 'HTPDATASAMPLE'],
+                             'locks': ['ExpressionBioEntity']},
+        'ExpressionRibbonOther': {'etl': 'ExpressionRibbonOtherETL',
+                                  'reads': ['ExpressionRibbon'],
+                                  'locks': ['ExpressionBioEntity']},
+        'GENEEEXPRESSIONATLASSITEMAP': {'etl': 'ExpressionAtlasETL', 'reads': ['BGI'], 'locks': ['Gene']},
+        'GAF': {'etl': 'GOAnnotETL',
+                'reads': ['BGI', 'GO'],
+                'locks': ['Gene'],
+                'extract_ahead': True},
+        'GEOXREF': {'etl': 'GeoXrefETL', 'reads': ['BGI'], 'locks': ['Gene']},
+        'BIOGRID-ORCS': {'etl': 'BiogridOrcsXrefETL', 'reads': ['BGI'], 'locks': ['Gene']},
+        'INTERACTION-GEN': {'etl': 'GeneticInteractionETL',
+                            'reads': ['ALLELE', 'MI', 'ONTOLOGY'],
+                            'locks': ['InteractionGeneJoin', 'Publication']},
+        'INTERACTION-MOL': {'etl': 'MolecularInteractionETL',
+                            'reads': ['BGI', 'MI'],
+                            'locks': ['InteractionGeneJoin', 'Publication']},
+        'Closure': {'etl': 'ClosureETL',
+                    'reads': ['GO', 'DOID', 'ONTOLOGY'],
+                    'locks': ['Ontology', 'GOTerm', 'DOTerm']},
+        'GeneDescriptions': {'etl': 'GeneDescriptionsETL',
+                             'reads': ['GAF', 'DAF', 'GeneDiseaseOrtho', 'ORTHO', 'EXPRESSION', 'Closure'],
+                             'locks': ['Gene']},
+        'VEPGENE': {'etl': 'VEPETL',
+                    'reads': ['VARIATION'],
+                    'locks': ['Variant'],
+                    'extract_ahead': True},
+        'VEPTRANSCRIPT': {'etl': 'VEPTranscriptETL',
+                          'reads': ['VARIATION', 'GFF'],
+                          'locks': ['Variant', 'Transcript'],
+                          'extract_ahead': True},
+        'ProteinSequence': {'etl': 'ProteinSequenceETL',
+                            'reads': ['GFF', 'VARIATION', 'VEPTRANSCRIPT'],
+                            'locks': ['Transcript']},
+        'GENEPHENOCROSSREFERENCE': {'etl': 'GenePhenoCrossReferenceETL', 'reads': ['PHENOTYPE'], 'locks': ['Gene']},
+        'DB-SUMMARY': {'etl': 'NodeCountETL', 'reads': ['*'], 'locks': []}
     }
 
-    # This is the order in which data types are loaded.
-    # After each list, the loader will "pause" and wait for that item to finish.
-    # i.e. After Ontology, there will be a pause.
-    # After GO, DO, MI, there will be a pause, etc.
-    etl_groups = [
-        ['SPECIES'],
-        ['HTP'],
-        ['DOID', 'MI'],
-        ['GO'],
-        ['ONTOLOGY'],
-        ['ECOMAP'],
-        ['BGI'],
-        ['CONSTRUCT'],
-        ['ALLELE'],
-        ['VARIATION'],
-        ['SQTR'],
-        ['AGM'],
-        ['HTPDATASET'],
-        ['HTPDATASAMPLE'],
-        ['PHENOTYPE'],  # Locks Genes
-        ['DAF'],  # Locks Genes
-        ['ORTHO'],  # Locks Genes
-        ['PARALOGY'],
-        ['GeneDiseaseOrtho'],
-        ['GFF'],
-        ['EXPRESSION'],
-        ['ExpressionRibbon'],
-        ['ExpressionRibbonOther'],
-        ['GENEEEXPRESSIONATLASSITEMAP'],
-        ['GAF'],  # Locks Genes
-        ['GEOXREF'],  # Locks Genes
-        ['BIOGRID-ORCS'],  # Locks Genes
-        ['INTERACTION-GEN'],
-        ['INTERACTION-MOL'],
-        ['Closure'],
-        ['GeneDescriptions'],
-        ['VEPGENE'],
-        ['VEPTRANSCRIPT'],
-        ['ProteinSequence'],
-        ['GENEPHENOCROSSREFERENCE'],
-        ['DB-SUMMARY']
-    ]
-
     def __init__(self, args, logger, context_info):
         """Initialise object."""
         self.args = args
@@ -186,35 +237,191 @@ class AggregateLoader():
             self.logger.warning('REDOWNLOAD_FROM_FMS set to True, re-downloading all FMS files.')
 
     @classmethod
-    def run_etl_groups(cls, logger, data_manager, neo_transactor):
-        """Run each of the ETLs in parallel."""
+    def get_etl_class(cls, etl_name):
+        """Import the ETL class of etl_name."""
+        return getattr(etl_package, cls.etl_dispatch[etl_name]['etl'])
+
+    @classmethod
+    def preload_etls(cls, logger, data_manager):
+        """Load what the ETL processes share once, before they are forked.
+
+        The ETL modules configured for this load (with the libraries they use)
+        and the resource descriptors are loaded here, so the ETL processes
+        inherit them instead of each loading its own copy. gc.freeze() then
+        moves everything to the permanent generation: garbage collection in
+        the ETL processes never writes to, and so never copies, those pages.
+        """
+        for etl_name in cls.etl_dispatch:
+            if data_manager.get_config(etl_name) is not None:
+                logger.debug("Preloading ETL: %s" % etl_name)
+                cls.get_etl_class(etl_name)
+        ETLHelper.rdh2.get_data()
+        gc.collect()
+        gc.freeze()
+        logger.info("Preloaded ETLs, objects shared with the ETL processes: %s" % gc.get_freeze_count())
+
+    @classmethod
+    def run_etl(cls, etl_name, config, priority, submit_gate=None):
+        """Run a single ETL, tracking its query batches under its name."""
+        Neo4jTransactor.set_batch_owner(etl_name, submit_gate, priority)
+        Neo4jHelper.set_submit_gate(submit_gate)
+        ParameterTransactor.select(etl_name)
+        ImportTransactor.select(etl_name)
+        etl = cls.get_etl_class(etl_name)(config)
+        etl.run_etl()
+
+    @classmethod
+    def start_etl(cls, etl_name, config, priority, submit_gate=None):
+        """Start an ETL in its own process.
+
+        The ETL class is imported in that process, so the loader itself never
+        loads the ETL modules and their libraries.
+        """
+        process = multiprocessing.Process(target=cls.run_etl, args=(etl_name, config, priority, submit_gate))
+        process.start()
+        return process
+
+    @staticmethod
+    def get_batch_priority(scheduler, etl_name):
+        """Query batches of ETLs that others wait for go ahead of the rest."""
+        if scheduler.is_waited_on(etl_name):
+            return TransactorQueue.HIGH
+        return TransactorQueue.LOW
+
+    @classmethod
+    def run_etl_groups(cls, logger, data_manager, neo_transactor, manifest):
+        """Run the ETLs in parallel as soon as their dependencies and locks allow.
+
+        ETLs flagged 'extract_ahead' only read their input files while parsing,
+        so up to ETL_EXTRACT_AHEAD of them start before they are ready: they
+        parse and write their CSV files while earlier ETLs are loading, and
+        their query batches are held back until the scheduler starts them.
+        """
         etl_time_tracker_list = []
-        for etl_group in cls.etl_groups:
-            etl_group_start_time = time.time()
-            logger.info("Starting ETL group: %s" % etl_group)
-            thread_pool = []
-            for etl_name in etl_group:
-                logger.info("ETL Name: %s" % etl_name)
+        etl_durations = {}
+        etl_start_times = {}
+        thread_pool = {}
+        submit_gates = {}
+        extracted_early = set()
+        loading = []
+        extract_ahead = int(ContextInfo().env["ETL_EXTRACT_AHEAD"])
+
+        scheduler = ETLScheduler(cls.etl_dispatch)
+        for etl_name in manifest.finished_etls:
+            if etl_name in cls.etl_dispatch:
+                logger.info("Skipping ETL finished in the previous run: %s" % etl_name)
+                scheduler.finish(etl_name)
+
+        while not scheduler.is_finished():
+            finished_count = len(scheduler.finished)
+            for etl_name in scheduler.get_ready_etls():
+                if etl_name in submit_gates:
+                    logger.info("Starting loading of extracted ETL: %s" % etl_name)
+                    submit_gates.pop(etl_name).set()
+                    scheduler.start(etl_name)
+                    etl_start_times[etl_name] = time.time()
+                    if etl_name in extracted_early:
+                        extracted_early.remove(etl_name)
+                        RunManifest.record('etl_extracted', etl=etl_name)
+                        loading.append(etl_name)
+                    continue
+
+                if etl_name in manifest.extracted_etls:
+                    query_batch = manifest.get_unacknowledged_batch(etl_name)
+                    if query_batch is not None:
+                        logger.info("Replaying %s unacknowledged queries for: %s" % (len(query_batch), etl_name))
+                        Neo4jTransactor.set_batch_owner(etl_name, priority=cls.get_batch_priority(scheduler, etl_name))
+                        if query_batch:
+                            neo_transactor.execute_query_batch(query_batch)
+                        scheduler.start(etl_name)
+                        etl_start_times[etl_name] = time.time()
+                        loading.append(etl_name)
+                        continue
+
                 config = data_manager.get_config(etl_name)
-                if config is not None:
-                    etl = cls.etl_dispatch[etl_name](config)
-                    process = multiprocessing.Process(target=etl.run_etl)
-                    process.start()
-                    thread_pool.append(process)
-                else:
+                if config is None:
                     logger.info("No Config found for: %s" % etl_name)
-            ETL.wait_for_threads(thread_pool)
-
-            logger.info("Waiting for Queues to sync up")
-            neo_transactor.check_for_thread_errors()
-            neo_transactor.wait_for_queues()
-            etl_elapsed_time = time.time() - etl_group_start_time
-            etl_time_message = ("Finished ETL group: %s, Elapsed time: %s"
-                                % (etl_group,
-                                   time.strftime("%H:%M:%S", time.gmtime(etl_elapsed_time))))
-
-            logger.info(etl_time_message)
-            etl_time_tracker_list.append(etl_time_message)
+                    scheduler.finish(etl_name)
+                    continue
+                logger.info("Starting ETL: %s" % etl_name)
+                manifest.restart_etl(etl_name)
+                thread_pool[etl_name] = cls.start_etl(etl_name, config, cls.get_batch_priority(scheduler, etl_name))
+                scheduler.start(etl_name)
+                etl_start_times[etl_name] = time.time()
+
+            for etl_name in scheduler.get_upcoming_etls():
+                if len(submit_gates) >= extract_ahead:
+                    break
+                if not cls.etl_dispatch[etl_name].get('extract_ahead') \
+                        or etl_name in submit_gates or etl_name in manifest.extracted_etls:
+                    continue
+                config = data_manager.get_config(etl_name)
+                if config is None:
+                    continue
+                logger.info("Starting extraction ahead of loading for ETL: %s" % etl_name)
+                manifest.restart_etl(etl_name)
+                submit_gates[etl_name] = multiprocessing.Event()
+                thread_pool[etl_name] = cls.start_etl(etl_name, config,
+                                                      cls.get_batch_priority(scheduler, etl_name),
+                                                      submit_gates[etl_name])
+
+            for process in neo_transactor.thread_pool:
+                if process.exitcode is None:
+                    continue
+                # Transactors only stop at shutdown; without them the queued batches never finish.
+                logger.critical("Neo4jTransactor %s stopped, exit code: %s" % (process.name, process.exitcode))
+                for running_process in list(thread_pool.values()) + neo_transactor.thread_pool:
+                    running_process.terminate()
+                sys.exit(-1)
+
+            for etl_name, process in list(thread_pool.items()):
+                if process.exitcode is None:
+                    continue
+                if process.exitcode != 0:
+                    logger.critical("ETL %s failed, exit code: %s" % (etl_name, process.exitcode))
+                    for running_process in thread_pool.values():
+                        running_process.terminate()
+                    sys.exit(-1)
+                process.join()
+                del thread_pool[etl_name]
+                if etl_name in submit_gates:
+                    # Extracted without any query batches; it still waits for its turn.
+                    extracted_early.add(etl_name)
+                    continue
+                RunManifest.record('etl_extracted', etl=etl_name)
+                logger.info("Waiting for Queues to sync up for: %s" % etl_name)
+                loading.append(etl_name)
+
+            # Cleared before checking, so a batch finishing after the check wakes us up again.
+            Neo4jTransactor.batch_finished.clear()
+            for etl_name in list(loading):
+                if neo_transactor.has_pending_batches(etl_name):
+                    continue
+                loading.remove(etl_name)
+                scheduler.finish(etl_name)
+                RunManifest.record('etl_finished', etl=etl_name)
+                etl_durations[etl_name] = time.time() - etl_start_times[etl_name]
+                etl_time_message = ("Finished ETL: %s, Elapsed time: %s"
+                                    % (etl_name,
+                                       time.strftime("%H:%M:%S", time.gmtime(etl_durations[etl_name]))))
+                logger.info(etl_time_message)
+                logger.info("Neo4j query batches: %s" % Neo4jTransactor.get_queue_stats())
+                etl_time_tracker_list.append(etl_time_message)
+
+            if len(scheduler.finished) == finished_count:
+                # Nothing new can start, so wake up as soon as an ETL or a transactor exits
+                # or a query batch finishes.
+                ProcessWaiter.wait(list(thread_pool.values()) + neo_transactor.thread_pool,
+                                   [Neo4jTransactor.batch_finished])
+
+        neo_transactor.check_for_thread_errors()
+        neo_transactor.wait_for_queues()
+        etl_time_tracker_list.append("Neo4j query batches: %s" % Neo4jTransactor.get_queue_stats())
+
+        critical_path, critical_path_time = scheduler.critical_path(etl_durations)
+        etl_time_tracker_list.append("Critical path: %s, Elapsed time: %s"
+                                     % (" -> ".join(critical_path),
+                                        time.strftime("%H:%M:%S", time.gmtime(critical_path_time))))
 
         return etl_time_tracker_list
 
@@ -226,6 +433,106 @@ class AggregateLoader():
 
         data_manager = DataFileManager(self.context_info.config_file_location)
 
+        if self.args.replay_dead_letters:
+            self.replay_dead_letters(data_manager)
+            return
+
+        if self.args.bulk_import:
+            self.run_bulk_import(data_manager)
+            return
+
+        if self.args.replay_journal:
+            self.replay_transaction_journal(data_manager)
+            return
+
+        dead_letters = DeadLetterJournal('tmp/dead_letters.jsonl', keep=self.args.resume)
+        manifest = RunManifest('tmp/run_manifest.jsonl', resume=self.args.resume)
+        if manifest.resumed:
+            self.check_partial_loads(manifest)
+        if self.context_info.env["TRANSACTION_JOURNAL"] or self.context_info.env["USING_PICKLE"]:
+            TransactionJournal('tmp/transaction_journal.jsonl', keep=self.args.resume)
+        QueryMetrics('tmp/query_metrics.jsonl', keep=self.args.resume)
+
+        if not manifest.resumed:
+            self.load_release_info(data_manager)
+
+        self.download_files(data_manager)
+
+        CommitSizes.load('tmp/commit_sizes.jsonl', int(self.context_info.env["NEO4J_COMMIT_SECONDS"]))
+        neo_transactor = self.get_neo_transactor()
+        neo_transactor.start_threads(data_manager.get_neo_transactor_thread_settings())
+
+        self.logger.debug("finished starting neo threads ")
+
+        defer_indices = self.context_info.env["NEO4J_DEFER_INDEXES"]
+        if not self.context_info.env["USING_PICKLE"]:
+            self.logger.info("Creating indices.")
+            Neo4jHelper.create_indices(include_deferred=not defer_indices)
+
+        for query in manifest.get_deferred_queries():
+            Neo4jHelper().run_single_query_no_return(query)
+            RunManifest.record('query_acknowledged', query=RunManifest.get_query_key(query, ''))
+
+        WorkerPool.set_size(data_manager.get_etl_worker_process_settings())
+        WorkerPool.set_memory_budget(data_manager.get_etl_memory_budget_settings(), 'tmp/sub_type_memory.jsonl')
+        ParameterTransactor.set_etl_names(data_manager.get_parameter_load_settings())
+        CSVTransactor.set_chunk_rows(int(self.context_info.env["CSV_CHUNK_ROWS"]))
+        CSVTransactor.set_compression_level(int(self.context_info.env["CSV_COMPRESSION_LEVEL"]))
+        CSVTransactor.set_dedup(self.context_info.env["CSV_DEDUP"])
+
+        if self.context_info.env["ETL_PRELOAD"]:
+            self.preload_etls(self.logger, data_manager)
+
+        etl_time_tracker_list = self.run_etl_groups(self.logger, data_manager, neo_transactor, manifest)
+
+        neo_transactor.shutdown()
+
+        if defer_indices and not self.context_info.env["USING_PICKLE"]:
+            self.logger.info("Creating deferred indices.")
+            Neo4jHelper.create_indices()
+
+        elapsed_time = time.time() - self.start_time
+
+        for time_item in etl_time_tracker_list:
+            self.logger.info(time_item)
+
+        self.report_query_metrics()
+        self.logger.info('Loader finished. Elapsed time: %s' % time.strftime("%H:%M:%S", time.gmtime(elapsed_time)))
+        self.report_dead_letters(dead_letters)
+
+    def check_partial_loads(self, manifest):
+        """Stop if resuming would write rows again that an ETL already loaded, see RunManifest.get_unsafe_queries.
+
+        With --resume-partial-loads, those ETLs run again from the start instead.
+        """
+        partial_etls = []
+        for etl_name in self.etl_dispatch:
+            if etl_name in manifest.finished_etls:
+                continue
+            unsafe_queries = manifest.get_unsafe_queries(etl_name)
+            if not unsafe_queries:
+                continue
+            if self.args.resume_partial_loads:
+                self.logger.warning("Running %s again from the start, what it loaded was deleted." % etl_name)
+                manifest.clear_etl(etl_name)
+                continue
+            self.logger.critical("%s partly loaded %s queries whose rows would be written twice, e.g. from file %s"
+                                 % (etl_name, len(unsafe_queries), unsafe_queries[0][1]))
+            partial_etls.append(etl_name)
+        if partial_etls:
+            self.logger.critical("Can not resume without duplicating what %s loaded. Start a new load, or delete "
+                                 "what they loaded and resume with --resume-partial-loads." % ", ".join(partial_etls))
+            sys.exit(-1)
+
+    def get_neo_transactor(self):
+        """Return the Neo4jTransactor to load with, an AsyncNeo4jTransactor if NEO4J_ASYNC_BATCHES is set."""
+        batches_in_flight = int(self.context_info.env["NEO4J_ASYNC_BATCHES"])
+        if batches_in_flight > 0:
+            return AsyncNeo4jTransactor(batches_in_flight)
+        return Neo4jTransactor()
+
+    def load_release_info(self, data_manager):
+        """Create the AllianceReleaseInfo node."""
         metadata = data_manager.get_release_info()
         fields = []
         for k in metadata:
@@ -233,6 +540,8 @@ class AggregateLoader():
         load_rel = "CREATE (o:AllianceReleaseInfo {" + ",".join(fields) + "})"
         Neo4jHelper().run_single_query_no_return(load_rel)
 
+    def download_files(self, data_manager):
+        """Download and validate the input files of the load."""
         file_transactor = FileTransactor()
         file_transactor.start_threads(data_manager.get_file_transactor_thread_settings())
 
@@ -246,25 +555,145 @@ class AggregateLoader():
         self.logger.debug("finished queues, waiting for shutdown")
         file_transactor.shutdown()
 
-        neo_transactor = Neo4jTransactor()
+    def run_bulk_import(self, data_manager):
+        """Build a new database offline from the BULK_IMPORT_ETLS, see ImportTransactor.
+
+        Neo4j must be stopped. Everything that can not be imported is recorded
+        in the run manifest and loaded, with all other ETLs, by a --resume run.
+        """
+        DeadLetterJournal('tmp/dead_letters.jsonl')
+        RunManifest('tmp/run_manifest.jsonl')
+        Neo4jHelper.deferred = True
+        Neo4jTransactor.defer_batches = True
+
+        self.load_release_info(data_manager)
+        self.download_files(data_manager)
+
+        WorkerPool.set_size(data_manager.get_etl_worker_process_settings())
+        WorkerPool.set_memory_budget(data_manager.get_etl_memory_budget_settings(), 'tmp/sub_type_memory.jsonl')
+        etl_names = [etl_name for etl_name in data_manager.get_bulk_import_settings()
+                     if etl_name in self.etl_dispatch and data_manager.get_config(etl_name) is not None]
+        ImportTransactor.set_etl_names(etl_names, [self.get_etl_class(etl_name) for etl_name in etl_names])
+        # The files that can not be imported wait in tmp for the --resume run.
+        CSVTransactor.set_compression_level(int(self.context_info.env["CSV_COMPRESSION_LEVEL"]))
+
+        processes = []
+        for etl_name in etl_names:
+            self.logger.info("Starting ETL for bulk import: %s" % etl_name)
+            processes.append(self.start_etl(etl_name, data_manager.get_config(etl_name), TransactorQueue.LOW))
+        ProcessWaiter.wait_for_processes(processes)
+        for etl_name in etl_names:
+            RunManifest.record('etl_extracted', etl=etl_name)
+
+        ImportTransactor.build_store(self.context_info.env["NEO4J_ADMIN_COMMAND"], self.context_info.env["NEO4J_IMPORT_DIR"])
+        self.logger.info("Bulk import finished. Start Neo4j and run the loader with --resume to load the rest.")
+
+    def report_query_metrics(self):
+        """Log the query templates taking the most time, and keep the report next to the metrics."""
+        report = QueryMetrics.get_report(QueryMetrics.file_name)
+        for line in report:
+            self.logger.info(line)
+        with open(os.path.splitext(QueryMetrics.file_name)[0] + '_report.txt', 'w', encoding='utf-8') as report_file:
+            report_file.write("\n".join(report) + "\n")
+
+    def report_dead_letters(self, dead_letters):
+        """Log the query batches that failed for good, if any."""
+        entries = dead_letters.get_entries(dead_letters.file_name)
+        if not entries:
+            return
+        for (etl_name, query_batch, error) in entries:
+            self.logger.critical("%s: %s queries not loaded, starting with file %s: %s"
+                                 % (etl_name, len(query_batch), query_batch[0][1], error))
+        self.logger.critical("%s query batches failed, see %s. Fix the cause and rerun them with --replay-dead-letters."
+                             % (len(entries), dead_letters.file_name))
+
+    def replay_dead_letters(self, data_manager):
+        """Rerun the query batches of the dead letter journal."""
+        dead_letters = DeadLetterJournal('tmp/dead_letters.jsonl', keep=True)
+        entries = dead_letters.take_entries()
+        self.logger.info("Replaying %s dead letter query batches." % len(entries))
+
+        CommitSizes.load('tmp/commit_sizes.jsonl', int(self.context_info.env["NEO4J_COMMIT_SECONDS"]))
+        neo_transactor = self.get_neo_transactor()
         neo_transactor.start_threads(data_manager.get_neo_transactor_thread_settings())
-
-        self.logger.debug("finished starting neo threads ")
-
-        if not self.context_info.env["USING_PICKLE"]:
-            self.logger.info("Creating indices.")
-            Neo4jHelper.create_indices()
-
-        etl_time_tracker_list = self.run_etl_groups(self.logger, data_manager, neo_transactor)
-
+        for (etl_name, query_batch, error) in entries:
+            # Queries with their rows (from the ParameterTransactor) need no CSV file.
+            missing_files = [query[1] for query in query_batch
+                             if Neo4jTransactor.get_query_rows(query)[0] is None
+                             and not os.path.exists(os.path.join('tmp', query[1]))]
+            if missing_files:
+                self.logger.critical("Can not replay %s, missing CSV files: %s" % (etl_name, missing_files))
+                DeadLetterJournal.record(etl_name, query_batch, error)
+                continue
+            Neo4jTransactor.set_batch_owner(etl_name)
+            neo_transactor.execute_query_batch(query_batch)
+
+        neo_transactor.check_for_thread_errors()
+        neo_transactor.wait_for_queues()
         neo_transactor.shutdown()
-
-        elapsed_time = time.time() - self.start_time
-
-        for time_item in etl_time_tracker_list:
-            self.logger.info(time_item)
-
-        self.logger.info('Loader finished. Elapsed time: %s' % time.strftime("%H:%M:%S", time.gmtime(elapsed_time)))
+        self.report_dead_letters(dead_letters)
+
+    def replay_transaction_journal(self, data_manager):
+        """Rerun the queries of the transaction journal against a fresh database.
+
+        Every ETL's query batches are submitted in their journal order once
+        the ETLs it reads from are loaded, with the commit sizes they ran
+        with, so loads can be reproduced and timed exactly.
+        """
+        entries = TransactionJournal.get_entries('tmp/transaction_journal.jsonl')
+        changed_files = TransactionJournal.get_changed_files(entries)
+        if changed_files:
+            self.logger.critical("Can not replay the transaction journal, missing or changed CSV files: %s" % changed_files)
+            sys.exit(-1)
+        etl_batches = TransactionJournal.get_batches(entries)
+        thread_count = self.args.replay_threads or data_manager.get_neo_transactor_thread_settings()
+        self.logger.info("Replaying %s queries with %s transactors." % (len(entries), thread_count))
+
+        # Keep the commit sizes the queries ran with.
+        CommitSizes.load(None, 0)
+        QueryMetrics('tmp/replay_metrics.jsonl')
+        neo_transactor = self.get_neo_transactor()
+        neo_transactor.start_threads(thread_count)
+        Neo4jHelper.create_indices()
+
+        start_time = time.time()
+        for etl_name in etl_batches:
+            if etl_name not in self.etl_dispatch:
+                self.logger.info("Replaying queries of %s first" % etl_name)
+                Neo4jTransactor.set_batch_owner(etl_name)
+                for query_batch in etl_batches[etl_name]:
+                    neo_transactor.execute_query_batch(query_batch)
+        neo_transactor.wait_for_queues()
+
+        scheduler = ETLScheduler(self.etl_dispatch)
+        etl_start_times = {}
+        while not scheduler.is_finished():
+            Neo4jTransactor.batch_finished.clear()
+            for etl_name in scheduler.get_ready_etls():
+                Neo4jTransactor.set_batch_owner(etl_name)
+                for query_batch in etl_batches.get(etl_name, []):
+                    neo_transactor.execute_query_batch(query_batch)
+                scheduler.start(etl_name)
+                etl_start_times[etl_name] = time.time()
+
+            for etl_name in list(etl_start_times):
+                if neo_transactor.has_pending_batches(etl_name):
+                    continue
+                scheduler.finish(etl_name)
+                elapsed_time = time.time() - etl_start_times.pop(etl_name)
+                if etl_name in etl_batches:
+                    self.logger.info("Replayed ETL: %s, Elapsed time: %s"
+                                     % (etl_name, time.strftime("%H:%M:%S", time.gmtime(elapsed_time))))
+
+            if not scheduler.is_finished() and not scheduler.get_ready_etls():
+                ProcessWaiter.wait([], [Neo4jTransactor.batch_finished])
+
+        neo_transactor.check_for_thread_errors()
+        neo_transactor.wait_for_queues()
+        neo_transactor.shutdown()
+        elapsed_time = time.time() - start_time
+        self.report_query_metrics()
+        self.logger.info('Replay finished. Elapsed time: %s' % time.strftime("%H:%M:%S", time.gmtime(elapsed_time)))
 
 
 if __name__ == '__main__':
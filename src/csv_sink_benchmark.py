@@ -0,0 +1,109 @@
+"""Microbenchmark of the CSV sink.
+
+Writes the same generated rows, shaped like those of the ExpressionETL
+(17 files, repetitive URLs and prefixes), twice: the way save_file_static
+wrote them before, with csv.DictWriter in the generator's thread, and with
+CSVTransactor.save_chunk_static, which hands them to CSVFileWriter threads.
+The generator spends --parse-ms per batch on the CPU, standing in for
+parsing, so the time the writes still add to it is shown too.
+No neo4j database is needed.
+"""
+
+import argparse
+from contextlib import ExitStack
+import csv
+import gzip
+import os
+import tempfile
+import time
+
+from transactors import CSVTransactor
+
+
+def get_generators(batches, batch_size, files, parse_seconds):
+    """Yield batches with batch_size rows for each of files files."""
+    for batch in range(batches):
+        deadline = time.process_time() + parse_seconds
+        while time.process_time() < deadline:
+            pass
+        entry = []
+        for index in range(files):
+            entry.append([{'primaryId': 'ZFIN:ZDB-GENE-%s-%s' % (batch, row),
+                           'uuid': '%s-%s-%s' % (index, batch, row),
+                           'pubPrimaryKey': 'PMID:%s' % (10000000 + row),
+                           'pubModUrl': 'https://zfin.org/ZDB-PUB-%s-%s' % (batch, row),
+                           'stageName': 'Adult',
+                           'whereExpressedStatement': 'whole organism',
+                           'order': row} for row in range(batch_size)] + [None])
+        yield entry
+
+
+def save_with_dict_writer(generator, file_names, compression_level):
+    """Write the rows the way save_file_static did, in the generator's thread."""
+    with ExitStack() as stack:
+        open_files = []
+        for file_name in file_names:
+            path = os.path.join('tmp', file_name)
+            if compression_level > 0:
+                open_files.append(stack.enter_context(gzip.open(path, 'wt', compresslevel=compression_level,
+                                                                encoding='utf-8')))
+            else:
+                open_files.append(stack.enter_context(open(path, 'w', encoding='utf-8')))
+        writers = [None] * len(open_files)
+        for generator_entry in generator:
+            for index, individual_list in enumerate(generator_entry):
+                individual_list = [x for x in individual_list if x is not None]
+                if len(individual_list) == 0:
+                    continue
+                if writers[index] is None:
+                    writers[index] = csv.DictWriter(open_files[index], fieldnames=list(individual_list[0]),
+                                                    quoting=csv.QUOTE_NONNUMERIC)
+                    writers[index].writeheader()
+                writers[index].writerows(individual_list)
+
+
+def main():
+    """Entry point of the CSV sink benchmark."""
+    parser = argparse.ArgumentParser(description='Compare writing CSV files with DictWriter and with writer threads.')
+    parser.add_argument('--batches', type=int, default=50, help='Generator batches.')
+    parser.add_argument('--batch-size', type=int, default=2000, help='Rows per file and batch.')
+    parser.add_argument('--files', type=int, default=17, help='CSV files written at once.')
+    parser.add_argument('--parse-ms', type=float, default=20, help='CPU time the generator spends per batch.')
+    parser.add_argument('--compression-level', type=int, default=0, help='gzip level, 0 for plain CSV files.')
+    args = parser.parse_args()
+
+    parse_seconds = args.parse_ms / 1000.0
+    extension = '.csv.gz' if args.compression_level > 0 else '.csv'
+    file_names = ['benchmark_%s%s' % (index, extension) for index in range(args.files)]
+    CSVTransactor.set_compression_level(args.compression_level)
+    rows = args.batches * args.batch_size * args.files
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        os.makedirs('tmp')
+
+        start = time.time()
+        for _ in get_generators(args.batches, args.batch_size, args.files, parse_seconds):
+            pass
+        generate_seconds = time.time() - start
+
+        start = time.time()
+        save_with_dict_writer(get_generators(args.batches, args.batch_size, args.files, parse_seconds),
+                              file_names, args.compression_level)
+        dict_writer_seconds = time.time() - start
+        sizes = sum(os.path.getsize(os.path.join('tmp', file_name)) for file_name in file_names)
+
+        start = time.time()
+        CSVTransactor.save_chunk_static(get_generators(args.batches, args.batch_size, args.files, parse_seconds),
+                                        [['', file_name] for file_name in file_names])
+        writer_thread_seconds = time.time() - start
+
+    print("%s rows in %s files, %.1f MB written" % (rows, args.files, sizes / 1024.0 / 1024.0))
+    print("generating and parsing only: %.2fs" % generate_seconds)
+    for name, seconds in [('DictWriter', dict_writer_seconds), ('writer threads', writer_thread_seconds)]:
+        print("%-15s %.2fs, %.0f rows/s, %.2fs on top of parsing"
+              % (name + ':', seconds, rows / seconds, seconds - generate_seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -45,6 +45,17 @@ class DataFileManager(metaclass=Singleton):
         # Assign values for thread counts.
         self.file_transactor_threads = int(context_info.env["FILE_TRANSACTOR_THREADS"])
         self.neo4j_transactor_threads = int(context_info.env["NEO4J_TRANSACTOR_THREADS"])
+        # 0 means one sub-type worker process per CPU.
+        self.etl_worker_processes = int(context_info.env["ETL_WORKER_PROCESSES"]) or os.cpu_count()
+        # 0 means three quarters of the host's physical memory.
+        self.etl_memory_budget = int(context_info.env["ETL_MEMORY_BUDGET_MB"]) * 1024 * 1024 \
+            or os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') * 3 // 4
+        # ETLs (by their config name, e.g. BGI) sending their rows as query parameters instead of CSV files.
+        self.parameter_loads = [etl_name.strip() for etl_name in str(context_info.env["ETL_PARAMETER_LOADS"]).split(',')
+                                if etl_name.strip()]
+        # ETLs written as neo4j-admin import files by --bulk-import.
+        self.bulk_imports = [etl_name.strip() for etl_name in str(context_info.env["BULK_IMPORT_ETLS"]).split(',')
+                             if etl_name.strip()]
 
         urllib3.disable_warnings()
         http = urllib3.PoolManager()
@@ -80,6 +91,26 @@ class DataFileManager(metaclass=Singleton):
 
         return self.neo4j_transactor_threads
 
+    def get_etl_worker_process_settings(self):
+        """Gets the number of sub-type worker processes shared by all ETLs"""
+
+        return self.etl_worker_processes
+
+    def get_etl_memory_budget_settings(self):
+        """Gets the memory budget (bytes) shared by all sub-type worker processes"""
+
+        return self.etl_memory_budget
+
+    def get_parameter_load_settings(self):
+        """Gets the ETLs loading through query parameters instead of CSV files"""
+
+        return self.parameter_loads
+
+    def get_bulk_import_settings(self):
+        """Gets the ETLs written as neo4j-admin import files by a bulk import"""
+
+        return self.bulk_imports
+
     def get_config(self, data_type):
         """Get the object for a data type. If the object doesn't exist, this returns None."""
 
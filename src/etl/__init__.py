@@ -1,43 +1,65 @@
+"""ETLs.
+
+The ETL classes are imported on first use, so a process only pays for the
+modules (and heavy libraries such as ontobio or genedescriptions) of the
+ETLs it actually runs.
+"""
+
+import importlib
+
 from .etl import ETL
-from .allele_etl import AlleleETL
-from .disease_etl import DiseaseETL
-from .expression_etl import ExpressionETL
-from .bgi_etl import BGIETL
-from .expression_atlas_etl import ExpressionAtlasETL
-from .so_etl import SOETL
-from .do_etl import DOETL
-from .go_etl import GOETL
-from .mi_etl import MIETL
-from .variation_etl import VariationETL
-from .phenotype_etl import PhenoTypeETL
-from .orthology_etl import OrthologyETL
-from .paralogy_etl import ParalogyETL
-from .helpers import *
-from .generic_ontology_etl import GenericOntologyETL
-from .go_annot_etl import GOAnnotETL
-from .geo_xref_etl import GeoXrefETL
-from .biogrid_orcs_xref_etl import BiogridOrcsXrefETL
-from .expression_ribbon_etl import ExpressionRibbonETL
-from .gene_disease_ortho_etl import GeneDiseaseOrthoETL
-from .closure_etl import ClosureETL
-from .genetic_interaction_etl import GeneticInteractionETL
-from .molecular_interaction_etl import MolecularInteractionETL
-from .gene_descriptions_etl import GeneDescriptionsETL
-from .expression_ribbon_other_etl import ExpressionRibbonOtherETL
-from .sequence_targeting_reagent_etl import SequenceTargetingReagentETL
-from .affected_genomic_model_etl import AffectedGenomicModelETL
-from .ecomap_etl import ECOMAPETL
-from .vep_etl import VEPETL
-from .vep_transcript_etl import VEPTranscriptETL
-from .construct_etl import ConstructETL
-from .transcript_etl import TranscriptETL
-from .mol_interactions_mod_xref import MolInteractionsModXrefETL
-from .mol_interactions_xref import MolInteractionsXrefETL
-from .node_count_etl import NodeCountETL
-from .species_etl import SpeciesETL
-from .protein_sequence_etl import ProteinSequenceETL
-from .htp_metadataset_etl import HTPMetaDatasetETL
-from .htp_metadatasample_etl import HTPMetaDatasetSampleETL
-from .gene_pheno_cross_reference_etl import GenePhenoCrossReferenceETL
-from .category_tag_etl import CategoryTagETL
+from .helpers import (ETLHelper, Neo4jHelper, ResourceDescriptorHelper2,
+                      TextProcessingHelper, ExperimentalConditionHelper)
+
+# ETL class name: module defining it.
+ETL_MODULES = {
+    'AlleleETL': 'allele_etl',
+    'DiseaseETL': 'disease_etl',
+    'ExpressionETL': 'expression_etl',
+    'BGIETL': 'bgi_etl',
+    'ExpressionAtlasETL': 'expression_atlas_etl',
+    'SOETL': 'so_etl',
+    'DOETL': 'do_etl',
+    'GOETL': 'go_etl',
+    'MIETL': 'mi_etl',
+    'VariationETL': 'variation_etl',
+    'PhenoTypeETL': 'phenotype_etl',
+    'OrthologyETL': 'orthology_etl',
+    'ParalogyETL': 'paralogy_etl',
+    'GenericOntologyETL': 'generic_ontology_etl',
+    'GOAnnotETL': 'go_annot_etl',
+    'GeoXrefETL': 'geo_xref_etl',
+    'BiogridOrcsXrefETL': 'biogrid_orcs_xref_etl',
+    'ExpressionRibbonETL': 'expression_ribbon_etl',
+    'GeneDiseaseOrthoETL': 'gene_disease_ortho_etl',
+    'ClosureETL': 'closure_etl',
+    'GeneticInteractionETL': 'genetic_interaction_etl',
+    'MolecularInteractionETL': 'molecular_interaction_etl',
+    'GeneDescriptionsETL': 'gene_descriptions_etl',
+    'ExpressionRibbonOtherETL': 'expression_ribbon_other_etl',
+    'SequenceTargetingReagentETL': 'sequence_targeting_reagent_etl',
+    'AffectedGenomicModelETL': 'affected_genomic_model_etl',
+    'ECOMAPETL': 'ecomap_etl',
+    'VEPETL': 'vep_etl',
+    'VEPTranscriptETL': 'vep_transcript_etl',
+    'ConstructETL': 'construct_etl',
+    'TranscriptETL': 'transcript_etl',
+    'MolInteractionsModXrefETL': 'mol_interactions_mod_xref',
+    'MolInteractionsXrefETL': 'mol_interactions_xref',
+    'NodeCountETL': 'node_count_etl',
+    'SpeciesETL': 'species_etl',
+    'ProteinSequenceETL': 'protein_sequence_etl',
+    'HTPMetaDatasetETL': 'htp_metadataset_etl',
+    'HTPMetaDatasetSampleETL': 'htp_metadatasample_etl',
+    'GenePhenoCrossReferenceETL': 'gene_pheno_cross_reference_etl',
+    'CategoryTagETL': 'category_tag_etl'
+}
+
 
+def __getattr__(name):
+    """Import ETL classes and helpers lazily."""
+    if name in ETL_MODULES:
+        return getattr(importlib.import_module('.' + ETL_MODULES[name], __name__), name)
+    if name in ('OBOHelper', 'AssemblySequenceHelper'):
+        return getattr(importlib.import_module('.helpers', __name__), name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
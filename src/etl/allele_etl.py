@@ -1,7 +1,6 @@
 """Allele ETL."""
 
 import logging
-import multiprocessing
 import uuid
 
 from etl import ETL
@@ -173,14 +172,7 @@ class AlleleETL(ETL):
         self.data_type_config = config
 
     def _load_and_process_data(self):
-        thread_pool = []
-
-        for sub_type in self.data_type_config.get_sub_type_objects():
-            p = multiprocessing.Process(target=self._process_sub_type, args=(sub_type,))
-            p.start()
-            thread_pool.append(p)
-
-        ETL.wait_for_threads(thread_pool)
+        self.process_sub_types(self._process_sub_type)
 
     def _process_sub_type(self, sub_type):
 
@@ -1,7 +1,6 @@
 """Closure ETL."""
 
 import logging
-import multiprocessing
 
 from etl import ETL
 from transactors import CSVTransactor
@@ -35,14 +34,7 @@ class ClosureETL(ETL):
         self.data_type_config = config
 
     def _load_and_process_data(self):
-        thread_pool = []
-
-        for sub_type in self.data_type_config.get_sub_type_objects():
-            process = multiprocessing.Process(target=self._process_sub_type, args=(sub_type,))
-            process.start()
-            thread_pool.append(process)
-
-        ETL.wait_for_threads(thread_pool)
+        self.process_sub_types(self._process_sub_type)
 
     def _process_sub_type(self, sub_type):
         data_provider = sub_type.get_data_provider()
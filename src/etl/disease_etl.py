@@ -3,7 +3,6 @@
 # TODO need to fix the difference between disaeseRecord and disease_record in original code
 
 import logging
-import multiprocessing
 import uuid
 from etl import ETL
 from etl.helpers import ETLHelper
@@ -224,14 +223,7 @@ class DiseaseETL(ETL):
         self.exp_cond_helper = ExperimentalConditionHelper("DiseaseEntityJoin")
 
     def _load_and_process_data(self):
-        thread_pool = []
-
-        for sub_type in self.data_type_config.get_sub_type_objects():
-            process = multiprocessing.Process(target=self._process_sub_type, args=(sub_type,))
-            process.start()
-            thread_pool.append(process)
-
-        ETL.wait_for_threads(thread_pool)
+        self.process_sub_types(self._process_sub_type)
 
         self.delete_empty_nodes()
 
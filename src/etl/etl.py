@@ -1,12 +1,14 @@
 """ETL."""
 
 import logging
-import sys
+import os
 import time
 
 from test import TestObject
 from etl.helpers import ETLHelper
 from loader_common import ContextInfo
+from scheduler import ProcessWaiter, WorkerPool
+from transactors import Neo4jTransactor
 
 
 class ETL:
@@ -51,36 +53,42 @@ class ETL:
 
         self.error_messages("ETL main:")
 
+    @staticmethod
+    def get_sub_type_file_size(sub_type):
+        """Get the size of a sub type's input file, 0 if there is none."""
+        try:
+            return os.path.getsize(sub_type.get_filepath())
+        except OSError:
+            return 0
+
+    def process_sub_types(self, target, *args):
+        """Run target(sub_type, *args) for every sub type on the shared worker pool.
+
+        Sub types with the largest input files start first so they do not
+        end up as the tail of the ETL.
+        """
+        jobs = []
+        for sub_type in self.data_type_config.get_sub_type_objects():
+            data_provider = sub_type.get_data_provider()
+            job_name = self.data_type_config.data_type + "-" + str(data_provider)
+            jobs.append((job_name, self.get_sub_type_file_size(sub_type), (target, data_provider, sub_type) + args))
+        jobs.sort(key=lambda job: job[1], reverse=True)
+        WorkerPool.run(ETL.run_sub_type, jobs)
+
+    @staticmethod
+    def run_sub_type(target, data_provider, sub_type, *args):
+        """Run target(sub_type, *args), its query batches only writing the data provider's nodes."""
+        Neo4jTransactor.set_batch_partition(data_provider)
+        target(sub_type, *args)
+
     @staticmethod
     def wait_for_threads(thread_pool, queue=None):
-        """Wait for Threads."""
-        ETL.logger.debug("Waiting for Threads to finish: %s", len(thread_pool))
+        """Wait for Threads.
 
-        while len(thread_pool) > 0:
-            ETL.logger.debug("Checking Threads: %s", len(thread_pool))
-            for (index, thread) in enumerate(thread_pool):
-                ETL.logger.debug("Thread Alive: %s Exitcode: %s",
-                                 thread.is_alive(),
-                                 thread.exitcode)
-                if (thread.exitcode is None or thread.exitcode == 0) and not thread.is_alive():
-                    ETL.logger.debug("Thread Finished Removing from pool: ")
-                    thread.join()
-                    del thread_pool[index]
-                elif thread.exitcode is not None and thread.exitcode != 0:
-                    ETL.logger.debug("Thread has Problems Killing Children: ")
-                    for thread1 in thread_pool:
-                        thread1.terminate()
-                    sys.exit(-1)
-                else:
-                    pass
-
-            if queue is not None:
-                ETL.logger.debug("Queue Size: %s", queue.qsize())
-                if queue.empty():
-                    queue.join()
-                    return
-
-            time.sleep(5)
+        Returns when all threads finished or, if queue is given, once all its work is done.
+        """
+        ETL.logger.debug("Waiting for Threads to finish: %s", len(thread_pool))
+        ProcessWaiter.wait_for_processes(thread_pool, queue)
 
     def process_query_params(self, query_list_with_params):
         """Process Query Params."""
@@ -1,7 +1,6 @@
 """Expression Atlas ETL."""
 
 import logging
-import multiprocessing
 import xmltodict
 
 from etl import ETL
@@ -49,16 +48,9 @@ class ExpressionAtlasETL(ETL):
         self.data_type_config = config
 
     def _load_and_process_data(self):
-        thread_pool = []
         ensg_to_gene_primary_id_map = self._get_primary_gene_ids_to_ensembl_ids()
 
-        for sub_type in self.data_type_config.get_sub_type_objects():
-            process = multiprocessing.Process(target=self._process_sub_type,
-                                              args=(sub_type, ensg_to_gene_primary_id_map))
-            process.start()
-            thread_pool.append(process)
-
-        ETL.wait_for_threads(thread_pool)
+        self.process_sub_types(self._process_sub_type, ensg_to_gene_primary_id_map)
 
     @staticmethod
     def _get_primary_gene_ids_to_ensembl_ids():
@@ -8,7 +8,7 @@ import ijson
 
 from etl import ETL
 from etl.helpers import ETLHelper, Neo4jHelper
-from transactors import CSVTransactor, Neo4jTransactor
+from transactors import Neo4jTransactor, RowSink
 
 
 class ExpressionETL(ETL):
@@ -321,15 +321,8 @@ class ExpressionETL(ETL):
         # add the 'other' nodes to support the expression ribbon components.
         self.add_other()
 
-        thread_pool = []
         query_tracking_list = multiprocessing.Manager().list()
-        for sub_type in self.data_type_config.get_sub_type_objects():
-            process = multiprocessing.Process(target=self._process_sub_type,
-                                              args=(sub_type, query_tracking_list))
-            process.start()
-            thread_pool.append(process)
-
-        ETL.wait_for_threads(thread_pool)
+        self.process_sub_types(self._process_sub_type, query_tracking_list)
 
         queries = []
         for item in query_tracking_list:
@@ -350,45 +343,38 @@ class ExpressionETL(ETL):
         commit_size = self.data_type_config.get_neo4j_commit_size()
         batch_size = self.data_type_config.get_generator_batch_size()
 
-        # This needs to be in this format (template, param1, params2) others will be ignored
-        query_template_list = [
-            [self.bio_entity_expression_query_template,
-             "expression_entities_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.bio_entity_gene_ao_query_template,
-             "expression_gene_ao_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.bio_entity_gene_expression_join_query_template,
-             "expression_entity_joins_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.ao_expression_query_template,
-             "expression_ao_expression_" + sub_type.get_data_provider() + ".csv", commit_size]
-        ]
-
         if data_provider == 'SGD':
-            query_template_list += [[self.sgd_cc_expression_query_template,
-                                     "expression_SGD_cc_expression_" + sub_type.get_data_provider() + ".csv", commit_size]]
+            cc_expression = [self.sgd_cc_expression_query_template, "expression_SGD_cc_expression_" + data_provider + ".csv"]
         else:
-            query_template_list += [[self.cc_expression_query_template, 
-                                     "expression_cc_expression_" + sub_type.get_data_provider() + ".csv", commit_size,]]
-
-        query_template_list += [
-            [self.ao_cc_expression_query_template, "expression_ao_cc_expression_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.eas_qualified_query_template, "expression_eas_qualified_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.eas_substructure_query_template, "expression_eas_substructure_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.eass_qualified_query_template, "expression_eass_qualified_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.ccq_expression_query_template, "expression_ccq_expression_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.stage_expression_query_template, "expression_stage_expression_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.uberon_stage_query_template, "expression_uberon_stage_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.uberon_ao_query_template, "expression_uberon_ao_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.uberon_ao_other_query_template, "expression_uberon_ao_other_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.uberon_stage_other_query_template, "expression_uberon_stage_other_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.xrefs_query_template, "expression_cross_references_" + sub_type.get_data_provider() + ".csv", commit_size],
-            [self.add_pubs_query_template, "expression_add_pubs_" + sub_type.get_data_provider() + ".csv", commit_size]
+            cc_expression = [self.cc_expression_query_template, "expression_cc_expression_" + data_provider + ".csv"]
+
+        # The outputs the parser adds rows to, in the order their queries run.
+        outputs = [
+            ['expression_entities', self.bio_entity_expression_query_template, "expression_entities_" + data_provider + ".csv"],
+            ['expression_gene_ao', self.bio_entity_gene_ao_query_template, "expression_gene_ao_" + data_provider + ".csv"],
+            ['expression_entity_joins', self.bio_entity_gene_expression_join_query_template, "expression_entity_joins_" + data_provider + ".csv"],
+            ['expression_ao_expression', self.ao_expression_query_template, "expression_ao_expression_" + data_provider + ".csv"],
+            ['expression_cc_expression'] + cc_expression,
+            ['expression_ao_cc_expression', self.ao_cc_expression_query_template, "expression_ao_cc_expression_" + data_provider + ".csv"],
+            ['expression_eas_qualified', self.eas_qualified_query_template, "expression_eas_qualified_" + data_provider + ".csv"],
+            ['expression_eas_substructure', self.eas_substructure_query_template, "expression_eas_substructure_" + data_provider + ".csv"],
+            ['expression_eass_qualified', self.eass_qualified_query_template, "expression_eass_qualified_" + data_provider + ".csv"],
+            ['expression_ccq_expression', self.ccq_expression_query_template, "expression_ccq_expression_" + data_provider + ".csv"],
+            ['expression_stage_expression', self.stage_expression_query_template, "expression_stage_expression_" + data_provider + ".csv"],
+            ['expression_uberon_stage', self.uberon_stage_query_template, "expression_uberon_stage_" + data_provider + ".csv"],
+            ['expression_uberon_ao', self.uberon_ao_query_template, "expression_uberon_ao_" + data_provider + ".csv"],
+            ['expression_uberon_ao_other', self.uberon_ao_other_query_template, "expression_uberon_ao_other_" + data_provider + ".csv"],
+            ['expression_uberon_stage_other', self.uberon_stage_other_query_template, "expression_uberon_stage_other_" + data_provider + ".csv"],
+            ['expression_cross_references', self.xrefs_query_template, "expression_cross_references_" + data_provider + ".csv"],
+            ['expression_add_pubs', self.add_pubs_query_template, "expression_add_pubs_" + data_provider + ".csv"]
         ]
 
-        # Obtain the generator
-        generators = self.get_generators(data_file, batch_size)
-
-        query_and_file_list = self.process_query_params(query_template_list)
-        CSVTransactor.save_file_static(generators, query_and_file_list)
+        sink = RowSink(batch_size)
+        for [name, query_template, file_name] in outputs:
+            sink.add_output(name, query_template % (file_name, commit_size), file_name)
+        with sink:
+            self.parse_expression_file(data_file, sink)
+        query_and_file_list = sink.query_and_file_list
 
         for item in query_and_file_list:
             query_tracking_list.append(item)
@@ -416,36 +402,32 @@ class ExpressionETL(ETL):
 
         Neo4jHelper.run_single_query_no_return(add_other_query)
 
-    def get_generators(self, expression_file, batch_size):  # noqa
-        """Get Generators."""
+    def parse_expression_file(self, expression_file, sink):  # noqa
+        """Add the rows of every expression record to the outputs of sink."""
 
         self.logger.debug("made it to the expression generator")
 
-        counter = 0
-
-        cross_references = []
-        bio_entities = []
-        bio_join_entities = []
-        bio_entity_gene_aos = []
-        pubs = []
-        ao_expressions = []
-        cc_expressions = []
-        ao_qualifiers = []
-        ao_substructures = []
-        ao_ss_qualifiers = []
-        cc_qualifiers = []
-        ao_cc_expressions = []
-        stage_list = []
-        stage_uberon_data = []
-        uberon_ao_data = []
-        uberon_ao_other_data = []
-        uberon_stage_other_data = []
+        cross_references = sink['expression_cross_references']
+        bio_entities = sink['expression_entities']
+        bio_join_entities = sink['expression_entity_joins']
+        bio_entity_gene_aos = sink['expression_gene_ao']
+        pubs = sink['expression_add_pubs']
+        ao_expressions = sink['expression_ao_expression']
+        cc_expressions = sink['expression_cc_expression']
+        ao_qualifiers = sink['expression_eas_qualified']
+        ao_substructures = sink['expression_eas_substructure']
+        ao_ss_qualifiers = sink['expression_eass_qualified']
+        cc_qualifiers = sink['expression_ccq_expression']
+        ao_cc_expressions = sink['expression_ao_cc_expression']
+        stage_list = sink['expression_stage_expression']
+        stage_uberon_data = sink['expression_uberon_stage']
+        uberon_ao_data = sink['expression_uberon_ao']
+        uberon_ao_other_data = sink['expression_uberon_ao_other']
+        uberon_stage_other_data = sink['expression_uberon_stage_other']
 
         self.logger.debug("streaming json data from %s ...", expression_file)
         with codecs.open(expression_file, 'r', 'utf-8') as file_handle:
             for xpat in ijson.items(file_handle, 'data.item'):
-                counter = counter + 1
-
                 pub_med_url = None
                 pub_mod_url = None
                 pub_med_id = ""
@@ -458,7 +440,6 @@ class ExpressionETL(ETL):
                 if self.test_object.using_test_data() is True:
                     is_it_test_entry = self.test_object.check_for_test_id_entry(gene_id)
                     if is_it_test_entry is False:
-                        counter = counter - 1
                         continue
 
                 evidence = xpat.get('evidence')
@@ -552,12 +533,12 @@ class ExpressionETL(ETL):
                                 structure_uberon_term = {
                                     "ebe_uuid": expression_entity_unique_key,
                                     "aoUberonId": structure_uberon_term_id}
-                                uberon_ao_data.append(structure_uberon_term)
+                                uberon_ao_data.add(structure_uberon_term)
                             elif structure_uberon_term_id is not None \
                                     and structure_uberon_term_id == 'Other':
                                 other_structure_uberon_term = {
                                     "ebe_uuid": expression_entity_unique_key}
-                                uberon_ao_other_data.append(other_structure_uberon_term)
+                                uberon_ao_other_data.add(other_structure_uberon_term)
 
                     if where_expressed.get('anatomicalSubStructureUberonSlimTermIds') is not None:
                         for uberon_sub_structure_term_object in \
@@ -569,12 +550,12 @@ class ExpressionETL(ETL):
                                 sub_structure_uberon_term = {
                                     "ebe_uuid": expression_entity_unique_key,
                                     "aoUberonId": sub_structure_uberon_term_id}
-                                uberon_ao_data.append(sub_structure_uberon_term)
+                                uberon_ao_data.add(sub_structure_uberon_term)
                             elif sub_structure_uberon_term_id is not None \
                                     and sub_structure_uberon_term_id == 'Other':
                                 other_structure_uberon_term = {
                                     "ebe_uuid": expression_entity_unique_key}
-                                uberon_ao_other_data.append(other_structure_uberon_term)
+                                uberon_ao_other_data.add(other_structure_uberon_term)
 
                     if cellular_component_term_id is None:
                         cellular_component_term_id = ""
@@ -587,12 +568,12 @@ class ExpressionETL(ETL):
                                 "uberonStageId": stage_uberon_term_id,
                                 "ei_uuid": expression_unique_key
                             }
-                            stage_uberon_data.append(stage_uberon)
+                            stage_uberon_data.add(stage_uberon)
                         if stage_uberon_term_id == "post embryonic, pre-adult":
                             stage_uberon_other = {
                                 "ei_uuid": expression_unique_key
                             }
-                            uberon_stage_other_data.append(stage_uberon_other)
+                            uberon_stage_other_data.add(stage_uberon_other)
 
                     if stage_term_id is None or stage_name == 'N/A':
                         stage_term_id = ""
@@ -604,7 +585,7 @@ class ExpressionETL(ETL):
                             "stageTermId": stage_term_id,
                             "stageName": stage_name,
                             "ei_uuid": expression_unique_key}
-                        stage_list.append(stage)
+                        stage_list.add(stage)
                     else:
                         stage_uberon_term_id = ""
 
@@ -630,24 +611,24 @@ class ExpressionETL(ETL):
                                                                    mod_global_cross_ref_id,
                                                                    cross_ref_id + page)
                                     xref['ei_uuid'] = expression_unique_key
-                                    cross_references.append(xref)
+                                    cross_references.add(xref)
 
                     bio_entity = {
                         "ebe_uuid": expression_entity_unique_key,
                         "whereExpressedStatement": where_expressed_statement}
-                    bio_entities.append(bio_entity)
+                    bio_entities.add(bio_entity)
 
                     bio_join_entity = {
                         "ei_uuid": expression_unique_key,
                         "assay": assay}
-                    bio_join_entities.append(bio_join_entity)
+                    bio_join_entities.add(bio_join_entity)
 
                     bio_entity_gene_ao = {
                         "geneId": gene_id,
                         "ebe_uuid": expression_entity_unique_key,
                         "anatomicalStructureTermId": anatomical_structure_term_id,
                         "ei_uuid": expression_unique_key}
-                    bio_entity_gene_aos.append(bio_entity_gene_ao)
+                    bio_entity_gene_aos.add(bio_entity_gene_ao)
 
                     pub = {
                         "ei_uuid": expression_unique_key,
@@ -656,7 +637,7 @@ class ExpressionETL(ETL):
                         "pubMedUrl": pub_med_url,
                         "pubModId": publication_mod_id,
                         "pubModUrl": pub_mod_url}
-                    pubs.append(pub)
+                    pubs.add(pub)
 
                     ao_expression = {
                         "geneId": gene_id,
@@ -672,7 +653,7 @@ class ExpressionETL(ETL):
                         "whereExpressedStatement": where_expressed_statement,
                         "ei_uuid": expression_unique_key,
                         "ebe_uuid": expression_entity_unique_key}
-                    ao_expressions.append(ao_expression)
+                    ao_expressions.add(ao_expression)
 
                     if cellular_component_qualifier_term_id is not None:
 
@@ -680,7 +661,7 @@ class ExpressionETL(ETL):
                             "ebe_uuid": expression_entity_unique_key,
                             "cellularComponentQualifierTermId": cellular_component_qualifier_term_id
                         }
-                        cc_qualifiers.append(cc_qualifier)
+                        cc_qualifiers.add(cc_qualifier)
 
                     if anatomical_structure_term_id is None:
                         anatomical_structure_term_id = ""
@@ -699,7 +680,7 @@ class ExpressionETL(ETL):
                             "ei_uuid": expression_unique_key,
                             "ebe_uuid": expression_entity_unique_key
                         }
-                        cc_expressions.append(cc_expression)
+                        cc_expressions.add(cc_expression)
 
                     if anatomical_structure_qualifier_term_id is not None:
                         ao_qualifier = {
@@ -709,7 +690,7 @@ class ExpressionETL(ETL):
                             "anatomicalStructureQualifierTermId":
                             anatomical_structure_qualifier_term_id}
 
-                        ao_qualifiers.append(ao_qualifier)
+                        ao_qualifiers.add(ao_qualifier)
 
                     if anatomical_sub_structure_term_id is not None:
                         ao_substructure = {
@@ -719,7 +700,7 @@ class ExpressionETL(ETL):
                             "anatomicalSubStructureTermId":
                             anatomical_sub_structure_term_id}
 
-                        ao_substructures.append(ao_substructure)
+                        ao_substructures.add(ao_substructure)
 
                     if anatomical_sub_structure_qualifier_term_id is not None:
                         ao_ss_qualifier = {
@@ -729,7 +710,7 @@ class ExpressionETL(ETL):
                             "anatomicalSubStructureQualifierTermId":
                             anatomical_sub_structure_qualifier_term_id}
 
-                        ao_ss_qualifiers.append(ao_ss_qualifier)
+                        ao_ss_qualifiers.add(ao_ss_qualifier)
 
                     if where_expressed_statement is None:
                         where_expressed_statement = ""
@@ -758,60 +739,6 @@ class ExpressionETL(ETL):
                             "ei_uuid": expression_unique_key,
                             "ebe_uuid": expression_entity_unique_key}
 
-                        ao_cc_expressions.append(ao_cc_expression)
-
-                if counter == batch_size:
-                    yield [bio_entities,
-                           bio_entity_gene_aos,
-                           bio_join_entities,
-                           ao_expressions,
-                           cc_expressions,
-                           ao_cc_expressions,
-                           ao_qualifiers,
-                           ao_substructures,
-                           ao_ss_qualifiers,
-                           cc_qualifiers,
-                           stage_list,
-                           stage_uberon_data,
-                           uberon_ao_data,
-                           uberon_ao_other_data,
-                           uberon_stage_other_data,
-                           cross_references,
-                           pubs]
-                    bio_entities = []
-                    bio_join_entities = []
-                    ao_expressions = []
-                    cc_expressions = []
-                    ao_qualifiers = []
-                    ao_substructures = []
-                    ao_ss_qualifiers = []
-                    cc_qualifiers = []
-                    ao_cc_expressions = []
-                    stage_list = []
-                    uberon_stage_other_data = []
-                    stage_uberon_data = []
-                    uberon_ao_other_data = []
-                    uberon_ao_data = []
-                    cross_references = []
-                    bio_entity_gene_aos = []
-                    pubs = []
-                    counter = 0
-
-            if counter > 0:
-                yield [bio_entities,
-                       bio_entity_gene_aos,
-                       bio_join_entities,
-                       ao_expressions,
-                       cc_expressions,
-                       ao_cc_expressions,
-                       ao_qualifiers,
-                       ao_substructures,
-                       ao_ss_qualifiers,
-                       cc_qualifiers,
-                       stage_list,
-                       stage_uberon_data,
-                       uberon_ao_data,
-                       uberon_ao_other_data,
-                       uberon_stage_other_data,
-                       cross_references,
-                       pubs]
+                        ao_cc_expressions.add(ao_cc_expression)
+
+                sink.end_record()
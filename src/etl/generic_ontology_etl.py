@@ -2,7 +2,6 @@
 """Generic Ontology ETL."""
 
 import logging
-import multiprocessing
 import re
 
 from etl import ETL
@@ -93,14 +92,7 @@ class GenericOntologyETL(ETL):
         self.data_type_config = config
 
     def _load_and_process_data(self):
-        thread_pool = []
-
-        for sub_type in self.data_type_config.get_sub_type_objects():
-            process = multiprocessing.Process(target=self._process_sub_type, args=(sub_type,))
-            process.start()
-            thread_pool.append(process)
-
-        ETL.wait_for_threads(thread_pool)
+        self.process_sub_types(self._process_sub_type)
 
     def _process_sub_type(self, sub_type):
         self.logger.info("Loading Generic Ontology Data: %s", sub_type.get_data_provider())
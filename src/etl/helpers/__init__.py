@@ -1,7 +1,20 @@
+import importlib
+
 from .etl_helper import ETLHelper
 from .neo4j_helper import Neo4jHelper
-from .assembly_sequence_helper import AssemblySequenceHelper
-from .obo_helper import OBOHelper
 from .resource_descriptor_helper_2 import ResourceDescriptorHelper2
 from .text_processing_helper import TextProcessingHelper
 from .experimental_condition_helper import ExperimentalConditionHelper
+
+# Helpers needing heavy libraries (ontobio, pyfaidx) are imported on first use.
+LAZY_HELPER_MODULES = {
+    'OBOHelper': 'obo_helper',
+    'AssemblySequenceHelper': 'assembly_sequence_helper'
+}
+
+
+def __getattr__(name):
+    """Import heavy helpers lazily."""
+    if name in LAZY_HELPER_MODULES:
+        return getattr(importlib.import_module('.' + LAZY_HELPER_MODULES[name], __name__), name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
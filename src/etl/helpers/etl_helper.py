@@ -8,12 +8,27 @@ from .resource_descriptor_helper_2 import ResourceDescriptorHelper2
 from .neo4j_helper import Neo4jHelper
 
 
+class LazyResourceDescriptorHelper():
+    """Class attribute creating the shared ResourceDescriptorHelper2 on first use.
+
+    Creating it downloads and parses resourceDescriptors.yaml, which importing
+    the ETLs should not do.
+    """
+
+    def __init__(self):
+        self.helper = None
+
+    def __get__(self, instance, owner):
+        if self.helper is None:
+            self.helper = ResourceDescriptorHelper2()
+        return self.helper
+
+
 class ETLHelper():
     """ETL Helper."""
 
     logger = logging.getLogger(__name__)
-    rdh2 = ResourceDescriptorHelper2()
-    rdh2.get_data()
+    rdh2 = LazyResourceDescriptorHelper()
     default_date_format = r'%Y-%m-%dT%H:%M:%SZ'
 
     @staticmethod
@@ -296,8 +311,7 @@ class ETLHelper():
         fields = []
         for k in metadata:
             fields.append(k + ": " + json.dumps(metadata[k]))
-        with Neo4jHelper().run_single_query("CREATE (o:ModFileMetadata {" + ",".join(fields) + "})"):
-            pass
+        Neo4jHelper().run_single_query_no_return("CREATE (o:ModFileMetadata {" + ",".join(fields) + "})")
 
     @staticmethod
     def check_date_format(dateString, logger=None):
@@ -1,196 +1,407 @@
 """Neo4j Helper"""
 
+import atexit
 import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 
 from neo4j import GraphDatabase
+from neo4j.exceptions import Neo4jError
 from loader_common import ContextInfo
+from scheduler import RunManifest, WorkerPool
 
 logger = logging.getLogger(__name__)
 context_info = ContextInfo()
 uri = "bolt://" + context_info.env["NEO4J_HOST"] + ":" + str(context_info.env["NEO4J_PORT"])
 
 class Neo4jHelper:
-    """Neo4j Helper"""
+    """Neo4j Helper
+
+    All queries of a process share one driver, so they reuse its pooled
+    connections instead of opening (and handshaking) a new one each time.
+    """
+
+    driver = None
+    driver_pid = None
+    # Drivers inherited from the parent process. Their connections belong to
+    # the parent, so they are kept alive here but never used or closed.
+    inherited_drivers = []
+    # During a bulk import the database is offline: writes are recorded in the
+    # run manifest to run with --resume, and queries needing results fail.
+    deferred = False
+    # Until an ETL extracting ahead is scheduled, its writes are held back and
+    # queries needing results wait, see set_submit_gate.
+    submit_gate = None
+    held_queries = []
+    held_queries_pid = None
+    held_queries_lock = threading.Lock()
+
+    @classmethod
+    def get_driver(cls):
+        """Return the driver of this process, creating it on first use"""
+        if cls.driver is not None and cls.driver_pid != os.getpid():
+            cls.inherited_drivers.append(cls.driver)
+            cls.driver = None
+
+        if cls.driver is None:
+            logger.debug("Creating neo4j driver for process: %s", os.getpid())
+            cls.driver = GraphDatabase.driver(uri, auth=("neo4j", "neo4j"), max_connection_pool_size=-1, max_connection_lifetime=3600)
+            cls.driver_pid = os.getpid()
+            atexit.register(cls.close_driver)
+
+        return cls.driver
+
+    @classmethod
+    def close_driver(cls):
+        """Close the driver of this process"""
+        if cls.driver is not None and cls.driver_pid == os.getpid():
+            cls.driver.close()
+        cls.driver = None
+
+    @staticmethod
+    def check_not_deferred(query):
+        """Exit if a query needs the database while it is offline for a bulk import"""
+        if Neo4jHelper.deferred:
+            logger.critical("Query needs the database, which is offline during a bulk import: %s", query)
+            sys.exit(-1)
+
+    @staticmethod
+    def set_submit_gate(submit_gate):
+        """Hold back the queries of this process until submit_gate (a multiprocessing Event) is set
+
+        Writes without results (e.g. the ModFileMetadata of a file) are run
+        in order by a thread once the gate is set, the process exits only
+        after that. Queries needing results wait for the gate.
+        """
+        Neo4jHelper.submit_gate = submit_gate
+
+    @staticmethod
+    def is_gate_closed():
+        """Check whether the queries of this process are held back"""
+        return Neo4jHelper.submit_gate is not None and not Neo4jHelper.submit_gate.is_set()
+
+    @staticmethod
+    def hold_query(query):
+        """Hold a write back until the gate is set. Returns False if it is set already"""
+        with Neo4jHelper.held_queries_lock:
+            if not Neo4jHelper.is_gate_closed():
+                return False
+            if Neo4jHelper.held_queries_pid != os.getpid():
+                # Queries held by the parent process are run by the parent.
+                Neo4jHelper.held_queries = []
+                Neo4jHelper.held_queries_pid = os.getpid()
+                threading.Thread(target=Neo4jHelper.run_held_queries, args=(True,), name="Neo4jHelper gate").start()
+            logger.debug("Holding back query until the ETL is scheduled: %s", query)
+            Neo4jHelper.held_queries.append(query)
+            return True
+
+    @staticmethod
+    def run_held_queries(wait=False):
+        """Run the writes held back so far, in order, once the gate is set"""
+        if wait:
+            Neo4jHelper.submit_gate.wait()
+        with Neo4jHelper.held_queries_lock:
+            if Neo4jHelper.held_queries_pid != os.getpid():
+                return
+            for query in Neo4jHelper.held_queries:
+                Neo4jHelper.run_query_no_return(query)
+            Neo4jHelper.held_queries = []
+
+    @staticmethod
+    def wait_for_gate(query):
+        """Wait until the gate is set, and the writes held before query ran"""
+        if Neo4jHelper.is_gate_closed():
+            logger.info("Waiting for the ETL to be scheduled before querying: %s", query)
+            # Don't hold a worker slot or memory while waiting, the ETLs we wait for may need them.
+            WorkerPool.pause_job()
+            Neo4jHelper.submit_gate.wait()
+            WorkerPool.resume_job()
+        Neo4jHelper.run_held_queries()
 
     @staticmethod
     @contextmanager
     def run_single_parameter_query(query, parameter):
         """Run single parameter query"""
-        try:
-            graph = GraphDatabase.driver(uri, auth=("neo4j", "neo4j"), max_connection_pool_size=-1, max_connection_lifetime=3600)
-            logger.debug("Running run_single_parameter_query. Please wait...")
-            logger.debug("Query: %s", query)
-            with graph.session() as session:
-                with session.begin_transaction() as transaction:
-                    yield transaction.run(query, parameter=parameter)
-        finally:
-            logger.debug("closing neo4j transaction and session")
-            graph.close()
+        Neo4jHelper.check_not_deferred(query)
+        Neo4jHelper.wait_for_gate(query)
+        logger.debug("Running run_single_parameter_query. Please wait...")
+        logger.debug("Query: %s", query)
+        with Neo4jHelper.get_driver().session() as session:
+            with session.begin_transaction() as transaction:
+                yield transaction.run(query, parameter=parameter)
+        logger.debug("closed neo4j transaction and session")
 
     @staticmethod
     @contextmanager
     def run_single_query(query):
         """Run Single Query"""
-        try:
-            graph = GraphDatabase.driver(uri, auth=("neo4j", "neo4j"), max_connection_pool_size=-1, max_connection_lifetime=3600)
-            with graph.session() as session:
-                with session.begin_transaction() as transaction:
-                    yield transaction.run(query)
-        finally:
-            logger.debug("closing neo4j transaction and session")
-            graph.close()
+        Neo4jHelper.check_not_deferred(query)
+        Neo4jHelper.wait_for_gate(query)
+        with Neo4jHelper.get_driver().session() as session:
+            with session.begin_transaction() as transaction:
+                yield transaction.run(query)
+        logger.debug("closed neo4j transaction and session")
 
     @staticmethod
     def run_single_query_no_return(query):
         """Run Single Query"""
-        graph = GraphDatabase.driver(uri, auth=("neo4j", "neo4j"), max_connection_pool_size=-1, max_connection_lifetime=3600)
-        with graph.session() as session:
+        if Neo4jHelper.deferred:
+            RunManifest.record('query_deferred', query=query)
+            return
+        if Neo4jHelper.hold_query(query):
+            return
+        Neo4jHelper.run_held_queries()
+        Neo4jHelper.run_query_no_return(query)
+
+    @staticmethod
+    def run_query_no_return(query):
+        """Run a query in its own transaction"""
+        with Neo4jHelper.get_driver().session() as session:
             with session.begin_transaction() as transaction:
                 transaction.run(query)
-        graph.close()
+
+    # Uniqueness constraints, as (label, properties). Each also gets an index.
+    constraints = [
+        ('Publication', ['primaryKey']),
+        ('Association', ['primaryKey']),
+        ('Variant', ['primaryKey']),
+        ('DiseaseEntityJoin', ['primaryKey']),
+        ('ExperimentalCondition', ['primaryKey']),
+        # ('PhenotypeEntityJoin', ['primaryKey']),  # Breaks MERGE in Phenotype ETL
+        # ('Entity', ['primaryKey']),  # Breaks MERGE in BGI ETL
+        ('Species', ['primaryKey']),
+        ('CrossReference', ['primaryKey']),
+        ('CrossReference', ['uuid']),
+        ('Gene', ['primaryKey']),
+        ('Gene', ['uuid']),
+        ('Allele', ['primaryKey']),
+        ('Allele', ['uuid']),
+        ('Stage', ['primaryKey']),
+        ('SequenceTargetingReagent', ['primaryKey']),
+        ('AffectedGenomicModel', ['primaryKey']),
+        ('Variant', ['hgvsNomenclature']),
+        # ('BioEntityGeneExpressionJoin', ['primaryKey']),  # Breaks MERGE in Expression ETL
+        # ('ExpressionBioEntity', ['primaryKey']),  # Breaks MERGE in Expression ETL
+        ('HTPDataset', ['primaryKey']),
+        ('HTPDatasetSample', ['primaryKey']),
+        ('CategoryTag', ['primaryKey']),
+        ('CHEBITerm', ['primaryKey']),
+        ('ZECOTerm', ['primaryKey']),
+        ('DOTerm', ['primaryKey']),
+        ('SOTerm', ['primaryKey']),
+        ('GOTerm', ['primaryKey']),
+        ('MITerm', ['primaryKey']),
+        ('ECOTerm', ['primaryKey']),
+        ('ZFATerm', ['primaryKey']),
+        ('ZFSTerm', ['primaryKey']),
+        ('CLTerm', ['primaryKey']),
+        ('WBBTTerm', ['primaryKey']),
+        ('FBCVTerm', ['primaryKey']),
+        ('FBBTTerm', ['primaryKey']),
+        ('MATerm', ['primaryKey']),
+        ('EMAPATerm', ['primaryKey']),
+        ('UBERONTerm', ['primaryKey']),
+        ('PATOTerm', ['primaryKey']),
+        ('APOTerm', ['primaryKey']),
+        ('DPOTerm', ['primaryKey']),
+        ('FYPOTerm', ['primaryKey']),
+        ('WBPhenotypeTerm', ['primaryKey']),
+        ('MPTerm', ['primaryKey']),
+        ('HPTerm', ['primaryKey']),
+        ('OBITerm', ['primaryKey']),
+        ('BTOTerm', ['primaryKey']),
+        ('MMUSDVTerm', ['primaryKey']),
+        ('BSPOTerm', ['primaryKey']),
+        ('MMOTerm', ['primaryKey']),
+        ('WBLSTerm', ['primaryKey']),
+        ('XPOTerm', ['primaryKey']),
+        ('XSMOTerm', ['primaryKey']),
+        ('XAOTerm', ['primaryKey']),
+        ('XBEDTerm', ['primaryKey']),
+        ('NonBGIConstructComponent', ['primaryKey']),
+        ('Exon', ['primaryKey']),
+        ('Transcript', ['primaryKey']),
+        ('CDS', ['primaryKey']),
+        ('GenomicLocation', ['primaryKey']),
+        ('OrthoAlgorithm', ['name']),
+        ('ParaAlgorithm', ['name']),
+    ]
+
+    # Other node indices, as (label, properties).
+    # IMPORTANT: If an entry already exists in the constraint list, it already has an index and does not need to be added here.
+    indices = [
+        ('Assembly', ['primaryKey']),
+        ('BioEntityGeneExpressionJoin', ['primaryKey']),
+        ('CDS', ['gff3ID']),
+        ('CDSSequence', ['primaryKey']),
+        ('Chromosome', ['primaryKey']),
+        ('Construct', ['primaryKey']),
+        ('CrossReference', ['crossRefType']),
+        ('CrossReference', ['globalCrossRefId']),
+        ('CrossReference', ['localId']),
+        ('DOTerm', ['isObsolete']),
+        ('DOTerm', ['oid']),
+        ('Entity', ['primaryKey']),
+        ('Exon', ['gff3ID']),
+        ('ExpressionBioEntity', ['primaryKey']),
+        ('Feature', ['primaryKey']),
+        ('Gene', ['localId']),
+        ('Gene', ['modGlobalId']),
+        ('Gene', ['modLocalId']),
+        ('Gene', ['symbol']),
+        ('Gene', ['taxonId']),
+        ('Gene', ['gff3ID']),
+        ('GeneLevelConsequence', ['primaryKey']),
+        ('Genotype', ['primaryKey']),
+        ('GOTerm', ['isObsolete']),
+        ('GOTerm', ['oid']),
+        ('Identifier', ['primaryKey']),
+        ('InteractionGeneJoin', ['primaryKey']),
+        ('InteractionGeneJoin', ['uuid']),
+        ('Load', ['primaryKey']),
+        ('Note', ['primaryKey']),
+        ('Ontology', ['isObsolete']),
+        ('Ontology', ['name']),
+        ('Ontology', ['primaryKey']),
+        ('OntologyGeneJoin', ['primaryKey']),
+        ('OrthologyGeneJoin', ['primaryKey']),
+        ('ParalogyGeneJoin', ['primaryKey']),
+        ('Phenotype', ['primaryKey']),
+        ('PhenotypeEntityJoin', ['primaryKey']),
+        ('PhenotypePublicationJoin', ['primaryKey']),
+        ('ProteinSequence', ['primaryKey']),
+        ('PublicationJoin', ['primaryKey']),
+        ('SecondaryId', ['primaryKey']),
+        ('SOTerm', ['name']),
+        ('Synonym', ['primaryKey']),
+        ('Transcript', ['dataProvider']),
+        ('Transcript', ['gff3ID']),
+        ('TranscriptLevelConsequence', ['primaryKey']),
+        ('TranscriptProteinSequence', ['primaryKey']),
+        ('Transgene', ['primaryKey']),
+        ('UBERONTerm', ['isObsolete']),
+        ('VariantProteinSequence', ['primaryKey']),
+        ('VariantProteinSequence', ['transcriptId']),
+        ('VariantProteinSequence', ['variantId']),
+        ('Gene', ['gff3ID', 'dataProvider']),  # transcript_etl
+        ('Transcript', ['gff3ID', 'dataProvider'])  # transcript_etl
+    ]
+
+    # Relationship indices, as (name, type, properties).
+    relationship_indices = [
+        ('rel_orthology_idx', 'ORTHOLOGOUS', ['isBestScore', 'isBestRevScore', 'strictFilter', 'moderateFilter']),
+        ('rel_paralogy_idx', 'PARALOGOUS', ['rank', 'length', 'similarity', 'identity'])
+    ]
+
+    # Indices no load query looks nodes up by, only needed once the load is done.
+    # With NEO4J_DEFER_INDEXES they are created after the ETLs, so they are not kept up to date while loading.
+    deferred_indices = [
+        ('CrossReference', ['localId']),
+        ('DOTerm', ['isObsolete']),
+        ('DOTerm', ['oid']),
+        ('GOTerm', ['isObsolete']),
+        ('GOTerm', ['oid']),
+        ('Gene', ['localId']),
+        ('Gene', ['modGlobalId']),
+        ('Gene', ['modLocalId']),
+        ('Gene', ['symbol']),
+        ('Ontology', ['isObsolete']),
+        ('UBERONTerm', ['isObsolete']),
+        ('VariantProteinSequence', ['transcriptId']),
+        ('VariantProteinSequence', ['variantId'])
+    ]
+
+    # Schema statements submitted at once.
+    index_threads = 8
+    index_retries = 3
+
+    @staticmethod
+    def get_schema_key(kind, entity_type, label, properties, index_type=None):
+        """Return the key an index or constraint is compared by, whatever its name"""
+        return (kind, index_type, entity_type, label, tuple(properties))
 
     @staticmethod
-    def create_indices():
-        """Create Indicies"""
-        graph = GraphDatabase.driver(uri, auth=("neo4j", "neo4j"), max_connection_pool_size=-1, max_connection_lifetime=3600)
-        with graph.session() as session:
-
-            constraints =  [['n:Publication', 'n.primaryKey'],
-                    ['n:Association', 'n.primaryKey'],
-                    ['n:Variant', 'n.primaryKey'],
-                    ['n:DiseaseEntityJoin', 'n.primaryKey'],
-                    ['n:ExperimentalCondition', 'n.primaryKey'],
-                    # ['n:PhenotypeEntityJoin', 'n.primaryKey'], # Breaks MERGE in Phenotype ETL
-                    # ['n:Entity', 'n.primaryKey'], # Breaks MERGE in BGI ETL
-                    ['n:Species', 'n.primaryKey'],
-                    ['n:CrossReference', 'n.primaryKey'],
-                    ['n:CrossReference', 'n.uuid'],
-                    ['n:Gene', 'n.primaryKey'],
-                    ['n:Gene', 'n.uuid'],
-                    ['n:Allele', 'n.primaryKey'],
-                    ['n:Allele', 'n.uuid'],
-                    ['n:Stage', 'n.primaryKey'],
-                    ['n:SequenceTargetingReagent', 'n.primaryKey'],
-                    ['n:AffectedGenomicModel', 'n.primaryKey'],
-                    ['n:Variant', 'n.hgvsNomenclature'],
-                    # ['n:BioEntityGeneExpressionJoin', 'n.primaryKey'], # Breaks MERGE in Expression ETL
-                    # ['n:ExpressionBioEntity', 'n.primaryKey'], # Breaks MERGE in Expression ETL
-                    ['n:HTPDataset', 'n.primaryKey'],
-                    ['n:HTPDatasetSample', 'n.primaryKey'],
-                    ['n:CategoryTag', 'n.primaryKey'],
-                    ['n:CHEBITerm', 'n.primaryKey'],
-                    ['n:ZECOTerm', 'n.primaryKey'],
-                    ['n:DOTerm', 'n.primaryKey'],
-                    ['n:SOTerm', 'n.primaryKey'],
-                    ['n:GOTerm', 'n.primaryKey'],
-                    ['n:MITerm', 'n.primaryKey'],
-                    ["n:ECOTerm", "n.primaryKey"],
-                    ["n:ZFATerm", "n.primaryKey"],
-                    ["n:ZFSTerm", "n.primaryKey"],
-                    ["n:CLTerm", "n.primaryKey"],
-                    ["n:WBBTTerm", "n.primaryKey"],
-                    ["n:FBCVTerm", "n.primaryKey"],
-                    ["n:FBBTTerm", "n.primaryKey"],
-                    ["n:MATerm", "n.primaryKey"],
-                    ["n:EMAPATerm", "n.primaryKey"],
-                    ["n:UBERONTerm", "n.primaryKey"],
-                    ["n:PATOTerm", "n.primaryKey"],
-                    ["n:APOTerm", "n.primaryKey"],
-                    ["n:DPOTerm", "n.primaryKey"],
-                    ["n:FYPOTerm", "n.primaryKey"],
-                    ["n:WBPhenotypeTerm", "n.primaryKey"],
-                    ["n:MPTerm", "n.primaryKey"],
-                    ["n:HPTerm", "n.primaryKey"],
-                    ["n:OBITerm", "n.primaryKey"],
-                    ["n:BTOTerm", "n.primaryKey"],
-                    ["n:MMUSDVTerm", "n.primaryKey"],
-                    ["n:BSPOTerm", "n.primaryKey"],
-                    ["n:MMOTerm", "n.primaryKey"],
-                    ["n:WBLSTerm", "n.primaryKey"],
-                    ["n:XPOTerm", "n.primaryKey"],
-                    ["n:XSMOTerm", "n.primaryKey"],
-                    ["n:XAOTerm", "n.primaryKey"],
-                    ["n:XBEDTerm", "n.primaryKey"],
-                    ["n:NonBGIConstructComponent", "n.primaryKey"],
-                    ['n:Exon', 'n.primaryKey'], 
-                    ['n:Transcript', 'n.primaryKey'],
-                    ['n:CDS', 'n.primaryKey'], 
-                    ['n:GenomicLocation', 'n.primaryKey'],
-                    ['n:OrthoAlgorithm', 'n.name'],
-                    ['n:ParaAlgorithm', 'n.name']
-                    ]
-
-            # Constraints must be run before indices.
-            for constraint in constraints:
-                session.run("CREATE CONSTRAINT FOR ({}) REQUIRE {} IS UNIQUE".format(constraint[0], constraint[1]))
-
-            # A list of indices to create. 
-            # IMPORTANT: If an entry already exists in the constraint list, it also receives an index and does not need to be added here.
-            indicies = ["(n:Assembly) on (n.primaryKey)",
-                        "(n:BioEntityGeneExpressionJoin) on (n.primaryKey)",
-                        "(n:CDS) on (n.gff3ID)",
-                        "(n:CDSSequence) on (n.primaryKey)",
-                        "(n:Chromosome) on (n.primaryKey)",
-                        "(n:Construct) on (n.primaryKey)",
-                        "(n:CrossReference) on (n.crossRefType)",
-                        "(n:CrossReference) on (n.globalCrossRefId)",
-                        "(n:CrossReference) on (n.localId)",
-                        "(n:DOTerm) on (n.isObsolete)",
-                        "(n:DOTerm) on (n.oid)",
-                        "(n:Entity) on (n.primaryKey)",
-                        "(n:Exon) on (n.gff3ID)",
-                        "(n:ExpressionBioEntity) on (n.primaryKey)",
-                        "(n:Feature) on (n.primaryKey)",
-                        "(n:Gene) on (n.localId)",
-                        "(n:Gene) on (n.modGlobalId)",
-                        "(n:Gene) on (n.modLocalId)",
-                        "(n:Gene) on (n.symbol)",
-                        "(n:Gene) on (n.taxonId)",
-                        "(n:Gene) on (n.gff3ID)",
-                        "(n:GeneLevelConsequence) on (n.primaryKey)",
-                        "(n:Genotype) on (n.primaryKey)",
-                        "(n:GOTerm) on (n.isObsolete)",
-                        "(n:GOTerm) on (n.oid)",
-                        "(n:Identifier) on (n.primaryKey)",
-                        "(n:InteractionGeneJoin) on (n.primaryKey)",
-                        "(n:InteractionGeneJoin) on (n.uuid)",
-                        "(n:Load) on (n.primaryKey)",
-                        "(n:Note) on (n.primaryKey)",
-                        "(n:Ontology) on (n.isObsolete)",
-                        "(n:Ontology) on (n.name)",
-                        "(n:Ontology) on (n.primaryKey)",
-                        "(n:OntologyGeneJoin) on (n.primaryKey)",
-                        "(n:OrthologyGeneJoin) on (n.primaryKey)",
-                        "(n:ParalogyGeneJoin) on (n.primaryKey)",
-                        "(n:Phenotype) on (n.primaryKey)",
-                        "(n:PhenotypeEntityJoin) on (n.primaryKey)",
-                        "(n:PhenotypePublicationJoin) on (n.primaryKey)",
-                        "(n:ProteinSequence) on (n.primaryKey)",
-                        "(n:PublicationJoin) on (n.primaryKey)",
-                        "(n:SecondaryId) on (n.primaryKey)",
-                        "(n:SOTerm) on (n.name)",
-                        "(n:Synonym) on (n.primaryKey)",
-                        "(n:Transcript) on (n.dataProvider)",
-                        "(n:Transcript) on (n.gff3ID)",
-                        "(n:TranscriptLevelConsequence) on (n.primaryKey)",
-                        "(n:TranscriptProteinSequence) on (n.primaryKey)",
-                        "(n:Transgene) on (n.primaryKey)",
-                        "(n:UBERONTerm) on (n.isObsolete)",
-                        "(n:VariantProteinSequence) on (n.primaryKey)",
-                        "(n:VariantProteinSequence) on (n.transcriptId)",
-                        "(n:VariantProteinSequence) on (n.variantId)"]
-
-            for index in indicies:
-                session.run("CREATE INDEX FOR " + index)
-
-            two_composite_indices = [["n:Gene", "n.gff3ID", "n.dataProvider"], # transcript_etl
-                                    ["n:Transcript", "n.gff3ID", "n.dataProvider"] # transcript_etl"
-                                    ]
-
-            for index in two_composite_indices:
-                session.run("CREATE INDEX FOR ({}) ON ({}, {})".format(index[0], index[1], index[2]))
-
-            # Run our relationship indices.
-            session.run("CREATE INDEX rel_orthology_idx FOR ()-[r:ORTHOLOGOUS]-() on (r.isBestScore, r.isBestRevScore, r.strictFilter, r.moderateFilter)")
-            session.run("CREATE INDEX rel_paralogy_idx FOR ()-[r:PARALOGOUS]-() on (r.rank, r.length, r.similarity, r.identity)")
+    def get_schema_statements(include_deferred=True):
+        """Return (key, statement) of every constraint and index the load needs"""
+        statements = []
+        for (label, properties) in Neo4jHelper.constraints:
+            statements.append((Neo4jHelper.get_schema_key('constraint', 'NODE', label, properties),
+                               "CREATE CONSTRAINT IF NOT EXISTS FOR (n:%s) REQUIRE %s IS UNIQUE"
+                               % (label, ", ".join("n." + name for name in properties))))
+        for (label, properties) in Neo4jHelper.indices:
+            if not include_deferred and (label, properties) in Neo4jHelper.deferred_indices:
+                continue
+            statements.append((Neo4jHelper.get_schema_key('index', 'NODE', label, properties, 'RANGE'),
+                               "CREATE INDEX IF NOT EXISTS FOR (n:%s) ON (%s)"
+                               % (label, ", ".join("n." + name for name in properties))))
+        for (index_name, relationship_type, properties) in Neo4jHelper.relationship_indices:
+            statements.append((Neo4jHelper.get_schema_key('index', 'RELATIONSHIP', relationship_type, properties,
+                                                          'RANGE'),
+                               "CREATE INDEX %s IF NOT EXISTS FOR ()-[r:%s]-() ON (%s)"
+                               % (index_name, relationship_type, ", ".join("r." + name for name in properties))))
+        return statements
+
+    @staticmethod
+    def get_existing_schema(session):
+        """Return the keys of the constraints and indices of the database"""
+        keys = set()
+        for record in session.run("SHOW CONSTRAINTS YIELD type, entityType, labelsOrTypes, properties"):
+            if 'UNIQUE' in record['type']:
+                keys.add(Neo4jHelper.get_schema_key('constraint', record['entityType'],
+                                                    record['labelsOrTypes'][0], record['properties']))
+        for record in session.run("SHOW INDEXES YIELD type, entityType, labelsOrTypes, properties"):
+            # LOOKUP indexes cover all labels or relationship types, none is declared.
+            if record['labelsOrTypes'] is None:
+                continue
+            # CREATE INDEX made BTREE indexes before Neo4j 5.
+            index_type = 'RANGE' if record['type'] == 'BTREE' else record['type']
+            keys.add(Neo4jHelper.get_schema_key('index', record['entityType'], record['labelsOrTypes'][0],
+                                                record['properties'], index_type))
+        return keys
+
+    @staticmethod
+    def run_schema_statement(statement):
+        """Run a constraint or index statement in its own session, retrying transient errors"""
+        attempt = 0
+        while True:
+            try:
+                with Neo4jHelper.get_driver().session() as session:
+                    session.run(statement).consume()
+                return
+            except Neo4jError as error:
+                if attempt >= Neo4jHelper.index_retries or not error.is_retryable():
+                    raise
+                attempt = attempt + 1
+                logger.warning("Retrying %s: %s", statement, error)
+
+    @staticmethod
+    def create_indices(include_deferred=True):
+        """Create the constraints and indices the database does not have yet, and wait until they are online
+
+        Compared with SHOW CONSTRAINTS and SHOW INDEXES, so it can run again on a
+        loaded database. The statements are submitted concurrently. Without
+        include_deferred, the deferred_indices are left for a later call.
+        """
+        with Neo4jHelper.get_driver().session() as session:
+            existing = Neo4jHelper.get_existing_schema(session)
+
+        missing = [(key, statement) for (key, statement) in Neo4jHelper.get_schema_statements(include_deferred)
+                   if key not in existing]
+        logger.info("Creating %s constraints and indices", len(missing))
+        # Constraints must be created before the indices.
+        for kind in ['constraint', 'index']:
+            statements = [statement for (key, statement) in missing if key[0] == kind]
+            with ThreadPoolExecutor(max_workers=Neo4jHelper.index_threads) as executor:
+                # list() raises the first error of any statement.
+                list(executor.map(Neo4jHelper.run_schema_statement, statements))
+
+        timeout = int(context_info.env["NEO4J_INDEX_TIMEOUT"])
+        logger.info("Waiting up to %ss for the indices to come online", timeout)
+        with Neo4jHelper.get_driver().session() as session:
+            try:
+                session.run("CALL db.awaitIndexes($timeout)", timeout=timeout).consume()
+            except Neo4jError as error:
+                logger.warning("Indices not online after %ss, queries may scan labels until they are: %s", timeout, error)
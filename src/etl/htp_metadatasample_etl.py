@@ -1,6 +1,5 @@
 """HTP Meta Dataset Sample."""
 import logging
-import multiprocessing
 
 from etl import ETL
 from etl.helpers import ETLHelper
@@ -329,14 +328,7 @@ class HTPMetaDatasetSampleETL(ETL):
 
     def _load_and_process_data(self):
         """Load and process data."""
-        thread_pool = []
-
-        for sub_type in self.data_type_config.get_sub_type_objects():
-            p = multiprocessing.Process(target=self._process_sub_type, args=(sub_type,))
-            p.start()
-            thread_pool.append(p)
-
-        ETL.wait_for_threads(thread_pool)
+        self.process_sub_types(self._process_sub_type)
 
     def _process_sub_type(self, sub_type):
         """Process sub type."""
@@ -117,17 +117,9 @@ class OrthologyETL(ETL):
         for sub_type in self.data_type_config.get_sub_type_objects():
             sub_types.append(sub_type.get_data_provider())
 
-        thread_pool = []
-
         query_tracking_list = multiprocessing.Manager().list()
-        for sub_type in self.data_type_config.get_sub_type_objects():
-            process = multiprocessing.Process(target=self._process_sub_type,
-                                              args=(sub_type, sub_types,
-                                                    query_tracking_list))
-            process.start()
-            thread_pool.append(process)
-
-        ETL.wait_for_threads(thread_pool)
+        self.process_sub_types(self._process_sub_type, sub_types,
+                               query_tracking_list)
 
         queries = []
         for item in query_tracking_list:
@@ -186,7 +178,7 @@ class OrthologyETL(ETL):
 
         query_and_file_list = self.process_query_params(query_template_list)
 
-        CSVTransactor.save_file_static(generators, query_and_file_list)
+        CSVTransactor.save_file_static(generators, query_and_file_list, chunked=False)
 
         for item in query_and_file_list:
             query_tracking_list.append(item)
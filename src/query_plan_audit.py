@@ -0,0 +1,184 @@
+"""Query plan audit of the ETL query templates.
+
+Renders every *_query_template of the ETLs with a small sample CSV file,
+runs EXPLAIN on it against a local Neo4j and reports the templates whose
+plans scan labels, build cartesian products, need Eager operators or
+filter a label scan on a property that has no index. Templates merging or
+creating relationships to variables that were never bound are reported as
+well, as those create a new empty node for every row.
+
+The report is written to tmp/query_plan_audit.txt, one finding per line.
+With --check, the audit fails if it finds anything not listed in the
+given file (e.g. a checked in report of the accepted findings), for CI.
+"""
+
+import argparse
+import csv
+import logging
+import os
+import re
+import sys
+
+import coloredlogs
+
+from aggregate_loader import AggregateLoader
+from etl.helpers import Neo4jHelper
+from loader_common import ContextInfo  # Must be the last timeport othersize program fails
+
+
+class QueryPlanAudit():
+    """Finds the query templates with costly plans."""
+
+    logger = logging.getLogger(__name__)
+
+    scan_operators = {'AllNodesScan', 'NodeByLabelScan', 'UnionNodeByLabelsScan', 'IntersectionNodeByLabelsScan',
+                      'SubtractionNodeByLabelsScan', 'DirectedAllRelationshipsScan', 'UndirectedAllRelationshipsScan',
+                      'DirectedRelationshipTypeScan', 'UndirectedRelationshipTypeScan'}
+
+    column_pattern = re.compile(r'\brow\.(\w+)')
+    write_clause_pattern = re.compile(r'\b(?:MERGE|CREATE)\b([^\n]*)', re.IGNORECASE)
+    bare_node_pattern = re.compile(r'(?<![\w.])\(\s*(\w+)\s*\)')
+    bound_pattern = re.compile(r'\(\s*(\w+)\s*[:{]|\bAS\s+(\w+)|\bWITH\s+([\w\s,]+?)(?=\s*$|\s+(?:MATCH|MERGE|CREATE|'
+                               r'OPTIONAL|WHERE|UNWIND|CALL|SET|FOREACH|WITH|RETURN)\b)',
+                               re.IGNORECASE | re.MULTILINE)
+    comment_pattern = re.compile(r'//.*$', re.MULTILINE)
+
+    def __init__(self, sample_dir='tmp'):
+        self.sample_dir = sample_dir
+
+    @staticmethod
+    def get_templates():
+        """Return (name, template) of every LOAD CSV query template of the ETLs, e.g. ("BGIETL.gene_query_template", ...)."""
+        templates = []
+        etl_classes = []
+        for etl_name in AggregateLoader.etl_dispatch:
+            etl_class = AggregateLoader.get_etl_class(etl_name)
+            if etl_class in etl_classes:
+                continue
+            etl_classes.append(etl_class)
+            for attribute, value in sorted(vars(etl_class).items()):
+                if attribute.endswith('_query_template') and isinstance(value, str) and 'LOAD CSV' in value:
+                    templates.append(("%s.%s" % (etl_class.__name__, attribute), value))
+        return templates
+
+    def render(self, name, template):
+        """Return the query of a template loading a sample CSV file with one row, None if it can not be rendered.
+
+        The sample file has every column the template reads from row.
+        """
+        file_name = "query_plan_audit_%s.csv" % name.replace('.', '_')
+        try:
+            query = template % (file_name, 1000)
+        except (TypeError, ValueError):
+            return None
+
+        columns = sorted(set(self.column_pattern.findall(query)))
+        os.makedirs(self.sample_dir, exist_ok=True)
+        with open(os.path.join(self.sample_dir, file_name), 'w', encoding='utf-8') as sample_file:
+            writer = csv.writer(sample_file)
+            writer.writerow(columns)
+            writer.writerow(['1'] * len(columns))
+        return query
+
+    @classmethod
+    def get_plan_findings(cls, plan, parent=None):
+        """Return the findings of an EXPLAIN plan (as a dictionary, see ResultSummary.plan) and its children."""
+        findings = []
+        # Neo4j 5 names operators like NodeByLabelScan@neo4j.
+        operator = plan['operatorType'].split('@')[0]
+        details = plan.get('args', plan.get('arguments', {})).get('Details', '')
+        parent_operator = None if parent is None else parent['operatorType'].split('@')[0]
+        if operator in cls.scan_operators:
+            if parent_operator == 'Filter':
+                parent_details = parent.get('args', parent.get('arguments', {})).get('Details', '')
+                findings.append("missing index: %s filtered on %s" % (details or operator, parent_details))
+            else:
+                findings.append("label scan: %s %s" % (operator, details))
+        elif operator == 'CartesianProduct':
+            findings.append("cartesian product: %s" % ", ".join(plan.get('identifiers', [])))
+        elif operator == 'Eager':
+            findings.append("eager: %s" % details)
+
+        for child in plan.get('children', []):
+            findings.extend(cls.get_plan_findings(child, plan))
+        # One line each in the report.
+        return [' '.join(finding.split()) for finding in findings]
+
+    @classmethod
+    def get_unbound_variables(cls, query):
+        """Return the variables a MERGE or CREATE clause uses as nodes without them being bound before."""
+        query = cls.comment_pattern.sub('', query)
+        bound = set()
+        for match in cls.bound_pattern.finditer(query):
+            if match.group(1) or match.group(2):
+                bound.add(match.group(1) or match.group(2))
+            else:
+                bound.update(variable.strip() for variable in match.group(3).split(','))
+
+        unbound = []
+        for clause in cls.write_clause_pattern.findall(query):
+            for variable in cls.bare_node_pattern.findall(clause):
+                if variable not in bound and variable not in unbound:
+                    unbound.append(variable)
+        return unbound
+
+    def audit(self, session):
+        """Return the findings of every query template, as "<template>: <finding>" lines."""
+        report = []
+        for (name, template) in self.get_templates():
+            query = self.render(name, template)
+            if query is None:
+                report.append("%s: can not be rendered with a file name and a commit size" % name)
+                continue
+
+            findings = ["unbound variable: %s" % variable for variable in self.get_unbound_variables(query)]
+            try:
+                plan = session.run("EXPLAIN " + query).consume().plan
+            except Exception as error:
+                findings.append("can not be planned: %s" % (getattr(error, 'code', None) or type(error).__name__))
+                plan = None
+            if plan:
+                findings.extend(self.get_plan_findings(plan))
+            self.logger.info("%s: %s findings", name, len(findings))
+            report.extend("%s: %s" % (name, finding) for finding in findings)
+        return sorted(set(report))
+
+
+def main():
+    """Entry point of the query plan audit."""
+    parser = argparse.ArgumentParser(
+        description='Report the ETL query templates whose plans scan labels, use Eager or cartesian products.'
+    )
+    parser.add_argument('--report', help='Where to write the report.', default='tmp/query_plan_audit.txt')
+    parser.add_argument('--check',
+                        help='Fail if anything is found that is not listed in this file, e.g. a checked in report.')
+    args = parser.parse_args()
+
+    context_info = ContextInfo()
+    coloredlogs.install(level=logging.DEBUG if context_info.env["DEBUG"] else logging.INFO,
+                        fmt='%(asctime)s %(levelname)s: %(name)s:%(lineno)d: %(message)s')
+    logger = logging.getLogger(__name__)
+
+    with Neo4jHelper.get_driver().session() as session:
+        # So the plans use them.
+        Neo4jHelper.create_indices()
+        report = QueryPlanAudit().audit(session)
+
+    with open(args.report, 'w', encoding='utf-8') as report_file:
+        report_file.write("".join(line + "\n" for line in report))
+    logger.info("%s findings, see %s", len(report), args.report)
+
+    if args.check:
+        with open(args.check, 'r', encoding='utf-8') as accepted_file:
+            accepted = set(line.strip() for line in accepted_file if line.strip())
+        new_findings = [line for line in report if line not in accepted]
+        for line in new_findings:
+            logger.critical("New finding: %s", line)
+        for line in sorted(accepted - set(report)):
+            logger.info("Fixed: %s", line)
+        if new_findings:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+from .commit_sizes import CommitSizes
+from .dead_letter_journal import DeadLetterJournal
+from .etl_scheduler import ETLScheduler
+from .json_lines import append_json_line
+from .pending_batches import PendingBatches
+from .process_waiter import Notification, ProcessWaiter
+from .query_metrics import QueryMetrics
+from .run_manifest import RunManifest
+from .transaction_journal import TransactionJournal
+from .transactor_queue import TransactorQueue
+from .worker_pool import WorkerPool
+from .write_locks import WriteLocks
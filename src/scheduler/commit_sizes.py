@@ -0,0 +1,159 @@
+"""Commit Sizes."""
+
+import json
+import logging
+import os
+import re
+import zlib
+
+from .json_lines import append_json_line
+
+
+class CommitSizes():
+    """Commit size of every query template, learned from how its queries ran.
+
+    The transactors rewrite the IN TRANSACTIONS of N ROWS clause of each
+    query before running it. A template's commit size is picked so one
+    transaction takes about target_seconds at the rows per second its
+    queries reached so far, and stays at most half of any size that ran out
+    of memory. Until a template was measured, the size written in the query
+    is used.
+
+    Every measurement is appended to a history file, so the next load
+    starts from the tuned sizes, and the transactor processes take up what
+    the others learned before sizing a query.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    transactions_pattern = re.compile(r'(\bIN\s+TRANSACTIONS\s+OF\s+)(\d+)(\s+ROWS\b)', re.IGNORECASE)
+    file_pattern = re.compile(r"'file:///[^']*'")
+
+    min_size = 1000
+    max_size = 500000
+    # Weight of the newest measurement in the rows per second of a template.
+    smoothing = 0.5
+
+    target_seconds = 0
+    history_file = None
+    # Bytes of the history file read so far.
+    history_offset = 0
+    templates = {}
+
+    @classmethod
+    def load(cls, history_file, target_seconds):
+        """Read the learned sizes. A target_seconds of 0 keeps the sizes written in the queries."""
+        cls.logger.info("Commit sizes aim at transactions of: %ss", target_seconds)
+        cls.history_file = history_file
+        cls.target_seconds = target_seconds
+        cls.templates = {}
+        cls.history_offset = 0
+        cls.read_history()
+
+    @classmethod
+    def read_history(cls):
+        """Take up the lines appended to the history file since it was last read."""
+        if cls.history_file is None or not os.path.exists(cls.history_file):
+            return
+
+        with open(cls.history_file, 'rb') as history:
+            history.seek(cls.history_offset)
+            data = history.read()
+        # A line still being written is read once it is complete.
+        data = data[:data.rfind(b'\n') + 1]
+        cls.history_offset = cls.history_offset + len(data)
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            cls.templates[entry['template']] = {'rows_per_second': entry['rows_per_second'],
+                                                'ceiling': entry['ceiling']}
+
+    @classmethod
+    def get_template_key(cls, query):
+        """Return the key of the template a query was made from, None if it has no commit size."""
+        if cls.transactions_pattern.search(query) is None:
+            return None
+
+        template = cls.file_pattern.sub("'file:///'", query)
+        template = cls.transactions_pattern.sub(r'\g<1>?\g<3>', template)
+        template = ' '.join(template.split())
+        return "%08x" % zlib.crc32(template.encode('utf-8'))
+
+    @classmethod
+    def get_query(cls, query):
+        """Return (query, commit size) with the commit size of the query's template filled in.
+
+        The commit size is None for queries without an IN TRANSACTIONS clause.
+        """
+        match = cls.transactions_pattern.search(query)
+        if match is None:
+            return query, None
+
+        commit_size = int(match.group(2))
+        if cls.target_seconds <= 0:
+            return query, commit_size
+
+        cls.read_history()
+        template = cls.templates.get(cls.get_template_key(query))
+        if template is None:
+            return query, commit_size
+
+        if template['rows_per_second']:
+            commit_size = template['rows_per_second'] * cls.target_seconds
+        if template['ceiling']:
+            commit_size = min(commit_size, template['ceiling'])
+        # Round, so small changes in speed do not change the query text.
+        commit_size = max(cls.min_size, min(cls.max_size, int(commit_size) // cls.min_size * cls.min_size))
+
+        query = query[:match.start(2)] + str(commit_size) + query[match.end(2):]
+        return query, commit_size
+
+    @classmethod
+    def record(cls, query, commit_size, rows, seconds):
+        """Learn from a query that loaded rows in seconds with the given commit size.
+
+        Runs of less than one full transaction are not learned from: their
+        time is mostly the fixed cost of a query, so small files would
+        drag the rows per second (and the commit size) down.
+        """
+        key = cls.get_template_key(query)
+        if key is None or commit_size is None or seconds <= 0 or rows < commit_size:
+            return
+
+        template = cls.templates.setdefault(key, {'rows_per_second': None, 'ceiling': None})
+        rows_per_second = rows / seconds
+        if template['rows_per_second']:
+            rows_per_second = cls.smoothing * rows_per_second + (1 - cls.smoothing) * template['rows_per_second']
+        template['rows_per_second'] = rows_per_second
+
+        transactions = max(1, -(-rows // commit_size))
+        cls.logger.debug("Template %s: %s rows in %.1fs, %.0f rows/s, %.1fs per transaction of %s rows",
+                         key, rows, seconds, rows / seconds, seconds / transactions, commit_size)
+        cls.save(key, {'commit_size': commit_size, 'rows': rows, 'seconds': seconds,
+                       'transaction_seconds': seconds / transactions})
+
+    @classmethod
+    def record_memory_failure(cls, query, commit_size):
+        """Learn that a query ran out of memory with the given commit size."""
+        key = cls.get_template_key(query)
+        if key is None or commit_size is None:
+            return
+
+        template = cls.templates.setdefault(key, {'rows_per_second': None, 'ceiling': None})
+        ceiling = max(cls.min_size, commit_size // 2)
+        if template['ceiling'] is None or ceiling < template['ceiling']:
+            template['ceiling'] = ceiling
+        cls.logger.warning("Template %s ran out of memory with %s rows per transaction, using at most %s",
+                           key, commit_size, template['ceiling'])
+        cls.save(key, {'commit_size': commit_size, 'out_of_memory': True})
+
+    @classmethod
+    def save(cls, key, measurement):
+        """Append a measurement and the resulting state of a template to the history file."""
+        if cls.history_file is None:
+            return
+
+        entry = dict(measurement, template=key, **cls.templates[key])
+        append_json_line(cls.history_file, entry)
@@ -0,0 +1,66 @@
+"""Dead Letter Journal."""
+
+import json
+import logging
+import os
+
+from .json_lines import append_json_line
+
+
+class DeadLetterJournal():
+    """On-disk journal of the queries Neo4j rejected for good.
+
+    A JSON lines file with one entry per failed query batch: the ETL it
+    came from, the queries (with their CSV files) that were not loaded and
+    the error. Once the cause is fixed the entries can be replayed with
+    the loader's --replay-dead-letters option.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Class level so forked transactors record into the same journal.
+    file_name = None
+
+    def __init__(self, file_name, keep=False):
+        """Record into file_name, starting a new journal unless keep is set."""
+        DeadLetterJournal.file_name = file_name
+        os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+        if not keep:
+            open(file_name, 'w').close()
+
+    @staticmethod
+    def record(etl_name, query_batch, error):
+        """Append a failed query batch to the journal."""
+        if DeadLetterJournal.file_name is None:
+            return
+
+        entry = {'etl': etl_name, 'queries': query_batch, 'error': str(error)}
+        append_json_line(DeadLetterJournal.file_name, entry)
+
+    @staticmethod
+    def get_entries(file_name):
+        """Return the (etl, queries, error) entries of a journal."""
+        entries = []
+        if not os.path.exists(file_name):
+            return entries
+
+        with open(file_name, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    DeadLetterJournal.logger.warning("Skipping unreadable dead letter journal line: %s", line)
+                    continue
+                entries.append((entry['etl'], entry['queries'], entry['error']))
+        return entries
+
+    def take_entries(self):
+        """Return the entries recorded so far and start a new journal for what fails again.
+
+        The old journal is kept next to it with a '.replayed' suffix.
+        """
+        entries = self.get_entries(self.file_name)
+        if os.path.exists(self.file_name):
+            os.replace(self.file_name, self.file_name + '.replayed')
+        open(self.file_name, 'w').close()
+        return entries
@@ -0,0 +1,163 @@
+"""ETL Scheduler."""
+
+import logging
+import sys
+
+
+class ETLScheduler():
+    """Schedules ETLs as a dependency DAG instead of a fixed list of groups.
+
+    Each entry of etl_specs declares the ETLs whose data it 'reads' and the
+    node labels it 'locks'. An ETL is ready once every ETL it reads from has
+    finished and none of its locks are held by an ETL that is still running.
+    A 'reads' entry of '*' means every ETL declared before it.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, etl_specs):
+        self.etl_names = list(etl_specs)
+        self.locks = {}
+        for etl_name in self.etl_names:
+            self.locks[etl_name] = set(etl_specs[etl_name].get('locks', []))
+        self.dependencies = self.build_dependencies(etl_specs)
+        self.wildcard_readers = set(etl_name for etl_name in self.etl_names
+                                    if '*' in etl_specs[etl_name].get('reads', []))
+
+        self.pending = list(self.etl_names)
+        self.running = []
+        self.finished = []
+
+    @classmethod
+    def build_dependencies(cls, etl_specs):
+        """Return a dictionary of ETL name -> set of ETL names it must wait for."""
+        etl_names = list(etl_specs)
+        dependencies = {}
+        for position, etl_name in enumerate(etl_names):
+            reads = etl_specs[etl_name].get('reads', [])
+            if '*' in reads:
+                dependencies[etl_name] = set(etl_names[:position])
+                continue
+            for read in reads:
+                if read not in etl_specs:
+                    cls.logger.critical("ETL %s reads from unknown ETL %s", etl_name, read)
+                    sys.exit(-1)
+            dependencies[etl_name] = set(reads)
+
+        cls.get_load_order(dependencies)
+
+        return dependencies
+
+    @classmethod
+    def get_load_order(cls, dependencies):
+        """Return the ETL names in an order that satisfies their dependencies.
+
+        Exits if the dependencies are cyclic.
+        """
+        load_order = []
+        remaining = dict((etl_name, set(reads)) for etl_name, reads in dependencies.items())
+        while remaining:
+            free = [etl_name for etl_name, reads in remaining.items() if not reads]
+            if not free:
+                cls.logger.critical("Cyclic ETL dependencies between: %s", sorted(remaining))
+                sys.exit(-1)
+            for etl_name in free:
+                del remaining[etl_name]
+            for reads in remaining.values():
+                reads.difference_update(free)
+            load_order.extend(free)
+
+        return load_order
+
+    def held_locks(self):
+        """Return the set of labels locked by the running ETLs."""
+        held = set()
+        for etl_name in self.running:
+            held.update(self.locks[etl_name])
+        return held
+
+    def get_ready_etls(self):
+        """Return the pending ETLs that can start now, in declaration order.
+
+        The returned ETLs do not conflict with each other, so all of them can
+        be started together.
+        """
+        held = self.held_locks()
+        ready = []
+        for etl_name in self.pending:
+            if not self.dependencies[etl_name].issubset(self.finished):
+                continue
+            if self.locks[etl_name] & held:
+                continue
+            held.update(self.locks[etl_name])
+            ready.append(etl_name)
+        return ready
+
+    def get_upcoming_etls(self):
+        """Return the pending ETLs that are not ready yet but whose dependencies have all started.
+
+        These are the next ETLs to become ready, in declaration order.
+        """
+        started = set(self.running) | set(self.finished)
+        ready = self.get_ready_etls()
+        upcoming = []
+        for etl_name in self.pending:
+            if etl_name not in ready and self.dependencies[etl_name].issubset(started):
+                upcoming.append(etl_name)
+        return upcoming
+
+    def is_waited_on(self, etl_name):
+        """Check whether an ETL still to run reads from etl_name.
+
+        Reads of '*' do not count, those ETLs wait for everything anyway.
+        """
+        for waiting_etl in self.pending:
+            if waiting_etl not in self.wildcard_readers and etl_name in self.dependencies[waiting_etl]:
+                return True
+        return False
+
+    def start(self, etl_name):
+        """Mark an ETL as running; it holds its locks until finished."""
+        self.pending.remove(etl_name)
+        self.running.append(etl_name)
+
+    def finish(self, etl_name):
+        """Mark an ETL as finished, releasing its locks."""
+        if etl_name in self.pending:
+            self.pending.remove(etl_name)
+        if etl_name in self.running:
+            self.running.remove(etl_name)
+        self.finished.append(etl_name)
+
+    def is_finished(self):
+        """Return True once every ETL has finished."""
+        return not self.pending and not self.running
+
+    def critical_path(self, durations):
+        """Return the longest dependency chain and its length in seconds.
+
+        durations: dictionary of ETL name -> elapsed seconds. ETLs without an
+        entry (e.g. skipped ones) count as zero.
+        """
+        path_time = {}
+        path_previous = {}
+        for etl_name in self.get_load_order(self.dependencies):
+            previous = None
+            for dependency in sorted(self.dependencies[etl_name]):
+                if previous is None or path_time[dependency] > path_time[previous]:
+                    previous = dependency
+            start_time = path_time[previous] if previous is not None else 0
+            path_time[etl_name] = start_time + durations.get(etl_name, 0)
+            path_previous[etl_name] = previous
+
+        if not path_time:
+            return [], 0
+
+        etl_name = max(self.etl_names, key=lambda name: path_time[name])
+        total_time = path_time[etl_name]
+        path = []
+        while etl_name is not None:
+            path.insert(0, etl_name)
+            etl_name = path_previous[etl_name]
+
+        return path, total_time
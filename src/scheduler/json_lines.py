@@ -0,0 +1,18 @@
+"""JSON Lines."""
+
+import json
+import os
+
+
+def append_json_line(file_name, record):
+    """Append record as a JSON line to file_name, creating the file if needed.
+
+    The line is one write on an O_APPEND descriptor, so lines appended by
+    different processes never interleave.
+    """
+    line = (json.dumps(record) + "\n").encode('utf-8')
+    file_descriptor = os.open(file_name, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    try:
+        os.write(file_descriptor, line)
+    finally:
+        os.close(file_descriptor)
@@ -0,0 +1,57 @@
+"""Pending Batches."""
+
+import multiprocessing
+import zlib
+
+
+class PendingBatches():
+    """Shared count of the query batches queued and not finished yet.
+
+    Replaces a Manager().dict() of the batches: the pending batches of each
+    owner (the ETL submitting them) and of each batch key are counted in
+    shared memory, so checking them is no round trip to a server process,
+    and waiting for a batch blocks on a condition notified as batches
+    finish. Owners and batch keys are hashed onto slots; a collision only
+    makes a wait last until the other batch finished too.
+
+    Must be created before the processes using it are forked.
+    """
+
+    slot_count = 4096
+
+    def __init__(self):
+        self.owners = multiprocessing.Array('l', self.slot_count, lock=False)
+        self.batches = multiprocessing.Array('l', self.slot_count, lock=False)
+        self.condition = multiprocessing.Condition()
+
+    @classmethod
+    def get_slot(cls, key):
+        """Return the slot of an owner or batch key."""
+        return zlib.crc32(repr(key).encode('utf-8')) % cls.slot_count
+
+    def add(self, batch_key):
+        """Count a queued batch, batch_key is (owner, pid, count)."""
+        with self.condition:
+            self.owners[self.get_slot(batch_key[0])] += 1
+            self.batches[self.get_slot(batch_key)] += 1
+
+    def remove(self, batch_key):
+        """Count a batch as finished, waking up the processes waiting for one."""
+        with self.condition:
+            self.owners[self.get_slot(batch_key[0])] -= 1
+            self.batches[self.get_slot(batch_key)] -= 1
+            self.condition.notify_all()
+
+    def wait(self, batch_key):
+        """Wait until the batch queued under batch_key finished."""
+        slot = self.get_slot(batch_key)
+        with self.condition:
+            self.condition.wait_for(lambda: self.batches[slot] <= 0)
+
+    def has_owner(self, owner):
+        """Check whether any batch of owner has not finished yet."""
+        return self.owners[self.get_slot(owner)] > 0
+
+    def __len__(self):
+        """Return the number of pending batches."""
+        return sum(self.owners[:])
@@ -0,0 +1,96 @@
+"""Process Waiter."""
+
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from multiprocessing import connection
+
+
+class Notification():
+    """A wake up call any process can send and ProcessWaiter.wait can wait for.
+
+    Must be created before the processes sending it are forked.
+    """
+
+    def __init__(self):
+        self.reader, self.writer = multiprocessing.Pipe(duplex=False)
+        # Never block the sender; a full pipe already has a wake up call waiting.
+        os.set_blocking(self.writer.fileno(), False)
+
+    def notify(self):
+        """Wake up the waiting process."""
+        try:
+            self.writer.send_bytes(b'')
+        except BlockingIOError:
+            pass
+
+    def clear(self):
+        """Drop the wake up calls received so far. Call before checking what changed."""
+        while self.reader.poll():
+            self.reader.recv_bytes()
+
+
+class ProcessWaiter():
+    """Waits for worker processes and queues without polling.
+
+    Waiting is done on the process sentinels (and Notification pipes) with
+    multiprocessing.connection.wait, so the waiting process wakes up the
+    moment a worker exits, fails or a queue is done.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def wait(processes, notifications=(), timeout=None):
+        """Block until one of the processes exits or one of the notifications is sent.
+
+        Returns the processes that exited.
+        """
+        sentinels = {process.sentinel: process for process in processes}
+        readers = [notification.reader for notification in notifications]
+        ready = connection.wait(list(sentinels) + readers, timeout)
+        return [sentinels[handle] for handle in ready if handle in sentinels]
+
+    @classmethod
+    def check_processes(cls, processes):
+        """Remove finished processes from the list. Exits if any of them failed."""
+        for process in list(processes):
+            if process.exitcode is None:
+                continue
+            if process.exitcode != 0:
+                cls.logger.critical("Process %s failed, exit code: %s Killing Children", process.name, process.exitcode)
+                for running_process in processes:
+                    running_process.terminate()
+                sys.exit(-1)
+            process.join()
+            processes.remove(process)
+
+    @staticmethod
+    def join_in_background(queue):
+        """Return a Notification sent once queue.join() returns."""
+        joined = Notification()
+
+        def join():
+            queue.join()
+            joined.notify()
+
+        threading.Thread(target=join, daemon=True).start()
+        return joined
+
+    @classmethod
+    def wait_for_processes(cls, processes, queue=None):
+        """Wait until all processes finished, or until all work put on queue is done.
+
+        Exits as soon as one of the processes fails.
+        """
+        notifications = []
+        if queue is not None:
+            notifications.append(cls.join_in_background(queue))
+
+        while len(processes) > 0:
+            cls.wait(processes, notifications)
+            cls.check_processes(processes)
+            if notifications and notifications[0].reader.poll():
+                return
@@ -0,0 +1,111 @@
+"""Query Metrics."""
+
+import json
+import logging
+import os
+
+from .commit_sizes import CommitSizes
+from .json_lines import append_json_line
+
+
+class QueryMetrics():
+    """On-disk metrics of every query the transactors ran, and a report ranking their templates.
+
+    A JSON lines file with one entry per query: its ETL, template and CSV
+    file, how long its batch waited in the queue and how long it ran, its
+    rows, the counters of its Bolt result summary (nodes and relationships
+    created, properties set, ...) and its database hits if it was profiled.
+    get_report sums them up per query template, to find the templates
+    that dominate the load time.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    counter_names = ['nodes_created', 'nodes_deleted', 'relationships_created', 'relationships_deleted',
+                     'properties_set', 'labels_added', 'labels_removed']
+
+    # Class level so forked transactors record into the same file.
+    file_name = None
+
+    def __init__(self, file_name, keep=False):
+        """Record into file_name, starting a new file unless keep is set."""
+        QueryMetrics.file_name = file_name
+        os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+        if not keep:
+            open(file_name, 'w').close()
+
+    @staticmethod
+    def get_db_hits(profile):
+        """Return the database hits of a profiled plan and its children, None if not profiled."""
+        if not profile:
+            return None
+        return profile.get('dbHits', 0) + sum(QueryMetrics.get_db_hits(child) or 0
+                                              for child in profile.get('children', []))
+
+    @staticmethod
+    def record(etl_name, query, csv_file_name, queue_seconds, run_seconds, rows, summary):
+        """Append the metrics of a query that ran, summary is its neo4j ResultSummary (None if not run)."""
+        if QueryMetrics.file_name is None:
+            return
+
+        entry = {'etl': etl_name, 'template': CommitSizes.get_template_key(query) or csv_file_name,
+                 'file': csv_file_name, 'queue_seconds': round(queue_seconds, 3),
+                 'run_seconds': round(run_seconds, 3), 'rows': rows}
+        if summary is not None:
+            for name in QueryMetrics.counter_names:
+                entry[name] = getattr(summary.counters, name)
+            db_hits = QueryMetrics.get_db_hits(summary.profile)
+            if db_hits is not None:
+                entry['db_hits'] = db_hits
+        append_json_line(QueryMetrics.file_name, entry)
+
+    @staticmethod
+    def get_templates(file_name):
+        """Return the metrics summed up per template, as a dictionary of template -> totals."""
+        templates = {}
+        if not os.path.exists(file_name):
+            return templates
+
+        with open(file_name, 'r', encoding='utf-8') as metrics:
+            for line in metrics:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                totals = templates.setdefault(entry['template'], {'etl': entry['etl'], 'file': entry['file'],
+                                                                  'queries': 0, 'queue_seconds': 0,
+                                                                  'run_seconds': 0, 'rows': 0})
+                totals['queries'] += 1
+                for name in ['queue_seconds', 'run_seconds', 'rows', 'db_hits'] + QueryMetrics.counter_names:
+                    if entry.get(name) is not None:
+                        totals[name] = totals.get(name, 0) + entry[name]
+        return templates
+
+    @staticmethod
+    def describe(totals):
+        """Return the totals of a template as a line for the report."""
+        rows_per_second = totals['rows'] / totals['run_seconds'] if totals['run_seconds'] else 0
+        line = ("%s (%s, e.g. %s): %s queries, run %.1fs, queued %.1fs, %s rows, %.0f rows/s"
+                % (totals['template'], totals['etl'], totals['file'], totals['queries'], totals['run_seconds'],
+                   totals['queue_seconds'], totals['rows'], rows_per_second))
+        for name in QueryMetrics.counter_names + ['db_hits']:
+            if totals.get(name):
+                line = line + ", %s %s" % (name.replace('_', ' '), totals[name])
+        return line
+
+    @staticmethod
+    def get_report(file_name, count=10):
+        """Return the lines of a report of the slowest templates and those loading the fewest rows per second."""
+        templates = QueryMetrics.get_templates(file_name)
+        for template, totals in templates.items():
+            totals['template'] = template
+        slowest = sorted(templates.values(), key=lambda totals: totals['run_seconds'], reverse=True)
+        # Only templates loading rows can be compared by their rate.
+        loading = [totals for totals in templates.values() if totals['rows'] and totals['run_seconds']]
+        worst_rate = sorted(loading, key=lambda totals: totals['rows'] / totals['run_seconds'])
+
+        report = ["Slowest query templates:"]
+        report.extend("  " + QueryMetrics.describe(totals) for totals in slowest[:count])
+        report.append("Fewest rows per second:")
+        report.extend("  " + QueryMetrics.describe(totals) for totals in worst_rate[:count])
+        return report
@@ -0,0 +1,208 @@
+"""Run Manifest."""
+
+import hashlib
+import json
+import logging
+import os
+import re
+
+from .json_lines import append_json_line
+
+
+class RunManifest():
+    """Persistent record of a load, used to resume an interrupted load.
+
+    The manifest is an append-only JSON lines file. Every process of the load
+    (the scheduler, the ETL children and the Neo4jTransactor workers) appends
+    its events to it, so after a crash it tells us which ETLs completed,
+    which queries (with the CSV files they load) were submitted and which of
+    them Neo4j acknowledged.
+
+    Transactors record when they start a query, as queries loading in
+    several transactions leave the rows they committed behind when
+    interrupted. Resuming must not write those rows again, see
+    get_unsafe_queries.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Class level so forked children record into the same manifest.
+    file_name = None
+    acknowledged_queries = set()
+
+    # CREATE clauses, but not ON CREATE SET.
+    create_pattern = re.compile(r'\bCREATE\b(?!\s+SET\b)', re.IGNORECASE)
+    merge_pattern = re.compile(r'\bMERGE\b|\bapoc\.merge\.', re.IGNORECASE)
+
+    def __init__(self, file_name, resume=False):
+        RunManifest.file_name = file_name
+
+        self.finished_etls = set()
+        self.extracted_etls = set()
+        self.submitted_queries = {}
+        # Queries that started writing, on the rows of the ETL's CSV files, and on rows it generated before.
+        self.started_queries = {}
+        self.rewritten_queries = []
+        self.deferred_queries = []
+        self.resumed = False
+
+        if resume and os.path.exists(file_name):
+            self.load()
+            self.resumed = True
+        else:
+            if resume:
+                self.logger.warning("No run manifest found at %s, starting a new load.", file_name)
+            os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+            open(file_name, 'w').close()
+
+    @staticmethod
+    def get_query_key(query, file_name):
+        """Return the key identifying a query on a CSV file across runs."""
+        return file_name + ":" + hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def record(event, **fields):
+        """Append an event to the manifest. Does nothing if no manifest is in use."""
+        if RunManifest.file_name is None:
+            return
+
+        fields['event'] = event
+        append_json_line(RunManifest.file_name, fields)
+
+    @staticmethod
+    def is_acknowledged(query, file_name):
+        """Check whether a query was acknowledged by Neo4j in the run being resumed."""
+        return RunManifest.get_query_key(query, file_name) in RunManifest.acknowledged_queries
+
+    def load(self):
+        """Read the manifest of the run being resumed."""
+        self.logger.info("Loading run manifest: %s", self.file_name)
+        with open(self.file_name, 'r', encoding='utf-8') as manifest:
+            for line in manifest:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash can leave a partial last line behind.
+                    self.logger.warning("Skipping unreadable run manifest line: %s", line)
+                    continue
+
+                event = entry['event']
+                if event == 'etl_finished':
+                    self.finished_etls.add(entry['etl'])
+                elif event == 'etl_extracted':
+                    self.extracted_etls.add(entry['etl'])
+                elif event == 'batch_submitted':
+                    for (query, file_name) in entry['queries']:
+                        query_key = self.get_query_key(query, file_name)
+                        self.submitted_queries[query_key] = (entry['etl'], query, file_name)
+                elif event == 'query_started':
+                    if entry['query'] in self.submitted_queries:
+                        self.started_queries[entry['query']] = self.submitted_queries[entry['query']]
+                elif event == 'query_acknowledged':
+                    RunManifest.acknowledged_queries.add(entry['query'])
+                elif event == 'query_deferred':
+                    self.deferred_queries.append(entry['query'])
+                elif event == 'etl_restarted':
+                    self.forget_etl(entry['etl'])
+                elif event == 'etl_cleared':
+                    self.forget_writes(entry['etl'])
+
+        self.logger.info("Run manifest: %s finished ETLs, %s acknowledged queries",
+                         len(self.finished_etls),
+                         len(RunManifest.acknowledged_queries))
+
+    def forget_etl(self, etl_name):
+        """Forget the queries an ETL submitted and Neo4j acknowledged, and that it was extracted.
+
+        The queries it started are kept in rewritten_queries, as what they wrote stays in the database.
+        """
+        for query_key, (owner, _, _) in list(self.submitted_queries.items()):
+            if owner == etl_name:
+                del self.submitted_queries[query_key]
+                RunManifest.acknowledged_queries.discard(query_key)
+        for query_key, started_query in list(self.started_queries.items()):
+            if started_query[0] == etl_name:
+                del self.started_queries[query_key]
+                self.rewritten_queries.append(started_query)
+        self.extracted_etls.discard(etl_name)
+
+    def restart_etl(self, etl_name):
+        """Forget what an ETL did in the run being resumed, before it runs again.
+
+        Its CSV files are written again, with new rows (e.g. new uuids) under
+        the same file names, so none of its queries may be skipped as acknowledged.
+        Must be called before the ETL is forked.
+        """
+        if not self.resumed:
+            return
+
+        self.forget_etl(etl_name)
+        RunManifest.record('etl_restarted', etl=etl_name)
+
+    def forget_writes(self, etl_name):
+        """Forget an ETL like forget_etl does, and the queries it started, as what they wrote was deleted."""
+        self.forget_etl(etl_name)
+        self.rewritten_queries = [query for query in self.rewritten_queries if query[0] != etl_name]
+
+    def clear_etl(self, etl_name):
+        """Forget everything an ETL did in the run being resumed, once what it loaded was deleted from the database."""
+        self.forget_writes(etl_name)
+        RunManifest.record('etl_cleared', etl=etl_name)
+
+    @classmethod
+    def is_repeatable(cls, query, same_rows):
+        """Check whether running a query that (partly) ran before leaves the database as running it once.
+
+        Queries with a CREATE clause never do. Merging queries do on the same
+        rows, but not on rows generated again, whose keys (e.g. uuids) differ.
+        """
+        if cls.create_pattern.search(query) is not None:
+            return False
+        return same_rows or cls.merge_pattern.search(query) is None
+
+    def get_unsafe_queries(self, etl_name):
+        """Return the queries an ETL (partly) loaded that would write their rows again when it is resumed.
+
+        Its unacknowledged queries are replayed on their CSV files if they are
+        all still there (see get_unacknowledged_batch), otherwise the ETL runs
+        again and every query it started loads the rows generated again.
+        """
+        replay = etl_name in self.extracted_etls and self.get_unacknowledged_batch(etl_name) is not None
+        unsafe = []
+        for query_key, (owner, query, file_name) in self.started_queries.items():
+            if owner != etl_name:
+                continue
+            if replay and (query_key in RunManifest.acknowledged_queries or self.is_repeatable(query, True)):
+                continue
+            if not replay and self.is_repeatable(query, False):
+                continue
+            unsafe.append([query, file_name])
+        for (owner, query, file_name) in self.rewritten_queries:
+            if owner == etl_name and not self.is_repeatable(query, False):
+                unsafe.append([query, file_name])
+        return unsafe
+
+    def get_deferred_queries(self):
+        """Return the queries deferred while the database was offline that Neo4j never acknowledged.
+
+        Run them in order and record 'query_acknowledged' with get_query_key(query, '') for each.
+        """
+        return [query for query in self.deferred_queries
+                if self.get_query_key(query, '') not in RunManifest.acknowledged_queries]
+
+    def get_unacknowledged_batch(self, etl_name):
+        """Return the submitted queries of an ETL that Neo4j never acknowledged.
+
+        Returns None if a CSV file needed to replay them is missing, in which
+        case the ETL has to be run again.
+        """
+        query_batch = []
+        for query_key, (owner, query, file_name) in self.submitted_queries.items():
+            if owner != etl_name or query_key in RunManifest.acknowledged_queries:
+                continue
+            if not os.path.exists(os.path.join('tmp', file_name)):
+                self.logger.warning("CSV file %s of %s is missing, rerunning the ETL.", file_name, etl_name)
+                return None
+            query_batch.append([query, file_name])
+
+        return query_batch
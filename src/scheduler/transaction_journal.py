@@ -0,0 +1,114 @@
+"""Transaction Journal."""
+
+import hashlib
+import json
+import logging
+import os
+
+from .json_lines import append_json_line
+
+
+class TransactionJournal():
+    """On-disk journal of every query Neo4j ran, to replay a load without its ETLs.
+
+    A JSON lines file with one entry per query, in the order they finished:
+    the ETL it came from, the query batch it ran in (queries of a batch run
+    in order), the query as it ran (with its commit size), its CSV file and
+    the checksum of that file, or its rows for parameter queries, and how
+    long it took. The loader's --replay-journal option runs the journal
+    against a fresh database, so Neo4j settings and transactor changes can
+    be compared without downloading and parsing the files again.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Class level so forked transactors record into the same journal.
+    file_name = None
+    # Checksums of the CSV files, per process.
+    checksums = {}
+
+    def __init__(self, file_name, keep=False):
+        """Record into file_name, starting a new journal unless keep is set."""
+        TransactionJournal.file_name = file_name
+        TransactionJournal.checksums = {}
+        os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+        if not keep:
+            open(file_name, 'w').close()
+
+    @staticmethod
+    def get_checksum(csv_file_name):
+        """Return the SHA-1 of a CSV file in the tmp directory, None if there is none."""
+        path = os.path.join('tmp', csv_file_name)
+        if not os.path.exists(path):
+            return None
+
+        checksum = hashlib.sha1()
+        with open(path, 'rb') as csv_file:
+            for block in iter(lambda: csv_file.read(1024 * 1024), b''):
+                checksum.update(block)
+        return checksum.hexdigest()
+
+    @staticmethod
+    def record(etl_name, batch, query, csv_file_name, rows, seconds):
+        """Append a query that ran to the journal.
+
+        batch names the query batch it ran in, e.g. "BGI-1234-5".
+        """
+        if TransactionJournal.file_name is None:
+            return
+
+        entry = {'etl': etl_name, 'batch': batch, 'query': query, 'file': csv_file_name, 'seconds': round(seconds, 3)}
+        if rows is None:
+            if csv_file_name not in TransactionJournal.checksums:
+                TransactionJournal.checksums[csv_file_name] = TransactionJournal.get_checksum(csv_file_name)
+            entry['checksum'] = TransactionJournal.checksums[csv_file_name]
+        else:
+            entry['rows'] = rows
+        append_json_line(TransactionJournal.file_name, entry)
+
+    @staticmethod
+    def get_entries(file_name):
+        """Return the entries of a journal, as dictionaries."""
+        entries = []
+        if not os.path.exists(file_name):
+            return entries
+
+        with open(file_name, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    TransactionJournal.logger.warning("Skipping unreadable transaction journal line: %s", line)
+        return entries
+
+    @staticmethod
+    def get_changed_files(entries):
+        """Return the CSV files of the entries that are missing or no longer match their checksum."""
+        changed = []
+        checked = set()
+        for entry in entries:
+            if 'rows' in entry or entry['file'] in checked:
+                continue
+            checked.add(entry['file'])
+            if TransactionJournal.get_checksum(entry['file']) != entry['checksum']:
+                changed.append(entry['file'])
+        return changed
+
+    @staticmethod
+    def get_batches(entries):
+        """Return the query batches of each ETL, in the order they started running.
+
+        Returns a dictionary of ETL name -> list of query batches, each a
+        list of [query, file] or [query, file, rows] entries.
+        """
+        batches = {}
+        etl_batches = {}
+        for entry in entries:
+            if entry['batch'] not in batches:
+                batches[entry['batch']] = []
+                etl_batches.setdefault(entry['etl'], []).append(batches[entry['batch']])
+            query = [entry['query'], entry['file']]
+            if 'rows' in entry:
+                query.append(entry['rows'])
+            batches[entry['batch']].append(query)
+        return etl_batches
@@ -0,0 +1,104 @@
+"""Transactor Queue."""
+
+import multiprocessing
+import pickle
+import time
+
+
+class TransactorQueue():
+    """Work queue with priorities shared by the transactor processes.
+
+    Replaces a Manager().Queue(): items are pickled straight onto one pipe
+    per priority instead of going through a separate server process. The
+    pipes are multiprocessing Queues, whose feeder threads write in the
+    background, so put() never blocks on an item larger than the pipe
+    buffer while the readers wait for it to be counted. A semaphore counts
+    the queued items so get() blocks without polling, and,
+    like a JoinableQueue, join() waits until task_done() was called for
+    every item put. The depth per priority and how long items waited are
+    kept in shared memory for monitoring.
+
+    Must be created before the processes using it are forked.
+    """
+
+    # Batches of the ETLs others wait for, ahead of the bulk loads.
+    HIGH = 0
+    LOW = 1
+    priority_names = ['high', 'low']
+
+    def __init__(self):
+        self.queues = [multiprocessing.Queue() for _ in self.priority_names]
+        self.items = multiprocessing.Semaphore(0)
+        self.depth = multiprocessing.Array('l', len(self.priority_names))
+        # Items taken, total and longest wait in seconds.
+        self.wait_stats = multiprocessing.Array('d', 3)
+        self.unfinished = multiprocessing.Value('l', 0, lock=False)
+        self.all_done = multiprocessing.Condition()
+
+    def put(self, item, priority=LOW):
+        """Queue an item, it is taken before every item of a lower priority."""
+        with self.all_done:
+            self.unfinished.value += 1
+        with self.depth.get_lock():
+            self.depth[priority] += 1
+        # Pickled now, as the feeder thread would only pickle the item once it gets to it.
+        self.queues[priority].put(pickle.dumps((time.time(), item), pickle.HIGHEST_PROTOCOL))
+        self.items.release()
+
+    def get(self, block=True):
+        """Take the oldest item of the highest priority.
+
+        Waits for one if needed, unless block is False: then returns None if the queue is empty.
+        """
+        if not self.items.acquire(block):
+            return None
+        # The semaphore guarantees one of the pipes holds an item for us, or soon
+        # will, once the feeder thread of its producer wrote it. The depth tells which.
+        with self.depth.get_lock():
+            priority = [index for index, depth in enumerate(self.depth[:]) if depth > 0][0]
+            self.depth[priority] -= 1
+        # Only waits for that feeder thread, the queue's own read lock lets one reader in at a time.
+        data = self.queues[priority].get()
+        (put_time, item) = pickle.loads(data)
+
+        waited = time.time() - put_time
+        with self.wait_stats.get_lock():
+            self.wait_stats[0] += 1
+            self.wait_stats[1] += waited
+            self.wait_stats[2] = max(self.wait_stats[2], waited)
+        return item
+
+    def task_done(self):
+        """Mark an item taken with get() as processed."""
+        with self.all_done:
+            self.unfinished.value -= 1
+            if self.unfinished.value == 0:
+                self.all_done.notify_all()
+
+    def join(self):
+        """Wait until every item put has been processed."""
+        with self.all_done:
+            self.all_done.wait_for(lambda: self.unfinished.value == 0)
+
+    def qsize(self):
+        """Return the number of queued items."""
+        return sum(self.depth[:])
+
+    def empty(self):
+        """Check whether no items are queued."""
+        return self.qsize() == 0
+
+    def get_stats(self):
+        """Return the queue depth per priority and how long taken items waited."""
+        with self.wait_stats.get_lock():
+            (taken, total_wait, max_wait) = self.wait_stats[:]
+        stats = dict(zip(self.priority_names, self.depth[:]))
+        stats['taken'] = int(taken)
+        stats['average_wait'] = total_wait / taken if taken else 0
+        stats['max_wait'] = max_wait
+        return stats
+
+    def describe_stats(self):
+        """Return the queue stats as a line for the logs."""
+        return ("Queue depth high: %(high)s low: %(low)s, %(taken)s items taken, "
+                "average wait: %(average_wait).1fs, longest wait: %(max_wait).1fs" % self.get_stats())
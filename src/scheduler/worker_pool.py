@@ -0,0 +1,189 @@
+"""Worker Pool."""
+
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import resource
+
+from .json_lines import append_json_line
+from .process_waiter import ProcessWaiter
+
+
+class WorkerPool():
+    """Limits the sub-type worker processes running across all ETLs.
+
+    Two limits are shared by every ETL: a number of process slots and a
+    memory budget. Both are created in the main process before any ETL is
+    forked. A job only starts once a slot is free and its estimated peak
+    RSS fits in what is left of the budget. Each worker owns its slot and
+    memory reservation while it runs and gives them back when it exits.
+
+    The peak RSS of every finished job is appended to a history file, so the
+    next load estimates from what the same sub type really used instead of
+    from its input file size alone.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Used to estimate jobs without history: parsed JSON takes several times its size on disk.
+    base_memory = 256 * 1024 * 1024
+    memory_per_input_byte = 8
+
+    slots = None
+    memory_budget = None
+    memory_in_use = None
+    memory_condition = None
+    memory_history_file = None
+    memory_history = {}
+
+    # State of the job running in this worker process.
+    holding_slot = False
+    holding_memory = False
+    reserved_memory = 0
+
+    @classmethod
+    def set_size(cls, worker_count):
+        """Create the shared slots. Must be called before the ETLs are forked."""
+        cls.logger.info("Sub-type worker processes limited to: %s", worker_count)
+        cls.slots = multiprocessing.BoundedSemaphore(worker_count)
+
+    @classmethod
+    def set_memory_budget(cls, memory_budget, history_file):
+        """Create the shared memory budget (bytes). Must be called before the ETLs are forked."""
+        cls.logger.info("Sub-type worker memory budget: %s MB", memory_budget // (1024 * 1024))
+        cls.memory_budget = memory_budget
+        cls.memory_in_use = multiprocessing.Value('d', 0, lock=False)
+        cls.memory_condition = multiprocessing.Condition()
+        cls.memory_history_file = history_file
+        cls.memory_history = cls.load_memory_history(history_file)
+
+    @staticmethod
+    def load_memory_history(history_file):
+        """Read the latest recorded peak RSS of every job."""
+        memory_history = {}
+        if history_file is None or not os.path.exists(history_file):
+            return memory_history
+
+        with open(history_file, 'r', encoding='utf-8') as history:
+            for line in history:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                memory_history[entry['job']] = entry
+        return memory_history
+
+    @classmethod
+    def estimate_memory(cls, job_name, input_size):
+        """Estimate the peak RSS (bytes) of a job."""
+        history = cls.memory_history.get(job_name)
+        if history is None:
+            return cls.base_memory + input_size * cls.memory_per_input_byte
+
+        estimate = history['peak_rss']
+        if history['input_size'] > 0 and input_size > history['input_size']:
+            # The input grew since it was measured.
+            estimate = estimate * input_size / history['input_size']
+        return estimate
+
+    @classmethod
+    def record_memory_usage(cls, job_name, input_size):
+        """Append the peak RSS of this worker to the history file."""
+        if cls.memory_history_file is None:
+            return
+
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        append_json_line(cls.memory_history_file, {'job': job_name, 'input_size': input_size, 'peak_rss': peak_rss})
+
+    @classmethod
+    def reserve_memory(cls, estimate, thread_pool=None):
+        """Wait until estimate fits in the memory budget and reserve it.
+
+        A job bigger than the whole budget is admitted once nothing else runs.
+        Returns the reserved amount.
+        """
+        if cls.memory_budget is None:
+            return 0
+
+        estimate = min(estimate, cls.memory_budget)
+        with cls.memory_condition:
+            while cls.memory_in_use.value + estimate > cls.memory_budget:
+                cls.memory_condition.wait(timeout=5)
+                if thread_pool is not None:
+                    ProcessWaiter.check_processes(thread_pool)
+            cls.memory_in_use.value += estimate
+        return estimate
+
+    @classmethod
+    def release_memory(cls, reserved):
+        """Give a memory reservation back to the budget."""
+        if not reserved:
+            return
+
+        with cls.memory_condition:
+            cls.memory_in_use.value -= reserved
+            cls.memory_condition.notify_all()
+
+    @classmethod
+    def pause_job(cls):
+        """Give the slot and memory of this worker back while it is only waiting.
+
+        A worker parked until its ETL is scheduled must not hold back the
+        ETLs it waits for, so it is not counted against the budget meanwhile.
+        """
+        if cls.holding_slot:
+            cls.slots.release()
+            cls.holding_slot = False
+        if cls.holding_memory:
+            cls.release_memory(cls.reserved_memory)
+            cls.holding_memory = False
+
+    @classmethod
+    def resume_job(cls):
+        """Take the memory and slot back after pause_job, waiting until they are free."""
+        if cls.reserved_memory and not cls.holding_memory:
+            cls.reserve_memory(cls.reserved_memory)
+            cls.holding_memory = True
+        if cls.slots is not None and not cls.holding_slot:
+            cls.slots.acquire()
+            cls.holding_slot = True
+
+    @classmethod
+    def run_job(cls, target, job_name, input_size, reserved_memory, args):
+        """Run a job in a worker process that holds a slot and a memory reservation."""
+        cls.holding_slot = cls.slots is not None
+        cls.reserved_memory = reserved_memory
+        cls.holding_memory = reserved_memory > 0
+        try:
+            target(*args)
+            cls.record_memory_usage(job_name, input_size)
+        finally:
+            cls.pause_job()
+
+    @classmethod
+    def run(cls, target, jobs):
+        """Run the jobs, in order, within the slot and memory limits.
+
+        jobs: list of (job name, input file size, args) tuples; each job runs
+        target(*args) in its own worker process.
+        """
+        # Keep the garbage collector of the workers off the pages they share with this process.
+        gc.freeze()
+        thread_pool = []
+        for (job_name, input_size, args) in jobs:
+            # The slot and memory are taken here, so jobs start in the given
+            # order, and handed over to the worker which releases them when done.
+            estimate = cls.estimate_memory(job_name, input_size)
+            reserved_memory = cls.reserve_memory(estimate, thread_pool)
+            while cls.slots is not None and not cls.slots.acquire(timeout=5):
+                ProcessWaiter.check_processes(thread_pool)
+            cls.logger.debug("Starting job %s, estimated peak RSS: %s MB", job_name, int(estimate) // (1024 * 1024))
+            process = multiprocessing.Process(target=cls.run_job,
+                                              name=job_name,
+                                              args=(target, job_name, input_size, reserved_memory, args))
+            process.start()
+            thread_pool.append(process)
+
+        ProcessWaiter.wait_for_processes(thread_pool)
@@ -0,0 +1,125 @@
+"""Write Locks."""
+
+import multiprocessing
+import re
+import zlib
+
+
+class WriteLocks():
+    """Shared table of the node labels the running query batches write to.
+
+    Query batches writing to the same labels contend for the same node
+    locks in Neo4j, so the transactors only run a batch once it can take
+    all of its write locks, and run other batches meanwhile.
+
+    Lock keys are (label, partition). Partitioned labels (nodes belonging to
+    a single data provider, e.g. Gene) only conflict within a partition;
+    a batch writing them without a known partition conflicts with every
+    partition. Keys are hashed onto slots in shared memory; a collision
+    only serializes two batches needlessly.
+
+    Must be created before the processes using it are forked.
+    """
+
+    slot_count = 4096
+
+    # Labels whose nodes each belong to one data provider.
+    partitioned_labels = {'Gene', 'Allele', 'Variant', 'Transcript', 'Exon', 'CDS', 'Construct',
+                          'SequenceTargetingReagent', 'AffectedGenomicModel', 'GenomicLocation'}
+
+    # Keywords, but not procedure names such as apoc.merge.relationship.
+    clause_pattern = re.compile(r'(?<![.\w])(OPTIONAL\s+MATCH|MATCH|MERGE|CREATE|SET|REMOVE|DETACH\s+DELETE|DELETE|'
+                                r'WITH|UNWIND|LOAD\s+CSV|CALL|RETURN|FOREACH|WHERE|USING)\b', re.IGNORECASE)
+    node_pattern = re.compile(r'\(\s*(\w*)\s*((?::\s*`?\w+`?\s*)*)')
+    label_pattern = re.compile(r'\w+')
+
+    def __init__(self):
+        # > 0: shared holders, -1: held exclusively.
+        self.slots = multiprocessing.Array('i', self.slot_count, lock=False)
+        self.releases = multiprocessing.Value('l', 0, lock=False)
+        self.condition = multiprocessing.Condition()
+
+    @classmethod
+    def get_written_labels(cls, query):
+        """Return (labels of written nodes, labels of relationship end nodes) of a Cypher query."""
+        variable_labels = {}
+        for (variable, labels) in cls.node_pattern.findall(query):
+            if variable and labels:
+                variable_labels.setdefault(variable, set()).update(cls.label_pattern.findall(labels))
+
+        written = set()
+        end_nodes = set()
+        clauses = cls.clause_pattern.split(query)
+        for keyword, text in zip(clauses[1::2], clauses[2::2]):
+            keyword = keyword.upper()
+            if keyword in ('MERGE', 'CREATE'):
+                is_relationship = re.search(r'\]\s*-|-\s*\[|--', text) is not None
+                for (variable, labels) in cls.node_pattern.findall(text):
+                    labels = set(cls.label_pattern.findall(labels)) or variable_labels.get(variable, set())
+                    if is_relationship:
+                        end_nodes.update(labels)
+                    else:
+                        written.update(labels)
+            elif keyword in ('SET', 'REMOVE') or keyword.endswith('DELETE'):
+                for item in text.split(','):
+                    variable = re.match(r'\s*(\w+)', item)
+                    if variable is not None:
+                        written.update(variable_labels.get(variable.group(1), set()))
+
+        return written, end_nodes - written
+
+    @classmethod
+    def get_lock_keys(cls, query_batch, partition=None):
+        """Return the {(label, partition): exclusive} locks a query batch needs.
+
+        Relationship end nodes only count for partitioned labels: nodes
+        shared by all providers (ontology terms, publications) are dense,
+        and Neo4j does not lock dense nodes exclusively to add relationships.
+        """
+        keys = {}
+        for query in query_batch:
+            written, end_nodes = cls.get_written_labels(query[0])
+            for label in written | (end_nodes & cls.partitioned_labels):
+                if label in cls.partitioned_labels and partition is not None:
+                    keys[(label, partition)] = True
+                    keys.setdefault((label, None), False)
+                else:
+                    keys[(label, None)] = True
+        return keys
+
+    @classmethod
+    def get_slots(cls, keys):
+        """Map lock keys onto {slot: exclusive}."""
+        slots = {}
+        for (key, exclusive) in keys.items():
+            slot = zlib.crc32(repr(key).encode('utf-8')) % cls.slot_count
+            slots[slot] = slots.get(slot, False) or exclusive
+        return slots
+
+    def acquire(self, keys):
+        """Take all locks of keys if none of them conflict, without waiting. Returns whether it did."""
+        slots = self.get_slots(keys)
+        with self.condition:
+            for (slot, exclusive) in slots.items():
+                if self.slots[slot] < 0 or (exclusive and self.slots[slot] > 0):
+                    return False
+            for (slot, exclusive) in slots.items():
+                self.slots[slot] = -1 if exclusive else self.slots[slot] + 1
+        return True
+
+    def release(self, keys):
+        """Give back the locks taken with acquire."""
+        with self.condition:
+            for (slot, exclusive) in self.get_slots(keys).items():
+                self.slots[slot] = 0 if exclusive else self.slots[slot] - 1
+            self.releases.value += 1
+            self.condition.notify_all()
+
+    def get_release_count(self):
+        """Return a counter that changes whenever locks are released, for wait_for_release."""
+        return self.releases.value
+
+    def wait_for_release(self, release_count, timeout=None):
+        """Wait until locks were released since get_release_count returned release_count."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.releases.value != release_count, timeout)
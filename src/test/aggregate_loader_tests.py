@@ -0,0 +1,92 @@
+"""Aggregate loader tests.
+
+Checks that the loader does not wait forever on work a dead process owns.
+No neo4j database is needed.
+"""
+import logging
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from aggregate_loader import AggregateLoader
+from scheduler import Notification
+from transactors import Neo4jTransactor
+
+
+def slow_etl():
+    """Run for longer than the test waits, like a big ETL."""
+    time.sleep(30)
+
+
+def failing_transactor():
+    """Die like a transactor killed by the OOM killer."""
+    os._exit(1)
+
+
+def start(target):
+    """Start target in a new process."""
+    process = multiprocessing.Process(target=target)
+    process.start()
+    return process
+
+
+class SlowLoader(AggregateLoader):
+    """Loader starting a slow process instead of the real ETL."""
+
+    started = []
+
+    @classmethod
+    def start_etl(cls, etl_name, config, priority, submit_gate=None):
+        """Start a process that does not finish before the test ends."""
+        process = start(slow_etl)
+        cls.started.append(process)
+        return process
+
+
+class OneConfig():
+    """Data manager with a config for the species ETL only."""
+
+    def get_config(self, etl_name):
+        """Return a config for SPECIES only."""
+        if etl_name == 'SPECIES':
+            return {}
+        return None
+
+
+class DeadTransactor():
+    """Neo4jTransactor whose only transactor process has died."""
+
+    def __init__(self):
+        self.thread_pool = [start(failing_transactor)]
+
+    def has_pending_batches(self, etl_name):
+        """The batches of the dead transactor never finish."""
+        return True
+
+
+class NoManifest():
+    """Manifest of a fresh run."""
+
+    finished_etls = []
+    extracted_etls = []
+
+    def restart_etl(self, etl_name):
+        """Nothing to forget in a fresh run."""
+
+
+class TestClass():
+    """Test Class."""
+
+    def test_dead_transactor_fails_the_run(self):
+        """A transactor exiting while ETLs run stops the loader instead of hanging it."""
+        Neo4jTransactor.batch_finished = Notification()
+        neo_transactor = DeadTransactor()
+        start_time = time.time()
+        with pytest.raises(SystemExit):
+            SlowLoader.run_etl_groups(logging.getLogger(__name__), OneConfig(), neo_transactor, NoManifest())
+        assert time.time() - start_time < 10
+        for process in SlowLoader.started:
+            process.join(5)
+            assert process.exitcode is not None
@@ -0,0 +1,91 @@
+"""Async Neo4j Transactor tests.
+
+Checks that one process keeps several query batches running at once.
+No neo4j database is needed.
+"""
+import asyncio
+
+from neo4j.exceptions import ServiceUnavailable
+
+from scheduler import Notification, PendingBatches, TransactorQueue, WriteLocks
+from transactors import AsyncNeo4jTransactor, Neo4jTransactor
+
+
+class WaitingSession():
+    """Session whose queries only finish once two of them are running."""
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def run(self, query):
+        """Wait for the other batch to run a query too, failing first if asked to."""
+        if self.driver.errors:
+            raise self.driver.errors.pop(0)
+        self.driver.running.append(query)
+        if len(self.driver.running) == 2:
+            self.driver.both_running.set()
+        await self.driver.both_running.wait()
+        self.driver.queries.append(query)
+        return self
+
+    async def consume(self):
+        """Return no result summary."""
+        return None
+
+
+class WaitingDriver():
+    """Async driver handing out a WaitingSession."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.running = []
+        self.queries = []
+        self.both_running = asyncio.Event()
+
+    def session(self):
+        """Return a session of this driver."""
+        return WaitingSession(self)
+
+
+class TestClass():
+    """Test Class."""
+
+    def setup_method(self):
+        """Track batches locally and do not wait between retries."""
+        Neo4jTransactor.queue = TransactorQueue()
+        Neo4jTransactor.pending_batches = PendingBatches()
+        Neo4jTransactor.batch_finished = Notification()
+        Neo4jTransactor.write_locks = WriteLocks()
+        Neo4jTransactor.retry_base_delay = 0
+
+    def teardown_method(self):
+        """Restore the retry delay."""
+        Neo4jTransactor.retry_base_delay = 1
+
+    def test_batches_in_flight(self):
+        """Two batches run side by side, each running its queries in order."""
+        batches = []
+        for count in range(2):
+            query_batch = [['QUERY %s.1' % count, 'file_%s.csv' % count], ['QUERY %s.2' % count, 'file_%s.csv' % count]]
+            batch_key = ('BGI', 1, count)
+            Neo4jTransactor.pending_batches.add(batch_key)
+            Neo4jTransactor.queue.put((query_batch, count, batch_key, {}, 0))
+            batches.append(Neo4jTransactor.queue.get())
+
+        driver = WaitingDriver([ServiceUnavailable('leader switch')])
+        transactor = AsyncNeo4jTransactor(2)
+
+        async def run_batches():
+            await asyncio.wait_for(asyncio.gather(*[transactor.run_batch_async(driver, batch, 5) for batch in batches]), 5)
+        asyncio.run(run_batches())
+
+        assert sorted(driver.running[:2]) == ['QUERY 0.1', 'QUERY 1.1']
+        assert [query for query in driver.queries if query.startswith('QUERY 0')] == ['QUERY 0.1', 'QUERY 0.2']
+        assert len(Neo4jTransactor.pending_batches) == 0
+        assert [batch[0] for batch in batches] == [[], []]
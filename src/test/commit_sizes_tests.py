@@ -0,0 +1,86 @@
+"""Commit Sizes tests.
+
+Checks how the commit size of a query template is learned.
+No neo4j database is needed.
+"""
+import multiprocessing
+import os
+
+from scheduler import CommitSizes
+
+
+QUERY_TEMPLATE = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            MERGE (g:Gene {primaryKey: row.primaryId})
+        }
+    IN TRANSACTIONS of %s ROWS"""
+
+
+class TestClass():
+    """Test Class."""
+
+    def setup_method(self):
+        """Start without history."""
+        CommitSizes.load(None, 5)
+
+    def teardown_method(self):
+        """Stop learning again."""
+        CommitSizes.load(None, 0)
+
+    def test_template_key(self):
+        """Queries made from one template share its key, whatever their file and commit size."""
+        key = CommitSizes.get_template_key(QUERY_TEMPLATE % ('genes_FB.csv', 10000))
+        assert key == CommitSizes.get_template_key(QUERY_TEMPLATE % ('genes_WB.csv', 5000))
+        assert key != CommitSizes.get_template_key(QUERY_TEMPLATE.replace('Gene', 'Allele') % ('genes_FB.csv', 10000))
+        assert CommitSizes.get_template_key("MATCH (n) RETURN count(n)") is None
+
+    def test_size_from_throughput(self):
+        """The commit size makes a transaction take about the target time."""
+        query = QUERY_TEMPLATE % ('genes_FB.csv', 10000)
+        assert CommitSizes.get_query(query) == (query, 10000)
+
+        CommitSizes.record(query, 10000, 100000, 10)
+        (sized_query, commit_size) = CommitSizes.get_query(query)
+        assert commit_size == 50000
+        assert 'IN TRANSACTIONS of 50000 ROWS' in sized_query
+        assert "'file:///genes_FB.csv'" in sized_query
+
+    def test_small_runs_ignored(self):
+        """Runs of less than one transaction leave the commit size alone."""
+        query = QUERY_TEMPLATE % ('genes_FB.csv', 10000)
+        CommitSizes.record(query, 10000, 100000, 10)
+        CommitSizes.record(query, 10000, 50, 2)
+        assert CommitSizes.get_query(query)[1] == 50000
+
+    def test_memory_failures(self):
+        """Sizes stay at most half of one that ran out of memory."""
+        query = QUERY_TEMPLATE % ('genes_FB.csv', 10000)
+        CommitSizes.record(query, 10000, 100000, 10)
+        CommitSizes.record_memory_failure(query, 50000)
+        assert CommitSizes.get_query(query)[1] == 25000
+
+    def test_history(self, tmp_path):
+        """The next load starts from what was learned."""
+        history_file = os.path.join(str(tmp_path), 'commit_sizes.jsonl')
+        query = QUERY_TEMPLATE % ('genes_FB.csv', 10000)
+        CommitSizes.load(history_file, 5)
+        CommitSizes.record(query, 10000, 20000, 10)
+
+        CommitSizes.load(history_file, 5)
+        assert CommitSizes.get_query(query)[1] == 10000
+        CommitSizes.load(history_file, 10)
+        assert CommitSizes.get_query(query)[1] == 20000
+
+    def test_learned_by_other_processes(self, tmp_path):
+        """A transactor takes up the sizes the other transactors learned."""
+        history_file = os.path.join(str(tmp_path), 'commit_sizes.jsonl')
+        query = QUERY_TEMPLATE % ('genes_FB.csv', 10000)
+        CommitSizes.load(history_file, 5)
+        assert CommitSizes.get_query(query)[1] == 10000
+
+        process = multiprocessing.Process(target=CommitSizes.record, args=(query, 10000, 100000, 10))
+        process.start()
+        process.join()
+        assert CommitSizes.get_query(query)[1] == 50000
@@ -0,0 +1,203 @@
+"""CSV Transactor tests.
+
+Checks how the CSV files roll over to chunks loaded while the rest is written.
+No neo4j database is needed.
+"""
+import csv
+import gzip
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from scheduler import PendingBatches, TransactorQueue
+from transactors import CSVTransactor, Neo4jTransactor
+from transactors.csv_file_writer import CSVFileWriter
+
+
+QUERY_TEMPLATE = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            MERGE (g:Gene {primaryKey: row.primaryId})
+        }
+    IN TRANSACTIONS of %s ROWS"""
+
+
+class BatchLoader():
+    """Takes the query batches off the queue in a thread, like a transactor that takes a while."""
+
+    def __init__(self):
+        self.queue = Neo4jTransactor.queue
+        self.pending_batches = Neo4jTransactor.pending_batches
+        self.batches = []
+        self.overlapping = False
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        """Load the batches one at a time, noting if another one was queued meanwhile."""
+        while True:
+            batch = self.queue.get()
+            time.sleep(0.05)
+            if len(self.pending_batches) > 1:
+                self.overlapping = True
+            self.batches.append([query[1] for query in batch[0]])
+            self.pending_batches.remove(batch[2])
+            self.queue.task_done()
+
+
+def get_generators():
+    """Yield four batches for two queries, like an ETL does."""
+    yield [[{'primaryId': 'FB:1'}, {'primaryId': 'FB:2'}], [{'primaryId': 'FB:1'}]]
+    yield [[{'primaryId': 'FB:3'}], []]
+    yield [[{'primaryId': 'FB:4'}], []]
+    yield [[{'primaryId': 'FB:5'}], [{'primaryId': 'FB:5'}]]
+
+
+def read_ids(file_name):
+    """Return the primary ids in a CSV file of the tmp directory."""
+    with open(os.path.join('tmp', file_name), encoding='utf-8') as csv_file:
+        return [row['primaryId'] for row in csv.DictReader(csv_file)]
+
+
+class TestClass():
+    """Test Class."""
+
+    def setup_method(self):
+        """Queue the query batches locally."""
+        Neo4jTransactor.queue = TransactorQueue()
+        Neo4jTransactor.pending_batches = PendingBatches()
+        self.loader = BatchLoader()
+
+    def teardown_method(self):
+        """Write one uncompressed file per query, with every row, again."""
+        CSVTransactor.set_chunk_rows(0)
+        CSVTransactor.set_compression_level(0)
+        CSVTransactor.set_dedup(False)
+        Neo4jTransactor.set_batch_owner(None)
+
+    def test_chunks_loaded_while_writing(self, tmp_path, monkeypatch):
+        """Finished chunks are queued in order, the last one is left for the ETL."""
+        monkeypatch.chdir(str(tmp_path))
+        os.makedirs('tmp')
+        CSVTransactor.set_chunk_rows(2)
+        query_and_file_list = [[QUERY_TEMPLATE % ('genes_FB.csv', 10000), 'genes_FB.csv'],
+                               [QUERY_TEMPLATE % ('more_FB.csv', 10000), 'more_FB.csv']]
+        CSVTransactor.save_file_static(get_generators(), query_and_file_list)
+
+        # Only the first query had rows in the second chunk, which waited for the first to load.
+        assert self.loader.batches == [['genes_FB.csv', 'more_FB.csv'], ['genes_FB_part2.csv']]
+        assert not self.loader.overlapping
+        assert read_ids('genes_FB.csv') == ['FB:1', 'FB:2']
+        assert read_ids('genes_FB_part2.csv') == ['FB:3', 'FB:4']
+        assert Neo4jTransactor.queue.empty()
+
+        assert [query[1] for query in query_and_file_list] == ['genes_FB_part3.csv', 'more_FB_part3.csv']
+        assert "'file:///more_FB_part3.csv'" in query_and_file_list[1][0]
+        assert read_ids('more_FB_part3.csv') == ['FB:5']
+
+    def test_no_chunks(self, tmp_path, monkeypatch):
+        """Without chunk_rows, every query keeps its one file."""
+        monkeypatch.chdir(str(tmp_path))
+        os.makedirs('tmp')
+        query_and_file_list = [[QUERY_TEMPLATE % ('genes_FB.csv', 10000), 'genes_FB.csv'],
+                               [QUERY_TEMPLATE % ('more_FB.csv', 10000), 'more_FB.csv']]
+        CSVTransactor.save_file_static(get_generators(), query_and_file_list)
+        assert [query[1] for query in query_and_file_list] == ['genes_FB.csv', 'more_FB.csv']
+        assert [query[3] for query in query_and_file_list] == [5, 2]
+        assert read_ids('genes_FB.csv') == ['FB:1', 'FB:2', 'FB:3', 'FB:4', 'FB:5']
+        assert Neo4jTransactor.queue.empty()
+
+    def test_compressed_chunks(self, tmp_path, monkeypatch):
+        """Compressed files are named .csv.gz, in the queries too, and their rows are counted."""
+        monkeypatch.chdir(str(tmp_path))
+        os.makedirs('tmp')
+        CSVTransactor.set_chunk_rows(2)
+        CSVTransactor.set_compression_level(1)
+        query_and_file_list = [[QUERY_TEMPLATE % ('genes_FB.csv', 10000), 'genes_FB.csv'],
+                               [QUERY_TEMPLATE % ('more_FB.csv', 10000), 'more_FB.csv']]
+        CSVTransactor.save_file_static(get_generators(), query_and_file_list)
+
+        assert self.loader.batches == [['genes_FB.csv.gz', 'more_FB.csv.gz'], ['genes_FB_part2.csv.gz']]
+        assert "'file:///more_FB_part3.csv.gz'" in query_and_file_list[1][0]
+        with gzip.open(os.path.join('tmp', 'genes_FB_part2.csv.gz'), 'rt', encoding='utf-8') as csv_file:
+            assert [row['primaryId'] for row in csv.DictReader(csv_file)] == ['FB:3', 'FB:4']
+        # The rows written, for the transactors to learn the commit sizes from.
+        assert [query[3] for query in query_and_file_list] == [1, 1]
+
+    def test_file_writer_matches_dict_writer(self, tmp_path, monkeypatch):
+        """The writer thread writes what csv.DictWriter does, and fails on unknown columns like it."""
+        monkeypatch.chdir(str(tmp_path))
+        os.makedirs('tmp')
+        rows = [{'a': 1, 'b': None, 'c': 'x'}, {'a': 's', 'b': 2.5}, {'c': True, 'b': 'y', 'a': 0}]
+        writer = CSVFileWriter('rows.csv')
+        writer.put(rows[:2])
+        writer.put(rows[2:])
+        writer.close()
+        expected = io.StringIO()
+        dict_writer = csv.DictWriter(expected, fieldnames=['a', 'b', 'c'], quoting=csv.QUOTE_NONNUMERIC)
+        dict_writer.writeheader()
+        dict_writer.writerows(rows)
+        with open(os.path.join('tmp', 'rows.csv'), encoding='utf-8') as csv_file:
+            assert csv_file.read() == expected.getvalue().replace('\r\n', '\n')
+
+        writer = CSVFileWriter('unknown.csv')
+        writer.put([{'a': 1}])
+        writer.put([{'b': 2}])
+        writer.put([{'a': 3}])
+        with pytest.raises(ValueError):
+            writer.close()
+
+    def test_dedup(self, tmp_path, monkeypatch):
+        """With dedup set, rows repeating the declared key columns are dropped, across chunks too."""
+        monkeypatch.chdir(str(tmp_path))
+        os.makedirs('tmp')
+        CSVTransactor.set_dedup(True)
+        CSVTransactor.set_chunk_rows(2)
+        generator = iter([[[{'ei_uuid': 'a', 'stageName': 'adult', 'stageTermId': 'x'},
+                            {'ei_uuid': 'a', 'stageName': 'adult', 'stageTermId': 'y'}],
+                           [{'primaryId': 'FB:1'}, {'primaryId': 'FB:1'}]],
+                          [[{'ei_uuid': 'a', 'stageName': 'adult', 'stageTermId': 'z'},
+                            {'ei_uuid': 'b', 'stageName': 'adult', 'stageTermId': 'z'}, None],
+                           [{'primaryId': 'FB:1'}]]])
+        query_and_file_list = [[QUERY_TEMPLATE % ('expression_stage_expression_FB.csv', 10000),
+                                'expression_stage_expression_FB.csv'],
+                               [QUERY_TEMPLATE % ('genes_FB.csv', 10000), 'genes_FB.csv']]
+        CSVTransactor.save_file_static(generator, query_and_file_list)
+
+        with open(os.path.join('tmp', 'expression_stage_expression_FB.csv'), encoding='utf-8') as csv_file:
+            assert [row['stageTermId'] for row in csv.DictReader(csv_file)] == ['x']
+        with open(os.path.join('tmp', 'expression_stage_expression_FB_part2.csv'), encoding='utf-8') as csv_file:
+            assert [row['ei_uuid'] for row in csv.DictReader(csv_file)] == ['b']
+        # Files without declared keys keep every row.
+        assert read_ids('genes_FB.csv') == ['FB:1', 'FB:1']
+        assert CSVTransactor.get_dedup_keys('expression_uberon_stage_other_FB.csv') == ['ei_uuid']
+
+    def test_not_chunked(self, tmp_path, monkeypatch):
+        """ETLs loading their queries themselves get one file per query, even with chunk_rows set."""
+        monkeypatch.chdir(str(tmp_path))
+        os.makedirs('tmp')
+        CSVTransactor.set_chunk_rows(2)
+        query_and_file_list = [[QUERY_TEMPLATE % ('genes_FB.csv', 10000), 'genes_FB.csv'],
+                               [QUERY_TEMPLATE % ('more_FB.csv', 10000), 'more_FB.csv']]
+        CSVTransactor.save_file_static(get_generators(), query_and_file_list, chunked=False)
+        assert [query[1] for query in query_and_file_list] == ['genes_FB.csv', 'more_FB.csv']
+        assert [query[3] for query in query_and_file_list] == [5, 2]
+        assert read_ids('genes_FB.csv') == ['FB:1', 'FB:2', 'FB:3', 'FB:4', 'FB:5']
+        assert self.loader.batches == []
+
+    def test_no_chunks_while_held_back(self, tmp_path, monkeypatch):
+        """An ETL extracting ahead writes on into its first chunk instead of waiting for its turn."""
+        monkeypatch.chdir(str(tmp_path))
+        os.makedirs('tmp')
+        CSVTransactor.set_chunk_rows(2)
+        Neo4jTransactor.set_batch_owner('BGI', threading.Event())
+        query_and_file_list = [[QUERY_TEMPLATE % ('genes_FB.csv', 10000), 'genes_FB.csv'],
+                               [QUERY_TEMPLATE % ('more_FB.csv', 10000), 'more_FB.csv']]
+        CSVTransactor.save_file_static(get_generators(), query_and_file_list)
+        assert [query[1] for query in query_and_file_list] == ['genes_FB.csv', 'more_FB.csv']
+        assert [query[3] for query in query_and_file_list] == [5, 2]
+        assert read_ids('genes_FB.csv') == ['FB:1', 'FB:2', 'FB:3', 'FB:4', 'FB:5']
+        assert self.loader.batches == []
@@ -0,0 +1,35 @@
+"""Dead Letter Journal tests.
+
+Checks that failed query batches are kept for a later replay.
+No neo4j database is needed.
+"""
+import os
+
+from scheduler import DeadLetterJournal
+
+
+class TestClass():
+    """Test Class."""
+
+    def teardown_method(self):
+        """Stop recording once the test is done."""
+        DeadLetterJournal.file_name = None
+
+    def test_record_and_take(self, tmp_path):
+        """Recorded batches are handed out once, the journal then starts over."""
+        journal_file = str(tmp_path / 'dead_letters.jsonl')
+        journal = DeadLetterJournal(journal_file)
+        DeadLetterJournal.record('BGI', [['QUERY 1', 'bgi_FB.csv'], ['QUERY 2', 'bgi_FB.csv']], ValueError('bad'))
+
+        assert journal.take_entries() == [('BGI', [['QUERY 1', 'bgi_FB.csv'], ['QUERY 2', 'bgi_FB.csv']], 'bad')]
+        assert journal.get_entries(journal_file) == []
+        assert os.path.exists(journal_file + '.replayed')
+
+    def test_keep(self, tmp_path):
+        """A resumed load keeps the journal, a new load starts an empty one."""
+        journal_file = str(tmp_path / 'dead_letters.jsonl')
+        DeadLetterJournal(journal_file)
+        DeadLetterJournal.record('BGI', [['QUERY', 'bgi_FB.csv']], ValueError('bad'))
+
+        assert len(DeadLetterJournal(journal_file, keep=True).get_entries(journal_file)) == 1
+        assert DeadLetterJournal(journal_file).get_entries(journal_file) == []
@@ -0,0 +1,85 @@
+"""ETL Scheduler tests.
+
+Checks the dependency and lock handling of the ETL scheduler.
+No neo4j database is needed.
+"""
+import pytest
+
+from scheduler import ETLScheduler
+
+
+class TestClass():
+    """Test Class."""
+
+    etl_specs = {
+        'SPECIES': {'reads': [], 'locks': ['Species']},
+        'BGI': {'reads': ['SPECIES'], 'locks': ['Gene']},
+        'GO': {'reads': [], 'locks': ['GOTerm']},
+        'GAF': {'reads': ['BGI', 'GO'], 'locks': ['Gene']},
+        'GEOXREF': {'reads': ['BGI'], 'locks': ['Gene']},
+        'PARALOGY': {'reads': ['BGI'], 'locks': ['ParalogyGeneJoin']},
+        'DB-SUMMARY': {'reads': ['*'], 'locks': []}
+    }
+
+    def test_independent_etls_start_together(self):
+        """ETLs without dependencies or shared locks are ready together."""
+        scheduler = ETLScheduler(self.etl_specs)
+        assert scheduler.get_ready_etls() == ['SPECIES', 'GO']
+
+    def test_dependencies_and_locks(self):
+        """ETLs wait for what they read and never share a lock while running."""
+        scheduler = ETLScheduler(self.etl_specs)
+        for etl_name in ['SPECIES', 'GO', 'BGI']:
+            scheduler.start(etl_name)
+            scheduler.finish(etl_name)
+
+        assert scheduler.get_ready_etls() == ['GAF', 'PARALOGY']
+        scheduler.start('GAF')
+        scheduler.start('PARALOGY')
+        assert scheduler.get_ready_etls() == []
+
+        scheduler.finish('GAF')
+        assert scheduler.get_ready_etls() == ['GEOXREF']
+
+    def test_upcoming_etls(self):
+        """ETLs whose dependencies have all started are the next to become ready."""
+        scheduler = ETLScheduler(self.etl_specs)
+        assert scheduler.get_upcoming_etls() == []
+
+        scheduler.start('SPECIES')
+        assert scheduler.get_upcoming_etls() == ['BGI']
+
+        scheduler.finish('SPECIES')
+        scheduler.start('BGI')
+        assert scheduler.get_upcoming_etls() == ['GEOXREF', 'PARALOGY']
+
+    def test_is_waited_on(self):
+        """Only explicit reads of ETLs still to run count, not '*' reads."""
+        scheduler = ETLScheduler(self.etl_specs)
+        assert scheduler.is_waited_on('BGI')
+        assert not scheduler.is_waited_on('PARALOGY')
+
+        for etl_name in ['SPECIES', 'GO', 'BGI', 'GAF', 'GEOXREF', 'PARALOGY']:
+            scheduler.start(etl_name)
+        assert not scheduler.is_waited_on('BGI')
+
+    def test_star_reads_everything_declared_before(self):
+        """A '*' read waits for every ETL declared before it."""
+        scheduler = ETLScheduler(self.etl_specs)
+        assert scheduler.dependencies['DB-SUMMARY'] == set(self.etl_specs) - {'DB-SUMMARY'}
+
+    def test_unknown_and_cyclic_reads_exit(self):
+        """Bad metadata stops the loader before any ETL starts."""
+        with pytest.raises(SystemExit):
+            ETLScheduler({'A': {'reads': ['MISSING'], 'locks': []}})
+        with pytest.raises(SystemExit):
+            ETLScheduler({'A': {'reads': ['B'], 'locks': []},
+                          'B': {'reads': ['A'], 'locks': []}})
+
+    def test_critical_path(self):
+        """The critical path follows the longest chain of dependencies."""
+        scheduler = ETLScheduler(self.etl_specs)
+        durations = {'SPECIES': 1, 'BGI': 10, 'GO': 30, 'GAF': 5, 'GEOXREF': 1, 'PARALOGY': 2, 'DB-SUMMARY': 1}
+        path, total_time = scheduler.critical_path(durations)
+        assert path == ['GO', 'GAF', 'DB-SUMMARY']
+        assert total_time == 36
@@ -0,0 +1,113 @@
+"""Import Transactor tests.
+
+Checks how query templates become neo4j-admin import files.
+No neo4j database is needed.
+"""
+import csv
+import os
+
+from transactors import CSVTransactor, ImportTransactor
+from transactors.import_template import ImportTemplate
+
+
+GENE_TEMPLATE = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            // A comment
+            MERGE (g:Gene:BioEntity {primaryKey: row.primaryId})
+                ON CREATE SET g.symbol = row.symbol,
+                              g.obsolete = toBoolean(row.obsolete),
+                              g.dataProvider = "FB"
+            MERGE (o:Species {primaryKey: row.taxonId})
+            MERGE (g)-[:FROM_SPECIES]->(o)
+        }
+    IN TRANSACTIONS of %s ROWS"""
+
+LOCATION_TEMPLATE = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            MATCH (g:Gene {primaryKey: row.primaryId})
+            MERGE (loc:GenomicLocation {primaryKey: row.id})
+                ON CREATE SET loc.start = apoc.number.parseInt(row.start)
+            MERGE (g)-[r:ASSOCIATION {chromosome: row.chromosome}]->(loc)
+        }
+    IN TRANSACTIONS of %s ROWS"""
+
+SPECIES_TEMPLATE = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            MERGE (o:Species {primaryKey: row.taxonId})
+            WITH o, row
+            MATCH (l:Load {primaryKey: row.loadKey})
+            MERGE (o)-[:LOADED_FROM]->(l)
+        }
+    IN TRANSACTIONS of %s ROWS"""
+
+
+def get_generators():
+    """Yield two batches for two queries, like an ETL does."""
+    yield [[{'primaryId': 'FB:1', 'symbol': 'a', 'obsolete': 'false', 'taxonId': '7227'}],
+           [{'primaryId': 'FB:1', 'id': 'x', 'start': '5', 'chromosome': '2L'}]]
+    yield [[{'primaryId': 'FB:1', 'symbol': 'a', 'obsolete': 'false', 'taxonId': '7227'}],
+           [{'primaryId': 'FB:2', 'id': 'y', 'start': '', 'chromosome': '2R'}]]
+
+
+class TestClass():
+    """Test Class."""
+
+    def teardown_method(self):
+        """Write CSV files again."""
+        ImportTransactor.etl_names = set()
+        ImportTransactor.import_labels = set()
+        ImportTransactor.select('BGI')
+
+    def test_parse_template(self):
+        """Nodes, their properties and relationships are read from the template."""
+        template = ImportTemplate.parse(GENE_TEMPLATE % ('genes_FB.csv', 10000))
+        assert template.get_labels() == {'Gene', 'Species'}
+        assert template.get_node_header('g') == ['id:ID', ':LABEL', 'primaryKey', 'symbol', 'obsolete:boolean',
+                                                 'dataProvider']
+        row = {'primaryId': 'FB:1', 'symbol': 'a', 'obsolete': 'False', 'taxonId': '7227'}
+        assert template.get_node_line('g', row) == ['Gene:FB:1', 'Gene;BioEntity', 'FB:1', 'a', 'false', 'FB']
+        assert template.get_relationship_line(0, row) == ['Gene:FB:1', 'Species:7227', 'FROM_SPECIES']
+
+        assert ImportTemplate.parse(SPECIES_TEMPLATE % ('species.csv', 10000)) is None
+        assert ImportTemplate.parse("MATCH (n) RETURN count(n)") is None
+
+    def test_import_labels(self):
+        """Labels also created by templates that can not be translated are not imported."""
+        templates = [GENE_TEMPLATE, LOCATION_TEMPLATE]
+        assert ImportTransactor.get_import_labels(templates) == {'Gene', 'Species', 'GenomicLocation'}
+        # Species nodes loaded later are no longer an import label, so neither is the gene template.
+        assert ImportTransactor.get_import_labels(templates + [SPECIES_TEMPLATE]) == set()
+
+    def test_rows_written_as_import_files(self, tmp_path, monkeypatch):
+        """Rows of the imported queries go to import files, once each."""
+        monkeypatch.chdir(str(tmp_path))
+        os.makedirs('tmp')
+        ImportTransactor.set_etl_names(['BGI'], [])
+        ImportTransactor.import_labels = {'Gene', 'Species'}
+        ImportTransactor.select('BGI')
+        query_and_file_list = [[GENE_TEMPLATE % ('genes_FB.csv', 10000), 'genes_FB.csv'],
+                               [LOCATION_TEMPLATE % ('locations_FB.csv', 10000), 'locations_FB.csv']]
+        CSVTransactor.save_file_static(get_generators(), query_and_file_list)
+        # Locations are not imported, their rows are written for LOAD CSV.
+        assert [query[1] for query in query_and_file_list] == ['locations_FB.csv']
+        with open(os.path.join('tmp', 'locations_FB.csv'), encoding='utf-8') as csv_file:
+            assert [row['id'] for row in csv.DictReader(csv_file)] == ['x', 'y']
+
+        import_files = {}
+        for file_name in os.listdir(ImportTransactor.import_dir):
+            with open(os.path.join(ImportTransactor.import_dir, file_name), encoding='utf-8') as import_file:
+                import_files[file_name.split('-')[0] + '-' + file_name.split('-')[-1]] = list(csv.reader(import_file))
+        assert import_files['nodes-g.csv'][1:] == [['Gene:FB:1', 'Gene;BioEntity', 'FB:1', 'a', 'false', 'FB']]
+        assert import_files['nodes-o.csv'][1:] == [['Species:7227', 'Species', '7227']]
+        assert import_files['relationships-FROM_SPECIES.csv'][1:] == [['Gene:FB:1', 'Species:7227', 'FROM_SPECIES']]
+
+        command = ImportTransactor.get_import_command('docker exec neo4j neo4j-admin', '/import', 'neo4j')
+        assert command[:6] == ['docker', 'exec', 'neo4j', 'neo4j-admin', 'database', 'import']
+        assert len([part for part in command if part.startswith('--nodes=/import/import/nodes-')]) == 2
+        assert command[-1] == 'neo4j'
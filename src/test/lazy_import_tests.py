@@ -0,0 +1,34 @@
+"""Lazy import tests.
+
+Checks that starting the loader does not import the ETLs or their libraries.
+No neo4j database is needed.
+"""
+import os
+import subprocess
+import sys
+
+
+def imported_modules(code):
+    """Run code in a fresh interpreter and return the modules it imported."""
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', code + '\nimport sys\nprint(" ".join(sys.modules))'],
+                                     cwd=os.path.dirname(src_dir),
+                                     env=dict(os.environ, PYTHONPATH=src_dir))
+    return set(output.decode('utf-8').split())
+
+
+class TestClass():
+    """Test Class."""
+
+    def test_loader_imports_no_etls(self):
+        """Importing the loader leaves the ETL modules and heavy libraries alone."""
+        modules = imported_modules('import aggregate_loader')
+        assert 'etl.bgi_etl' not in modules
+        assert 'etl.helpers.obo_helper' not in modules
+        assert not {'ontobio', 'genedescriptions', 'Bio', 'pyfaidx', 'ijson', 'xmltodict'} & modules
+
+    def test_etl_imported_on_use(self):
+        """Using an ETL class imports just its own module."""
+        modules = imported_modules('import etl\netl.SpeciesETL')
+        assert 'etl.species_etl' in modules
+        assert 'etl.bgi_etl' not in modules
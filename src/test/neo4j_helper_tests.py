@@ -0,0 +1,130 @@
+"""Neo4j Helper tests.
+
+Checks that each process reuses a single driver and that only missing
+indices are created. The driver connects lazily, so no neo4j database
+is needed.
+"""
+import multiprocessing
+import os
+import threading
+
+from etl import Neo4jHelper
+
+
+def check_child_driver(parent_driver_id, results):
+    """Report whether a forked child got its own driver."""
+    driver = Neo4jHelper.get_driver()
+    results.put(id(driver) != parent_driver_id
+                and driver is Neo4jHelper.get_driver()
+                and id(Neo4jHelper.inherited_drivers[-1]) == parent_driver_id)
+
+
+class SchemaSession():
+    """Session of a database that has the Gene constraint, the Gene.symbol and Gene.gff3ID indices and a text index."""
+
+    def __init__(self, statements):
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def run(self, query, **parameters):
+        """Return the existing schema for SHOW queries, record everything else."""
+        if query.startswith('SHOW CONSTRAINTS'):
+            return [{'type': 'UNIQUENESS', 'entityType': 'NODE', 'labelsOrTypes': ['Gene'], 'properties': ['primaryKey']}]
+        if query.startswith('SHOW INDEXES'):
+            return [{'type': 'LOOKUP', 'entityType': 'NODE', 'labelsOrTypes': None, 'properties': None},
+                    {'type': 'RANGE', 'entityType': 'NODE', 'labelsOrTypes': ['Gene'], 'properties': ['symbol']},
+                    {'type': 'BTREE', 'entityType': 'NODE', 'labelsOrTypes': ['Gene'], 'properties': ['gff3ID']},
+                    {'type': 'TEXT', 'entityType': 'NODE', 'labelsOrTypes': ['Gene'], 'properties': ['taxonId']}]
+        self.statements.append(query)
+        return self
+
+    def consume(self):
+        """Return no result summary."""
+        return None
+
+    def begin_transaction(self):
+        """Run the queries of the transaction in the session."""
+        return self
+
+
+class SchemaDriver():
+    """Driver handing out a SchemaSession."""
+
+    def __init__(self):
+        self.statements = []
+
+    def session(self):
+        """Return a session recording into statements."""
+        return SchemaSession(self.statements)
+
+
+class TestClass():
+    """Test Class."""
+
+    def teardown_method(self):
+        """Close the driver again."""
+        Neo4jHelper.close_driver()
+        Neo4jHelper.set_submit_gate(None)
+        Neo4jHelper.held_queries_pid = None
+
+    def test_missing_indices_created(self):
+        """Constraints and indices the database has are left out, whatever their names, but not other index types."""
+        driver = SchemaDriver()
+        Neo4jHelper.driver = driver
+        Neo4jHelper.driver_pid = os.getpid()
+        Neo4jHelper.create_indices(include_deferred=False)
+        Neo4jHelper.driver = None
+
+        statements = [statement for statement in driver.statements if not statement.startswith('CALL')]
+        # Gene.symbol is a deferred index, so only the constraint and the Gene.gff3ID index are left out.
+        assert len(statements) == len(Neo4jHelper.get_schema_statements(include_deferred=False)) - 2
+        assert "CREATE INDEX IF NOT EXISTS FOR (n:Gene) ON (n.gff3ID)" not in statements
+        # A text index does not serve the lookups of a range index.
+        assert "CREATE INDEX IF NOT EXISTS FOR (n:Gene) ON (n.taxonId)" in statements
+        assert not any('(n:Gene) REQUIRE n.primaryKey ' in statement for statement in statements)
+        assert "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Gene) REQUIRE n.uuid IS UNIQUE" in statements
+        assert "CREATE INDEX IF NOT EXISTS FOR (n:Gene) ON (n.gff3ID, n.dataProvider)" in statements
+        assert not any('n.modLocalId' in statement for statement in statements)
+        # Constraints are created before the indices, and the indices are awaited last.
+        assert statements.index("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Gene) REQUIRE n.uuid IS UNIQUE") \
+            < statements.index("CREATE INDEX IF NOT EXISTS FOR (n:Gene) ON (n.gff3ID, n.dataProvider)")
+        assert driver.statements[-1] == "CALL db.awaitIndexes($timeout)"
+
+    def test_driver_reused(self):
+        """Every query of a process uses the same driver."""
+        assert Neo4jHelper.get_driver() is Neo4jHelper.get_driver()
+
+    def test_forked_child_gets_own_driver(self):
+        """A forked process does not use the connections of its parent."""
+        results = multiprocessing.SimpleQueue()
+        process = multiprocessing.Process(target=check_child_driver,
+                                          args=(id(Neo4jHelper.get_driver()), results))
+        process.start()
+        process.join()
+        assert results.get()
+
+    def test_writes_held_until_scheduled(self):
+        """Writes of an ETL extracting ahead run, in order, once its submit gate is set."""
+        driver = SchemaDriver()
+        Neo4jHelper.driver = driver
+        Neo4jHelper.driver_pid = os.getpid()
+        submit_gate = multiprocessing.Event()
+        Neo4jHelper.set_submit_gate(submit_gate)
+        Neo4jHelper.run_single_query_no_return("CREATE (o:ModFileMetadata {dataSubType: 'FB'})")
+        Neo4jHelper.run_single_query_no_return("CREATE (o:ModFileMetadata {dataSubType: 'WB'})")
+        assert driver.statements == []
+
+        submit_gate.set()
+        for thread in threading.enumerate():
+            if thread.name == "Neo4jHelper gate":
+                thread.join()
+        Neo4jHelper.run_single_query_no_return("CREATE (o:ModFileMetadata {dataSubType: 'ZFIN'})")
+        Neo4jHelper.driver = None
+        assert driver.statements == ["CREATE (o:ModFileMetadata {dataSubType: 'FB'})",
+                                     "CREATE (o:ModFileMetadata {dataSubType: 'WB'})",
+                                     "CREATE (o:ModFileMetadata {dataSubType: 'ZFIN'})"]
@@ -0,0 +1,119 @@
+"""Neo4j Transactor tests.
+
+Checks how failing queries are retried and how batches waiting for
+write locks are dispatched. No neo4j database is needed.
+"""
+import pytest
+from neo4j.exceptions import ClientError, ServiceUnavailable, TransientError
+
+from scheduler import TransactorQueue, WriteLocks
+from transactors import Neo4jTransactor
+
+
+class FailingSession():
+    """Session failing with the given errors before it succeeds."""
+
+    def __init__(self, errors, queries):
+        self.errors = errors
+        self.queries = queries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def run(self, query):
+        """Record the query, raising the next error if any is left."""
+        self.queries.append(query)
+        if self.errors:
+            raise self.errors.pop(0)
+        return self
+
+    def consume(self):
+        """Return no result summary."""
+        return None
+
+
+class FailingGraph():
+    """Driver handing out a FailingSession."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.queries = []
+
+    def session(self):
+        """Return a session sharing the remaining errors."""
+        return FailingSession(self.errors, self.queries)
+
+
+class TestClass():
+    """Test Class."""
+
+    def setup_method(self):
+        """Do not actually wait between retries."""
+        Neo4jTransactor.retry_base_delay = 0
+
+    def teardown_method(self):
+        """Restore the retry delay."""
+        Neo4jTransactor.retry_base_delay = 1
+
+    def test_error_classification(self):
+        """Lost connections are retried, client errors are not."""
+        assert Neo4jTransactor.is_transient(ServiceUnavailable('leader switch'))
+        assert not Neo4jTransactor.is_transient(ClientError('syntax error'))
+        assert not Neo4jTransactor.is_transient(ValueError('bad data'))
+
+    def test_memory_error_classification(self):
+        """Transactions running out of memory are told apart from other transient errors."""
+        out_of_memory = TransientError._hydrate_neo4j(code='Neo.TransientError.General.MemoryPoolOutOfMemoryError',
+                                                      message='out of memory')
+        assert Neo4jTransactor.is_memory_error(out_of_memory)
+        assert not Neo4jTransactor.is_memory_error(ServiceUnavailable('down'))
+
+    def test_retry_delay(self):
+        """Delays grow exponentially up to the cap, with jitter."""
+        Neo4jTransactor.retry_base_delay = 1
+        for attempt in range(10):
+            delay = Neo4jTransactor.get_retry_delay(attempt)
+            cap = min(Neo4jTransactor.retry_max_delay, 2 ** attempt)
+            assert cap / 2 <= delay <= cap
+
+    def test_transient_errors_retried(self):
+        """A query succeeding after transient errors is not reported as failed."""
+        graph = FailingGraph([ServiceUnavailable('down'), ServiceUnavailable('down')])
+        Neo4jTransactor().run_query(graph, 'QUERY', 5)
+        assert graph.queries == ['QUERY'] * 3
+
+    def test_retries_are_capped(self):
+        """Transient errors are raised once the retries run out."""
+        graph = FailingGraph([ServiceUnavailable('down')] * 3)
+        with pytest.raises(ServiceUnavailable):
+            Neo4jTransactor().run_query(graph, 'QUERY', 2)
+        assert len(graph.queries) == 3
+
+    def test_permanent_errors_not_retried(self):
+        """A permanent error is raised straight away."""
+        graph = FailingGraph([ClientError('syntax error')])
+        with pytest.raises(ClientError):
+            Neo4jTransactor().run_query(graph, 'QUERY', 5)
+        assert graph.queries == ['QUERY']
+
+    def test_conflicting_batches_deferred(self):
+        """A batch waiting for write locks does not hold up the batches queued after it."""
+        Neo4jTransactor.queue = TransactorQueue()
+        Neo4jTransactor.write_locks = WriteLocks()
+        genes = {('Gene', None): True}
+        alleles = {('Allele', None): True}
+        Neo4jTransactor.write_locks.acquire(genes)
+        for (count, lock_keys) in enumerate([genes, alleles]):
+            Neo4jTransactor.queue.put(([], count, None, lock_keys, 0))
+
+        transactor = Neo4jTransactor()
+        deferred = []
+        assert transactor.get_next_batch(deferred)[1] == 1
+        assert [batch[1] for batch in deferred] == [0]
+
+        Neo4jTransactor.write_locks.release(genes)
+        assert transactor.get_next_batch(deferred)[1] == 0
+        assert deferred == []
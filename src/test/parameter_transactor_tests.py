@@ -0,0 +1,95 @@
+"""Parameter Transactor tests.
+
+Checks how generator rows become query batches with parameters.
+No neo4j database is needed.
+"""
+from etl import BGIETL
+from scheduler import PendingBatches, TransactorQueue
+from transactors import CSVTransactor, Neo4jTransactor, ParameterTransactor
+
+
+QUERY_TEMPLATE = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            MATCH (g:Gene {primaryKey: row.primaryId})
+            MERGE (gchrm:GenomicLocation {primaryKey: row.id})
+                ON CREATE SET gchrm.start = apoc.number.parseInt(row.start)
+            MERGE (g)-[:ASSOCIATION]->(gchrm)
+        }
+    IN TRANSACTIONS of %s ROWS"""
+
+
+def get_generators():
+    """Yield two batches for two queries, like an ETL does."""
+    yield [[{'primaryId': 'FB:1', 'id': 'a', 'start': 1}], [{'primaryId': 'FB:1', 'id': ('x', 1), 'start': None}]]
+    yield [[{'primaryId': 'FB:2', 'id': 'b', 'start': 2}], []]
+
+
+def get_bgi_generators():
+    """Yield three batches of genes, with the chromosomes only in the last one, like BGIETL does."""
+    for batch_number in range(3):
+        chromosomes = [{'primaryKey': '2L'}, {'primaryKey': 'X'}] if batch_number == 2 else []
+        yield [[{'primaryId': 'FB:%s' % batch_number, 'chromosome': '2L'}],
+               chromosomes,
+               [{'primaryId': 'FB:%s' % batch_number, 'chromosome': '2L', 'uuid': str(batch_number)}]]
+
+
+class TestClass():
+    """Test Class."""
+
+    def setup_method(self):
+        """Queue the query batches locally."""
+        Neo4jTransactor.queue = TransactorQueue()
+        Neo4jTransactor.pending_batches = PendingBatches()
+
+    def teardown_method(self):
+        """Write CSV files again."""
+        ParameterTransactor.set_etl_names([])
+        ParameterTransactor.select('BGI')
+
+    def test_parameter_query(self):
+        """The template body is kept, reading its rows from $rows."""
+        query = ParameterTransactor.get_parameter_query(QUERY_TEMPLATE % ('genes_FB.csv', 10000))
+        assert query.split('\n')[1].strip() == 'UNWIND $rows AS row'
+        assert 'gchrm.start = toInteger(row.start)' in query
+        assert 'IN TRANSACTIONS of 10000 ROWS' in query
+        assert ParameterTransactor.get_parameter_query("MATCH (n) RETURN count(n)") is None
+
+    def test_rows_sent_as_batches(self):
+        """Every generator batch becomes a query batch running the queries in order."""
+        ParameterTransactor.set_etl_names(['BGI'])
+        ParameterTransactor.select('BGI')
+        query_and_file_list = [[QUERY_TEMPLATE % ('genes_FB.csv', 10000), 'genes_FB.csv'],
+                               [QUERY_TEMPLATE % ('more_FB.csv', 10000), 'more_FB.csv']]
+        CSVTransactor.save_file_static(get_generators(), query_and_file_list)
+        assert query_and_file_list == []
+
+        first_batch = Neo4jTransactor.queue.get()[0]
+        assert [query[1] for query in first_batch] == ['genes_FB.csv#0', 'more_FB.csv#0']
+        assert first_batch[0][2] == [{'primaryId': 'FB:1', 'id': 'a', 'start': 1}]
+        assert first_batch[1][2] == [{'primaryId': 'FB:1', 'id': "('x', 1)", 'start': None}]
+
+        second_batch = Neo4jTransactor.queue.get()[0]
+        assert [query[1] for query in second_batch] == ['genes_FB.csv#1']
+        assert Neo4jTransactor.queue.empty()
+
+    def test_bgi_rows_loaded_in_order(self):
+        """With chunked=False nothing is sent and every chromosome is loaded before any genomic location."""
+        ParameterTransactor.set_etl_names(['BGI'])
+        ParameterTransactor.select('BGI')
+        query_and_file_list = [[BGIETL.so_terms_query_template % ('gene_so_terms_FB.csv', 10000),
+                                'gene_so_terms_FB.csv'],
+                               [BGIETL.chromosomes_query_template % ('gene_chromosomes_FB.csv', 10000),
+                                'gene_chromosomes_FB.csv'],
+                               [BGIETL.genomic_locations_query_template % ('gene_genomic_locations_FB.csv', 10000),
+                                'gene_genomic_locations_FB.csv']]
+        CSVTransactor.save_file_static(get_bgi_generators(), query_and_file_list, chunked=False)
+
+        assert Neo4jTransactor.queue.empty()
+        assert [query[1] for query in query_and_file_list] == [
+            'gene_so_terms_FB.csv#0', 'gene_so_terms_FB.csv#1', 'gene_so_terms_FB.csv#2',
+            'gene_chromosomes_FB.csv#2',
+            'gene_genomic_locations_FB.csv#0', 'gene_genomic_locations_FB.csv#1', 'gene_genomic_locations_FB.csv#2']
+        assert query_and_file_list[3][2] == [{'primaryKey': '2L'}, {'primaryKey': 'X'}]
+        assert query_and_file_list[4][0].split('\n')[1].strip() == 'UNWIND $rows AS row'
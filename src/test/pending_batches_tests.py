@@ -0,0 +1,35 @@
+"""Pending Batches tests.
+
+Checks how the processes wait for the query batches of others.
+No neo4j database is needed.
+"""
+import multiprocessing
+import time
+
+from scheduler import PendingBatches
+
+
+def finish_later(pending_batches, batch_key):
+    """Finish a batch from another process after a while, like a transactor does."""
+    time.sleep(0.2)
+    pending_batches.remove(batch_key)
+
+
+class TestClass():
+    """Test Class."""
+
+    def test_wait_across_processes(self):
+        """wait() returns once another process finished the batch, and the owner has nothing pending."""
+        pending_batches = PendingBatches()
+        pending_batches.add(('BGI', 1, 1))
+        pending_batches.add(('GO', 2, 1))
+        assert len(pending_batches) == 2
+        assert pending_batches.has_owner('BGI')
+
+        process = multiprocessing.Process(target=finish_later, args=(pending_batches, ('BGI', 1, 1)))
+        process.start()
+        pending_batches.wait(('BGI', 1, 1))
+        process.join()
+        assert not pending_batches.has_owner('BGI')
+        assert pending_batches.has_owner('GO')
+        assert len(pending_batches) == 1
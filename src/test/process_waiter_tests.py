@@ -0,0 +1,73 @@
+"""Process Waiter tests.
+
+Checks that waiting on workers returns as soon as they are done.
+No neo4j database is needed.
+"""
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from scheduler import Notification, ProcessWaiter
+
+
+def quick_job():
+    """Finish straight away."""
+
+
+def failing_job():
+    """Fail like an ETL that hits bad data."""
+    os._exit(1)
+
+
+def queue_worker(queue):
+    """Work through the queue forever, like the transactors do."""
+    while True:
+        queue.get()
+        queue.task_done()
+
+
+def start(target, *args):
+    """Start target in a new process."""
+    process = multiprocessing.Process(target=target, args=args)
+    process.start()
+    return process
+
+
+class TestClass():
+    """Test Class."""
+
+    def test_wait_returns_on_exit(self):
+        """Waiting returns when a process exits, not after a polling interval."""
+        processes = [start(quick_job)]
+        start_time = time.time()
+        ProcessWaiter.wait_for_processes(processes)
+        assert processes == []
+        assert time.time() - start_time < 2
+
+    def test_failure_exits(self):
+        """A failing process stops the waiting process."""
+        with pytest.raises(SystemExit):
+            ProcessWaiter.wait_for_processes([start(failing_job), start(quick_job)])
+
+    def test_queue_done(self):
+        """Waiting with a queue returns once its work is done, while the workers keep running."""
+        queue = multiprocessing.JoinableQueue()
+        processes = [start(queue_worker, queue)]
+        for item in range(10):
+            queue.put(item)
+
+        ProcessWaiter.wait_for_processes(processes, queue)
+        assert len(processes) == 1
+        processes[0].terminate()
+
+    def test_notification(self):
+        """A notification wakes the waiting process and can be cleared."""
+        notification = Notification()
+        start(notification.notify).join()
+        assert ProcessWaiter.wait([], [notification], timeout=2) == []
+        assert notification.reader.poll()
+
+        notification.clear()
+        assert not notification.reader.poll()
@@ -0,0 +1,61 @@
+"""Query Metrics tests.
+
+Checks how query metrics are recorded and ranked per template.
+No neo4j database is needed.
+"""
+from scheduler import QueryMetrics
+
+
+QUERY_TEMPLATE = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            MERGE (g:%s {primaryKey: row.primaryId})
+        }
+    IN TRANSACTIONS of 10000 ROWS"""
+
+
+class Counters():
+    """Counters of a result summary creating one node per row."""
+
+    def __init__(self, rows):
+        self.nodes_created = rows
+        self.properties_set = rows
+        self.nodes_deleted = self.relationships_created = self.relationships_deleted = 0
+        self.labels_added = self.labels_removed = 0
+
+
+class Summary():
+    """Result summary of a profiled query."""
+
+    def __init__(self, rows):
+        self.counters = Counters(rows)
+        self.profile = {'dbHits': rows, 'children': [{'dbHits': rows, 'children': []}]}
+
+
+class TestClass():
+    """Test Class."""
+
+    def teardown_method(self):
+        """Stop recording once the test is done."""
+        QueryMetrics.file_name = None
+
+    def test_templates_ranked(self, tmp_path):
+        """Queries of one template are summed up, the report ranks templates by time and by rate."""
+        QueryMetrics(str(tmp_path / 'query_metrics.jsonl'))
+        QueryMetrics.record('BGI', QUERY_TEMPLATE % ('genes_FB.csv', 'Gene'), 'genes_FB.csv', 1, 10, 1000, Summary(1000))
+        QueryMetrics.record('BGI', QUERY_TEMPLATE % ('genes_WB.csv', 'Gene'), 'genes_WB.csv', 2, 20, 1000, Summary(1000))
+        QueryMetrics.record('ALLELE', QUERY_TEMPLATE % ('alleles_FB.csv', 'Allele'), 'alleles_FB.csv', 0, 5, 5000, None)
+
+        templates = list(QueryMetrics.get_templates(QueryMetrics.file_name).values())
+        assert [(totals['etl'], totals['queries'], totals['run_seconds'], totals['rows']) for totals in templates] \
+            == [('BGI', 2, 30, 2000), ('ALLELE', 1, 5, 5000)]
+        assert templates[0]['nodes_created'] == 2000
+        assert templates[0]['db_hits'] == 4000
+
+        report = QueryMetrics.get_report(QueryMetrics.file_name, count=1)
+        assert report[0] == "Slowest query templates:"
+        assert '(BGI, e.g. genes_FB.csv): 2 queries, run 30.0s, queued 3.0s, 2000 rows, 67 rows/s' in report[1]
+        assert report[2] == "Fewest rows per second:"
+        assert '(BGI' in report[3]
+        assert len(report) == 4
@@ -0,0 +1,51 @@
+"""Query plan audit tests.
+
+Checks how costly plans and unbound variables of query templates are found.
+No neo4j database is needed.
+"""
+import os
+
+from etl import BGIETL
+from query_plan_audit import QueryPlanAudit
+
+
+def get_operator(operator, details='', children=(), identifiers=()):
+    """Return a plan operator as ResultSummary.plan does."""
+    return {'operatorType': operator + '@neo4j', 'identifiers': list(identifiers),
+            'args': {'Details': details}, 'children': list(children)}
+
+
+class TestClass():
+    """Test Class."""
+
+    def test_plan_findings(self):
+        """Label scans, filtered label scans, cartesian products and Eager are found anywhere in the plan."""
+        plan = get_operator('ProduceResults', children=[
+            get_operator('Eager', 'read/set conflict for property: primaryKey', children=[
+                get_operator('CartesianProduct', identifiers=['a', 'o'], children=[
+                    get_operator('Filter', 'o.primaryKey = row.reference_uuid', children=[
+                        get_operator('NodeByLabelScan', 'o:InteractionGeneJoin')]),
+                    get_operator('NodeByLabelScan', 'a:Assembly'),
+                    get_operator('NodeIndexSeek', 'UNIQUE g:Gene(primaryKey)')])])])
+
+        assert QueryPlanAudit.get_plan_findings(plan) == [
+            'eager: read/set conflict for property: primaryKey',
+            'cartesian product: a, o',
+            'missing index: o:InteractionGeneJoin filtered on o.primaryKey = row.reference_uuid',
+            'label scan: NodeByLabelScan a:Assembly']
+
+    def test_unbound_variables(self):
+        """A relationship merged to a misspelled variable is found."""
+        query = BGIETL.genomic_locations_query_template % ('genomic_locations.csv', 1000)
+        assert QueryPlanAudit.get_unbound_variables(query) == ['gchrmn']
+        query = BGIETL.gene_secondary_ids_query_template % ('secondary_ids.csv', 1000)
+        assert QueryPlanAudit.get_unbound_variables(query) == []
+
+    def test_render_sample(self, tmp_path):
+        """The sample CSV file has every column the template reads."""
+        audit = QueryPlanAudit(str(tmp_path))
+        query = audit.render('BGIETL.gene_secondary_ids_query_template', BGIETL.gene_secondary_ids_query_template)
+        assert "'file:///query_plan_audit_BGIETL_gene_secondary_ids_query_template.csv'" in query
+        with open(os.path.join(str(tmp_path), 'query_plan_audit_BGIETL_gene_secondary_ids_query_template.csv')) as sample:
+            assert sample.readline().strip() == 'primary_id,secondary_id'
+        assert audit.render('test', "MATCH (n) RETURN n") is None
@@ -0,0 +1,31 @@
+"""Row Filter tests.
+
+Checks that duplicate keys are found, in memory and once spilled to disk.
+"""
+import os
+
+from transactors.row_filter import RowFilter
+
+
+class TestClass():
+    """Test Class."""
+
+    def teardown_method(self):
+        """Keep keys in memory again."""
+        RowFilter.max_keys = 2000000
+
+    def test_duplicates_found_after_spill(self, tmp_path, monkeypatch):
+        """Keys seen before and after spilling to disk are found, other columns do not count."""
+        monkeypatch.chdir(str(tmp_path))
+        os.makedirs('tmp')
+        RowFilter.max_keys = 3
+        row_filter = RowFilter(['ei_uuid', 'pubPrimaryKey'])
+        rows = [{'ei_uuid': str(index % 5), 'pubPrimaryKey': 'PMID:1', 'uuid': str(index)} for index in range(12)]
+        assert [row_filter.is_new(row) for row in rows] == [True] * 5 + [False] * 7
+        assert row_filter.database is not None
+        assert row_filter.is_new({'ei_uuid': '1', 'pubPrimaryKey': 'PMID:2'})
+        assert not row_filter.is_new({'ei_uuid': '1', 'pubPrimaryKey': 'PMID:2'})
+        assert row_filter.dropped == 8
+
+        row_filter.close()
+        assert os.listdir('tmp') == []
@@ -0,0 +1,97 @@
+"""Row Sink tests.
+
+Checks that rows added to named outputs reach the CSV files in batches.
+No neo4j database is needed.
+"""
+import csv
+import os
+import threading
+import time
+
+import pytest
+
+from scheduler import PendingBatches, TransactorQueue
+from transactors import CSVTransactor, Neo4jTransactor, RowSink
+
+
+QUERY_TEMPLATE = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            MERGE (g:Gene {primaryKey: row.primaryId})
+        }
+    IN TRANSACTIONS of %s ROWS"""
+
+
+class BatchLoader():
+    """Takes the query batches off the queue in a thread, like a transactor that takes a while."""
+
+    def __init__(self):
+        self.queue = Neo4jTransactor.queue
+        self.pending_batches = Neo4jTransactor.pending_batches
+        self.batches = []
+        self.overlapping = False
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        """Load the batches one at a time, noting if another one was queued meanwhile."""
+        while True:
+            batch = self.queue.get()
+            time.sleep(0.05)
+            if len(self.pending_batches) > 1:
+                self.overlapping = True
+            self.batches.append([query[1] for query in batch[0]])
+            self.pending_batches.remove(batch[2])
+            self.queue.task_done()
+
+
+def get_sink():
+    """Return a sink with a gene and a synonym output, batching every two records."""
+    sink = RowSink(2)
+    sink.add_output('genes', QUERY_TEMPLATE % ('genes_FB.csv', 10000), 'genes_FB.csv')
+    sink.add_output('synonyms', QUERY_TEMPLATE % ('synonyms_FB.csv', 10000), 'synonyms_FB.csv')
+    return sink
+
+
+class TestClass():
+    """Test Class."""
+
+    def setup_method(self):
+        """Queue the query batches locally."""
+        Neo4jTransactor.queue = TransactorQueue()
+        Neo4jTransactor.pending_batches = PendingBatches()
+        self.loader = BatchLoader()
+
+    def teardown_method(self):
+        """Write one file per query again."""
+        CSVTransactor.set_chunk_rows(0)
+        Neo4jTransactor.set_batch_owner(None)
+
+    def test_rows_added_by_name(self, tmp_path, monkeypatch):
+        """Rows reach the files of their outputs, batches only end between records."""
+        monkeypatch.chdir(str(tmp_path))
+        os.makedirs('tmp')
+        CSVTransactor.set_chunk_rows(4)
+        with get_sink() as sink:
+            for index in range(5):
+                sink['genes'].add({'primaryId': 'FB:%s' % index})
+                sink['synonyms'].add({'primaryId': 'FB:%s' % index, 'synonym': 'a'})
+                sink['synonyms'].add({'primaryId': 'FB:%s' % index, 'synonym': 'b'})
+                sink.end_record()
+
+        assert [output.row_count for output in sink.outputs] == [5, 10]
+        # Every two records make a chunk of four synonyms, loaded in the order the outputs were declared.
+        assert self.loader.batches == [['genes_FB.csv', 'synonyms_FB.csv'], ['genes_FB_part2.csv', 'synonyms_FB_part2.csv']]
+        with open(os.path.join('tmp', 'synonyms_FB.csv'), encoding='utf-8') as csv_file:
+            assert len(list(csv.DictReader(csv_file))) == 4
+        assert [query[1] for query in sink.query_and_file_list] == ['genes_FB_part3.csv', 'synonyms_FB_part3.csv']
+
+    def test_write_error_raised(self, tmp_path, monkeypatch):
+        """An error writing the files is raised when the sink is closed."""
+        monkeypatch.chdir(str(tmp_path))
+        # No tmp directory to write to.
+        with pytest.raises(OSError):
+            with get_sink() as sink:
+                for index in range(10):
+                    sink['genes'].add({'primaryId': 'FB:%s' % index})
+                    sink.end_record()
@@ -0,0 +1,156 @@
+"""Run Manifest tests.
+
+Checks that an interrupted load can be resumed from its run manifest.
+No neo4j database is needed.
+"""
+import os
+
+from scheduler import RunManifest
+
+
+class TestClass():
+    """Test Class."""
+
+    query = "LOAD CSV WITH HEADERS FROM 'file:///%s' AS row RETURN row"
+
+    def setup_method(self):
+        """Reset the manifest shared by all processes."""
+        RunManifest.file_name = None
+        RunManifest.acknowledged_queries = set()
+
+    def teardown_method(self):
+        """Stop recording once the test is done."""
+        self.setup_method()
+
+    def write_interrupted_run(self, manifest_file):
+        """Record a run that died while loading the second ETL."""
+        RunManifest(manifest_file)
+        RunManifest.record('etl_extracted', etl='SPECIES')
+        RunManifest.record('batch_submitted', etl='SPECIES',
+                           queries=[[self.query % 'species.csv', 'species.csv']])
+        RunManifest.record('query_acknowledged', query=RunManifest.get_query_key(self.query % 'species.csv',
+                                                                                 'species.csv'))
+        RunManifest.record('etl_finished', etl='SPECIES')
+        RunManifest.record('etl_extracted', etl='BGI')
+        RunManifest.record('batch_submitted', etl='BGI',
+                           queries=[[self.query % 'bgi_FB.csv', 'bgi_FB.csv'],
+                                    [self.query % 'bgi_WB.csv', 'bgi_WB.csv']])
+        RunManifest.record('query_acknowledged', query=RunManifest.get_query_key(self.query % 'bgi_FB.csv',
+                                                                                 'bgi_FB.csv'))
+
+    def test_resume_skips_finished_work(self, tmp_path, monkeypatch):
+        """Only the queries Neo4j never acknowledged are replayed."""
+        monkeypatch.chdir(tmp_path)
+        os.mkdir('tmp')
+        for file_name in ['bgi_FB.csv', 'bgi_WB.csv']:
+            open(os.path.join('tmp', file_name), 'w').close()
+        self.write_interrupted_run('tmp/run_manifest.jsonl')
+
+        manifest = RunManifest('tmp/run_manifest.jsonl', resume=True)
+        assert manifest.resumed
+        assert manifest.finished_etls == {'SPECIES'}
+        assert manifest.extracted_etls == {'SPECIES', 'BGI'}
+        assert manifest.get_unacknowledged_batch('BGI') == [[self.query % 'bgi_WB.csv', 'bgi_WB.csv']]
+        assert RunManifest.is_acknowledged(self.query % 'bgi_FB.csv', 'bgi_FB.csv')
+
+    def test_missing_csv_reruns_etl(self, tmp_path, monkeypatch):
+        """Queries can not be replayed once their CSV file is gone."""
+        monkeypatch.chdir(tmp_path)
+        os.mkdir('tmp')
+        self.write_interrupted_run('tmp/run_manifest.jsonl')
+
+        manifest = RunManifest('tmp/run_manifest.jsonl', resume=True)
+        assert manifest.get_unacknowledged_batch('BGI') is None
+
+    def test_restarted_etl_loads_everything(self, tmp_path, monkeypatch):
+        """An ETL run again has none of its queries skipped, in this resume and the next."""
+        monkeypatch.chdir(tmp_path)
+        os.mkdir('tmp')
+        self.write_interrupted_run('tmp/run_manifest.jsonl')
+
+        manifest = RunManifest('tmp/run_manifest.jsonl', resume=True)
+        manifest.restart_etl('BGI')
+        assert not RunManifest.is_acknowledged(self.query % 'bgi_FB.csv', 'bgi_FB.csv')
+        assert RunManifest.is_acknowledged(self.query % 'species.csv', 'species.csv')
+        assert 'BGI' not in manifest.extracted_etls
+
+        # Interrupted again before the rerun acknowledged anything.
+        RunManifest.acknowledged_queries = set()
+        manifest = RunManifest('tmp/run_manifest.jsonl', resume=True)
+        assert not RunManifest.is_acknowledged(self.query % 'bgi_FB.csv', 'bgi_FB.csv')
+        assert manifest.extracted_etls == {'SPECIES'}
+
+    def write_half_loaded_run(self, manifest_file, queries):
+        """Record a run that died while BGI loaded the first of its queries, [query, file] each."""
+        RunManifest(manifest_file)
+        RunManifest.record('etl_extracted', etl='BGI')
+        RunManifest.record('batch_submitted', etl='BGI', queries=queries)
+        RunManifest.record('query_started', query=RunManifest.get_query_key(*queries[0]))
+
+    def test_partial_creates_not_replayed(self, tmp_path, monkeypatch):
+        """A query creating nodes that was interrupted can not be replayed, one merging them can."""
+        monkeypatch.chdir(tmp_path)
+        os.mkdir('tmp')
+        for file_name in ['locations_FB.csv', 'genes_FB.csv']:
+            open(os.path.join('tmp', file_name), 'w').close()
+        create_query = "LOAD CSV WITH HEADERS FROM 'file:///locations_FB.csv' AS row " \
+                       "CREATE (l:GenomicLocation {primaryKey: row.uuid})"
+        merge_query = "LOAD CSV WITH HEADERS FROM 'file:///genes_FB.csv' AS row " \
+                      "MERGE (g:Gene {primaryKey: row.primaryId}) ON CREATE SET g.symbol = row.symbol"
+        self.write_half_loaded_run('tmp/run_manifest.jsonl', [[create_query, 'locations_FB.csv'],
+                                                              [merge_query, 'genes_FB.csv']])
+        manifest = RunManifest('tmp/run_manifest.jsonl', resume=True)
+        assert manifest.get_unsafe_queries('BGI') == [[create_query, 'locations_FB.csv']]
+
+        self.write_half_loaded_run('tmp/run_manifest.jsonl', [[merge_query, 'genes_FB.csv'],
+                                                              [create_query, 'locations_FB.csv']])
+        manifest = RunManifest('tmp/run_manifest.jsonl', resume=True)
+        # The creating query never started, so it wrote nothing yet.
+        assert manifest.get_unsafe_queries('BGI') == []
+
+    def test_partial_merges_not_rerun(self, tmp_path, monkeypatch):
+        """Run again, an ETL merges new keys, so only its queries that only match can be repeated."""
+        monkeypatch.chdir(tmp_path)
+        os.mkdir('tmp')
+        merge_query = "LOAD CSV WITH HEADERS FROM 'file:///locations_FB.csv' AS row " \
+                      "MERGE (l:GenomicLocation {primaryKey: row.uuid})"
+        set_query = "LOAD CSV WITH HEADERS FROM 'file:///genes_FB.csv' AS row " \
+                    "MATCH (g:Gene {primaryKey: row.primaryId}) SET g.automatedGeneSynopsis = row.synopsis"
+        self.write_half_loaded_run('tmp/run_manifest.jsonl', [[set_query, 'genes_FB.csv'],
+                                                              [merge_query, 'locations_FB.csv']])
+        manifest = RunManifest('tmp/run_manifest.jsonl', resume=True)
+        assert manifest.get_unsafe_queries('BGI') == []
+
+        self.write_half_loaded_run('tmp/run_manifest.jsonl', [[merge_query, 'locations_FB.csv']])
+        manifest = RunManifest('tmp/run_manifest.jsonl', resume=True)
+        manifest.restart_etl('BGI')
+        assert manifest.get_unsafe_queries('BGI') == [[merge_query, 'locations_FB.csv']]
+
+        # Until what it loaded is deleted, in this resume and the next.
+        manifest.clear_etl('BGI')
+        assert manifest.get_unsafe_queries('BGI') == []
+        manifest = RunManifest('tmp/run_manifest.jsonl', resume=True)
+        assert manifest.get_unsafe_queries('BGI') == []
+
+    def test_new_run_clears_manifest(self, tmp_path):
+        """Starting without resume begins a fresh manifest."""
+        manifest_file = str(tmp_path / 'run_manifest.jsonl')
+        self.write_interrupted_run(manifest_file)
+
+        manifest = RunManifest(manifest_file)
+        assert not manifest.resumed
+        assert os.path.getsize(manifest_file) == 0
+
+    def test_bulk_import_deferred_queries(self, tmp_path):
+        """Queries deferred by a bulk import run once."""
+        manifest_file = str(tmp_path / 'run_manifest.jsonl')
+        RunManifest(manifest_file)
+        RunManifest.record('query_deferred', query="CREATE (o:AllianceReleaseInfo)")
+        RunManifest.record('query_deferred', query="MATCH (n) DETACH DELETE n")
+
+        manifest = RunManifest(manifest_file, resume=True)
+        assert manifest.get_deferred_queries() == ["CREATE (o:AllianceReleaseInfo)", "MATCH (n) DETACH DELETE n"]
+
+        RunManifest.record('query_acknowledged', query=RunManifest.get_query_key("CREATE (o:AllianceReleaseInfo)", ''))
+        manifest = RunManifest(manifest_file, resume=True)
+        assert manifest.get_deferred_queries() == ["MATCH (n) DETACH DELETE n"]
@@ -0,0 +1,48 @@
+"""Transaction Journal tests.
+
+Checks that the queries of a load can be replayed from the journal.
+No neo4j database is needed.
+"""
+import os
+
+from scheduler import TransactionJournal
+
+
+class TestClass():
+    """Test Class."""
+
+    def teardown_method(self):
+        """Stop recording once the test is done."""
+        TransactionJournal.file_name = None
+
+    def test_batches_in_order(self, tmp_path, monkeypatch):
+        """Queries are grouped back into the batches of their ETL, in the order they ran."""
+        monkeypatch.chdir(str(tmp_path))
+        TransactionJournal(os.path.join('tmp', 'transaction_journal.jsonl'))
+        with open(os.path.join('tmp', 'bgi_FB.csv'), 'w') as csv_file:
+            csv_file.write('primaryId\nFB:1\n')
+        TransactionJournal.record('BGI', 'BGI-1-1', 'QUERY 1', 'bgi_FB.csv', None, 1.5)
+        TransactionJournal.record('BGI', 'BGI-1-2', 'QUERY 3', 'bgi_FB.csv#0', [{'primaryId': 'FB:1'}], 0.5)
+        TransactionJournal.record('BGI', 'BGI-1-1', 'QUERY 2', 'bgi_FB.csv', None, 2.0)
+
+        entries = TransactionJournal.get_entries(TransactionJournal.file_name)
+        assert entries[0]['checksum'] == TransactionJournal.get_checksum('bgi_FB.csv')
+        assert TransactionJournal.get_batches(entries) == {
+            'BGI': [[['QUERY 1', 'bgi_FB.csv'], ['QUERY 2', 'bgi_FB.csv']],
+                    [['QUERY 3', 'bgi_FB.csv#0', [{'primaryId': 'FB:1'}]]]]}
+        assert TransactionJournal.get_changed_files(entries) == []
+
+    def test_changed_files(self, tmp_path, monkeypatch):
+        """A replay needs the CSV files exactly as they were loaded."""
+        monkeypatch.chdir(str(tmp_path))
+        TransactionJournal(os.path.join('tmp', 'transaction_journal.jsonl'))
+        for file_name in ['bgi_FB.csv', 'bgi_WB.csv']:
+            with open(os.path.join('tmp', file_name), 'w') as csv_file:
+                csv_file.write('primaryId\nFB:1\n')
+            TransactionJournal.record('BGI', 'BGI-1-1', 'QUERY', file_name, None, 1.0)
+        with open(os.path.join('tmp', 'bgi_FB.csv'), 'a') as csv_file:
+            csv_file.write('FB:2\n')
+        os.remove(os.path.join('tmp', 'bgi_WB.csv'))
+
+        entries = TransactionJournal.get_entries(TransactionJournal.file_name)
+        assert TransactionJournal.get_changed_files(entries) == ['bgi_FB.csv', 'bgi_WB.csv']
@@ -0,0 +1,83 @@
+"""Transactor Queue tests.
+
+Checks the priorities and join of the transactor work queue.
+No neo4j database is needed.
+"""
+import multiprocessing
+
+from scheduler import ProcessWaiter, TransactorQueue
+
+
+def put_items(queue, items, priority):
+    """Queue items from another process, like an ETL does."""
+    for item in items:
+        queue.put(item, priority)
+
+
+def take_items(queue, results):
+    """Work through the queue forever, like the transactors do."""
+    while True:
+        results.put(queue.get())
+        queue.task_done()
+
+
+def take_item_numbers(queue, results):
+    """Work through the queue forever, reporting only the number of each item."""
+    while True:
+        results.put(queue.get()[1])
+        queue.task_done()
+
+
+class TestClass():
+    """Test Class."""
+
+    def test_priority_order(self):
+        """Higher priorities are taken first, each in the order queued."""
+        queue = TransactorQueue()
+        queue.put('bulk 1', TransactorQueue.LOW)
+        queue.put('critical 1', TransactorQueue.HIGH)
+        queue.put('bulk 2', TransactorQueue.LOW)
+        queue.put('critical 2', TransactorQueue.HIGH)
+        assert queue.qsize() == 4
+
+        assert [queue.get() for _ in range(4)] == ['critical 1', 'critical 2', 'bulk 1', 'bulk 2']
+        assert queue.empty()
+
+        stats = queue.get_stats()
+        assert stats['taken'] == 4
+        assert (stats['high'], stats['low']) == (0, 0)
+
+    def test_join_across_processes(self):
+        """join() returns once the consumer processes handled everything put by the producers."""
+        queue = TransactorQueue()
+        results = multiprocessing.SimpleQueue()
+        consumers = [multiprocessing.Process(target=take_items, args=(queue, results)) for _ in range(3)]
+        producers = [multiprocessing.Process(target=put_items, args=(queue, range(start, start + 50), priority))
+                     for start, priority in [(0, TransactorQueue.HIGH), (100, TransactorQueue.LOW)]]
+        for process in consumers + producers:
+            process.start()
+        ProcessWaiter.wait_for_processes(producers)
+
+        queue.join()
+        taken = set()
+        while not results.empty():
+            taken.add(results.get())
+        assert taken == set(range(0, 50)) | set(range(100, 150))
+        for process in consumers:
+            process.terminate()
+
+    def test_large_items(self):
+        """Items larger than the pipe buffer do not block the producer before a consumer takes them."""
+        queue = TransactorQueue()
+        results = multiprocessing.SimpleQueue()
+        consumer = multiprocessing.Process(target=take_item_numbers, args=(queue, results))
+        consumer.start()
+        items = [['x' * 200000, index] for index in range(3)]
+        producer = multiprocessing.Process(target=put_items, args=(queue, items, TransactorQueue.LOW))
+        producer.start()
+        producer.join(30)
+        assert producer.exitcode == 0
+
+        queue.join()
+        assert [results.get() for _ in range(3)] == [0, 1, 2]
+        consumer.terminate()
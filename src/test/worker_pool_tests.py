@@ -0,0 +1,123 @@
+"""Worker Pool tests.
+
+Checks that sub-type workers stay within the shared process and memory limits.
+No neo4j database is needed.
+"""
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from scheduler import WorkerPool
+
+
+def record_job(log_file, job_name):
+    """Log when the job starts and ends."""
+    with open(log_file, 'a') as log:
+        log.write("start %s\n" % job_name)
+    time.sleep(0.2)
+    with open(log_file, 'a') as log:
+        log.write("end %s\n" % job_name)
+
+
+def parked_job(log_file, job_name, scheduled):
+    """Log like record_job; the parked job waits, paused, until the other one has run."""
+    with open(log_file, 'a') as log:
+        log.write("start %s\n" % job_name)
+    if job_name == 'parked':
+        WorkerPool.pause_job()
+        assert scheduled.wait(10)
+        WorkerPool.resume_job()
+    else:
+        scheduled.set()
+    with open(log_file, 'a') as log:
+        log.write("end %s\n" % job_name)
+
+
+def failing_job():
+    """Fail like an ETL that hits bad data."""
+    os._exit(1)
+
+
+class TestClass():
+    """Test Class."""
+
+    def teardown_method(self):
+        """Remove the limits again."""
+        WorkerPool.slots = None
+        WorkerPool.memory_budget = None
+        WorkerPool.memory_history_file = None
+        WorkerPool.memory_history = {}
+        WorkerPool.base_memory = 256 * 1024 * 1024
+        WorkerPool.memory_per_input_byte = 8
+
+    @staticmethod
+    def check_log(log_file, limit):
+        """Return the jobs in start order, checking no more than limit ran at once."""
+        running = 0
+        started = []
+        with open(log_file) as log:
+            for line in log:
+                event, job_name = line.split()
+                if event == 'start':
+                    running += 1
+                    started.append(job_name)
+                else:
+                    running -= 1
+                assert running <= limit
+        return started
+
+    def test_limit_and_order(self, tmp_path):
+        """No more than the pool size run at once, in the order given."""
+        log_file = str(tmp_path / 'jobs.log')
+        WorkerPool.set_size(2)
+        WorkerPool.run(record_job, [(name, 0, (log_file, name)) for name in ['big', 'medium', 'small', 'tiny']])
+
+        started = self.check_log(log_file, 2)
+        assert started[:2] in (['big', 'medium'], ['medium', 'big'])
+        assert set(started[2:]) == {'small', 'tiny'}
+
+    def test_failure_exits(self):
+        """A failing worker stops the ETL."""
+        WorkerPool.set_size(1)
+        with pytest.raises(SystemExit):
+            WorkerPool.run(failing_job, [('fail', 0, ()), ('fail', 0, ())])
+
+    def test_memory_budget(self, tmp_path):
+        """Jobs that do not fit in the memory budget together never run together."""
+        log_file = str(tmp_path / 'jobs.log')
+        WorkerPool.base_memory = 0
+        WorkerPool.memory_per_input_byte = 1
+        WorkerPool.set_size(4)
+        WorkerPool.set_memory_budget(100, str(tmp_path / 'memory.jsonl'))
+        WorkerPool.run(record_job, [(name, 60, (log_file, name)) for name in ['first', 'second']])
+
+        assert self.check_log(log_file, 1) == ['first', 'second']
+        assert WorkerPool.memory_in_use.value == 0
+        assert set(WorkerPool.load_memory_history(str(tmp_path / 'memory.jsonl'))) == {'first', 'second'}
+
+    def test_estimate_from_history(self, tmp_path):
+        """Recorded peak memory is used, scaled up when the input grew."""
+        history_file = str(tmp_path / 'memory.jsonl')
+        with open(history_file, 'w') as history:
+            history.write('{"job": "BGI-FB", "input_size": 100, "peak_rss": 1000}\n')
+            history.write('{"job": "BGI-FB", "input_size": 100, "peak_rss": 2000}\n')
+        WorkerPool.set_memory_budget(10000, history_file)
+
+        assert WorkerPool.estimate_memory('BGI-FB', 50) == 2000
+        assert WorkerPool.estimate_memory('BGI-FB', 200) == 4000
+        assert WorkerPool.estimate_memory('BGI-WB', 10) == WorkerPool.base_memory + 10 * WorkerPool.memory_per_input_byte
+
+    def test_parked_job_frees_memory(self, tmp_path):
+        """A job parked at the submit gate lets the job it waits for run, even if both do not fit."""
+        WorkerPool.base_memory = 0
+        WorkerPool.memory_per_input_byte = 1
+        WorkerPool.set_size(1)
+        WorkerPool.set_memory_budget(100, None)
+        log_file = str(tmp_path / 'jobs.log')
+        scheduled = multiprocessing.Event()
+        WorkerPool.run(parked_job, [(name, 60, (log_file, name, scheduled)) for name in ['parked', 'other']])
+        with open(log_file) as log:
+            assert log.read().split() == ['start', 'parked', 'start', 'other', 'end', 'other', 'end', 'parked']
+        assert WorkerPool.memory_in_use.value == 0
@@ -0,0 +1,75 @@
+"""Write Locks tests.
+
+Checks which labels query batches lock and when they conflict.
+No neo4j database is needed.
+"""
+from scheduler import WriteLocks
+
+
+GENE_QUERY = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            MATCH (o:Species {primaryKey: row.taxonId})
+            MERGE (g:Gene {primaryKey: row.primaryId})
+                ON CREATE SET g.symbol = row.symbol
+            MERGE (g)-[:FROM_SPECIES]-(o)
+        }
+    IN TRANSACTIONS of %s ROWS"""
+
+ALLELE_GENE_QUERY = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            MATCH (g:Gene {primaryKey: row.geneId})
+            MATCH (a:Allele {primaryKey: row.alleleId})
+            CALL apoc.merge.relationship(a, 'IS_ALLELE_OF', {}, {}, g) yield rel
+            MERGE (a)-[:IS_ALLELE_OF]->(g)
+        }
+    IN TRANSACTIONS of %s ROWS"""
+
+PUBLICATION_QUERY = """
+    LOAD CSV WITH HEADERS FROM 'file:///%s' AS row
+        CALL {
+            WITH row
+            MATCH (d:DOTerm {primaryKey: row.doId})
+            MERGE (pub:Publication {primaryKey: row.pubPrimaryKey})
+            MERGE (pub)-[:ANNOTATED_TO]-(d)
+        }
+    IN TRANSACTIONS of %s ROWS"""
+
+
+class TestClass():
+    """Test Class."""
+
+    def test_written_labels(self):
+        """Merged and set nodes are written, matched nodes only linked to."""
+        assert WriteLocks.get_written_labels(GENE_QUERY) == ({'Gene'}, {'Species'})
+        assert WriteLocks.get_written_labels(ALLELE_GENE_QUERY) == (set(), {'Gene', 'Allele'})
+
+    def test_lock_keys(self):
+        """Provider nodes are locked per partition, shared nodes across all of them."""
+        assert WriteLocks.get_lock_keys([(GENE_QUERY, 'genes.csv')], 'FB') == {
+            ('Gene', 'FB'): True, ('Gene', None): False}
+        assert WriteLocks.get_lock_keys([(GENE_QUERY, 'genes.csv')]) == {('Gene', None): True}
+        assert WriteLocks.get_lock_keys([(PUBLICATION_QUERY, 'pubs.csv')], 'FB') == {
+            ('Publication', None): True}
+
+    def test_conflicts(self):
+        """Batches only run together when their partitions differ."""
+        locks = WriteLocks()
+        fly_genes = WriteLocks.get_lock_keys([(GENE_QUERY, 'genes.csv')], 'FB')
+        worm_genes = WriteLocks.get_lock_keys([(GENE_QUERY, 'genes.csv')], 'WB')
+        all_genes = WriteLocks.get_lock_keys([(GENE_QUERY, 'genes.csv')])
+
+        assert locks.acquire(fly_genes)
+        assert locks.acquire(worm_genes)
+        assert not locks.acquire(fly_genes)
+        assert not locks.acquire(all_genes)
+
+        release_count = locks.get_release_count()
+        locks.release(fly_genes)
+        locks.release(worm_genes)
+        locks.wait_for_release(release_count)
+        assert locks.acquire(all_genes)
+        assert not locks.acquire(worm_genes)
@@ -1,4 +1,8 @@
 from .transactor import Transactor
 from .csv_transactor import CSVTransactor
 from .neo4j_transactor import Neo4jTransactor
-from .file_transactor import FileTransactor
\ No newline at end of file
+from .file_transactor import FileTransactor
+from .parameter_transactor import ParameterTransactor
+from .import_transactor import ImportTransactor
+from .async_neo4j_transactor import AsyncNeo4jTransactor
+from .row_sink import RowSink
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""Async Neo4j Transactor"""
+
+import asyncio
+import time
+
+from neo4j import AsyncGraphDatabase
+from loader_common import ContextInfo
+from scheduler import CommitSizes, RunManifest
+
+from .neo4j_transactor import Neo4jTransactor
+
+
+class AsyncNeo4jTransactor(Neo4jTransactor):
+    """Neo4j Transactor keeping many query batches in flight from each process
+
+    Every transactor process runs an asyncio loop on the async neo4j driver
+    and takes up to batches_in_flight query batches off the queue at once,
+    each running its queries in order. The batches share the connections of
+    the process's driver, so far fewer processes give the same concurrency.
+    Used when NEO4J_ASYNC_BATCHES is set.
+    """
+
+    def __init__(self, batches_in_flight):
+        super().__init__()
+        self.batches_in_flight = batches_in_flight
+
+    async def run_query_async(self, driver, neo4j_query, max_retries, rows=None, row_count=None):
+        """Run a query like run_query does, without blocking the other batches of the process"""
+
+        attempt = 0
+        while True:
+            (sized_query, commit_size) = CommitSizes.get_query(neo4j_query)
+            try:
+                summary = None
+                if driver is not None:
+                    start = time.time()
+                    async with driver.session() as session:
+                        if rows is None:
+                            result = await session.run(sized_query)
+                        else:
+                            result = await session.run(sized_query, rows=rows)
+                        summary = await result.consume()
+                    self.record_query_run(neo4j_query, commit_size, row_count, time.time() - start)
+                return (sized_query, summary)
+            except Exception as error:
+                delay = self.get_error_retry_delay(error, neo4j_query, commit_size, attempt, max_retries)
+                if delay is None:
+                    raise
+                attempt = attempt + 1
+                await asyncio.sleep(delay)
+
+    async def run_batch_async(self, driver, batch, max_retries):
+        """Run the queries of a batch in order"""
+
+        query_batch = batch[0]
+        self.logger.debug("%s: Processing query batch: %s BatchSize: %s", self._get_name(), batch[1], len(query_batch))
+        batch_start = time.time()
+
+        while len(query_batch) > 0:
+            (neo4j_query, filename) = query_batch[0][:2]
+            (rows, row_count) = self.get_query_rows(query_batch[0])
+
+            RunManifest.record('query_started', query=RunManifest.get_query_key(neo4j_query, filename))
+            start = time.time()
+            try:
+                result = await self.run_query_async(driver, neo4j_query, max_retries, rows, row_count)
+            except Exception as error:
+                self.fail_batch(batch, error)
+                break
+            self.finish_query(batch, batch_start, start, result)
+
+        self.finish_batch(batch, batch_start)
+
+    async def run_async(self):
+        """Take batches off the queue as long as fewer than batches_in_flight are running"""
+
+        context_info = ContextInfo()
+        max_retries = int(context_info.env["NEO4J_QUERY_RETRIES"])
+        driver = None
+
+        if context_info.env["USING_PICKLE"] is False:
+            uri = "bolt://" + context_info.env["NEO4J_HOST"] + ":" + str(context_info.env["NEO4J_PORT"])
+            driver = AsyncGraphDatabase.driver(uri, auth=("neo4j", "neo4j"),
+                                               max_connection_pool_size=self.batches_in_flight, fetch_size=10000)
+
+        self.logger.info("%s: Starting AsyncNeo4jTransactor with %s batches in flight", self._get_name(), self.batches_in_flight)
+        loop = asyncio.get_running_loop()
+        deferred = []
+        running = set()
+        while True:
+            if len(running) >= self.batches_in_flight:
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in [task for task in running if task.done()]:
+                running.remove(task)
+                # Let errors outside of the queries end the process, as they do in Neo4jTransactor.
+                task.result()
+
+            # Waiting for the queue and the write locks blocks, so it is done in a thread.
+            batch = await loop.run_in_executor(None, self.get_next_batch, deferred)
+            running.add(asyncio.ensure_future(self.run_batch_async(driver, batch, max_retries)))
+
+    def run(self):
+        """Run"""
+
+        asyncio.run(self.run_async())
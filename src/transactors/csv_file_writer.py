@@ -0,0 +1,116 @@
+"""CSV File Writer"""
+
+import csv
+import gzip
+import logging
+from operator import itemgetter
+import os
+import queue
+import threading
+
+
+class CSVFileWriter():
+    """Writes the rows of one CSV file from a background thread
+
+    The generator hands each batch of rows to put and goes on parsing while
+    the thread writes them, so parsing does not wait for the disk (or for
+    gzip). The queue is bounded, so a slow disk holds the generator back
+    instead of filling memory.
+
+    The columns are taken from the first row, like csv.DictWriter does, and
+    the rows are written as tuples taken by one itemgetter. The file is the
+    same as a DictWriter with QUOTE_NONNUMERIC would write: rows missing a
+    column get an empty value and rows with an unknown column fail.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Batches of rows waiting to be written, per file.
+    queue_size = 8
+
+    def __init__(self, file_name, compression_level=0):
+        """Start the thread writing to file_name in the tmp directory, gzip compressed if it ends with .gz"""
+
+        self.file_name = file_name
+        self.compression_level = compression_level
+        self.queue = queue.Queue(self.queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="CSVFileWriter %s" % file_name, daemon=True)
+        self.thread.start()
+
+    def open_file(self):
+        """Open the file for writing"""
+
+        path = os.path.join('tmp', self.file_name)
+        if self.file_name.endswith('.gz'):
+            return gzip.open(path, 'wt', compresslevel=self.compression_level or 6, encoding='utf-8')
+        return open(path, 'w', encoding='utf-8')
+
+    @staticmethod
+    def get_row_getter(field_names):
+        """Return a function taking the values of a row (a dictionary) as a tuple, in the order of field_names"""
+
+        getter = itemgetter(*field_names)
+        if len(field_names) == 1:
+            return lambda row: (getter(row),)
+        return getter
+
+    @staticmethod
+    def get_row_values(row, field_names):
+        """Take the values of a row the way csv.DictWriter does"""
+
+        unknown = [key for key in row if key not in field_names]
+        if unknown:
+            raise ValueError("dict contains fields not in fieldnames: " + ", ".join(repr(key) for key in unknown))
+        return tuple(row.get(key, '') for key in field_names)
+
+    def write_rows(self, csv_file, rows):
+        """Write rows to the open file, with the header first"""
+
+        if self.writer is None:
+            self.field_names = list(rows[0])
+            self.field_count = len(self.field_names)
+            self.row_getter = self.get_row_getter(self.field_names)
+            self.writer = csv.writer(csv_file, quoting=csv.QUOTE_NONNUMERIC)
+            self.writer.writerow(self.field_names)
+
+        try:
+            # Rows with the columns of the first row take the fast path.
+            values = [self.row_getter(row) for row in rows if len(row) == self.field_count]
+        except KeyError:
+            values = None
+        if values is None or len(values) < len(rows):
+            values = [self.get_row_values(row, self.field_names) for row in rows]
+        self.writer.writerows(values)
+
+    def run(self):
+        """Write the batches put on the queue until close"""
+
+        self.writer = None
+        try:
+            with self.open_file() as csv_file:
+                while True:
+                    rows = self.queue.get()
+                    if rows is None:
+                        break
+                    self.write_rows(csv_file, rows)
+        except Exception as error:
+            self.logger.critical("Couldn't write to file: %s", self.file_name)
+            self.logger.critical(error)
+            self.error = error
+            # Keep taking batches, so put never blocks on a writer that stopped.
+            while self.queue.get() is not None:
+                pass
+
+    def put(self, rows):
+        """Queue a batch of rows (dictionaries without None) to be written"""
+
+        self.queue.put(rows)
+
+    def close(self):
+        """Wait until every row is written and the file is closed. Raises the error the writer stopped with"""
+
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
@@ -1,57 +1,227 @@
 """CSV Transactor"""
 
-from contextlib import ExitStack
-import csv
 import os
 import logging
 
+from .csv_file_writer import CSVFileWriter
+from .import_transactor import ImportTransactor
+from .neo4j_transactor import Neo4jTransactor
+from .parameter_transactor import ParameterTransactor
+from .row_filter import RowFilter
+
 
 class CSVTransactor():
     """CSV Transactor"""
     logger = logging.getLogger(__name__)
 
+    # Rows after which the CSV files roll over to new chunk files, see save_file_static. 0 writes one file per query.
+    chunk_rows = 0
+    # gzip level of the CSV files, see set_compression_level.
+    compression_level = 0
+    # Whether rows repeating the key of an earlier row are dropped, see filter_rows.
+    dedup = False
+
+    # Columns identifying the rows of a query, by the start of its CSV file name (the longest match counts).
+    # Only for queries where a row with the key of an earlier one changes nothing, e.g. ON CREATE SET only.
+    dedup_keys = {
+        'gene_chromosomes_': ['primaryKey'],
+        'gene_cross_references_': ['dataId', 'primaryKey'],
+        'expression_entities_': ['ebe_uuid'],
+        'expression_entity_joins_': ['ei_uuid', 'assay'],
+        'expression_stage_expression_': ['ei_uuid', 'stageName'],
+        'expression_uberon_stage_': ['ei_uuid', 'uberonStageId'],
+        'expression_uberon_stage_other_': ['ei_uuid'],
+        'expression_cross_references_': ['ei_uuid', 'primaryKey'],
+        'expression_add_pubs_': ['ei_uuid', 'pubPrimaryKey'],
+    }
+
+    @staticmethod
+    def set_chunk_rows(chunk_rows):
+        """Set after how many rows the CSV files roll over. Must be called before the ETLs are forked."""
+
+        CSVTransactor.chunk_rows = chunk_rows
+
+    @staticmethod
+    def set_compression_level(compression_level):
+        """Set the gzip level (1-9) of the CSV files, 0 writes them uncompressed. Must be called before the ETLs are forked."""
+
+        CSVTransactor.compression_level = compression_level
+
+    @staticmethod
+    def set_dedup(dedup):
+        """Set whether rows repeating the key of an earlier row are dropped. Must be called before the ETLs are forked."""
+
+        CSVTransactor.dedup = dedup
+
+    @staticmethod
+    def get_dedup_keys(file_name):
+        """Return the key columns declared for a CSV file in dedup_keys, None if there are none"""
+
+        prefixes = [prefix for prefix in CSVTransactor.dedup_keys if file_name.startswith(prefix)]
+        if not prefixes:
+            return None
+        return CSVTransactor.dedup_keys[max(prefixes, key=len)]
+
+    @staticmethod
+    def filter_rows(generator, generator_file_list):
+        """Wrap generator, dropping the rows whose key columns (see dedup_keys) were in an earlier row of their file"""
+
+        row_filters = []
+        for [query, file_name] in generator_file_list:
+            key_columns = CSVTransactor.get_dedup_keys(file_name)
+            row_filters.append(None if key_columns is None else RowFilter(key_columns))
+        try:
+            for generator_entry in generator:
+                yield [individual_list if row_filter is None else
+                       [row for row in individual_list if row is not None and row_filter.is_new(row)]
+                       for individual_list, row_filter in zip(generator_entry, row_filters)]
+        finally:
+            for [query, file_name], row_filter in zip(generator_file_list, row_filters):
+                if row_filter is not None:
+                    CSVTransactor.logger.info("Dropped %s duplicate rows of %s", row_filter.dropped, file_name)
+                    row_filter.close()
+
+    @staticmethod
+    def get_chunk_file_name(file_name, chunk):
+        """Return the file name of chunk number chunk (from 1) of a CSV file, e.g. genes_FB_part2.csv(.gz)"""
+
+        if chunk == 1:
+            return file_name
+        (stem, extension) = os.path.splitext(file_name)
+        if extension == '.gz':
+            (stem, csv_extension) = os.path.splitext(stem)
+            extension = csv_extension + extension
+        return "%s_part%s%s" % (stem, chunk, extension)
+
+    @staticmethod
+    def rename_file(query, file_name, new_file_name):
+        """Return [query, new_file_name], with the query loading new_file_name instead of file_name"""
+
+        return [query.replace("file:///" + file_name, "file:///" + new_file_name), new_file_name]
+
+    @staticmethod
+    def add_row_counts(generator_file_list, row_counts):
+        """Return [query, file_name, None, row count] for the queries of generator_file_list
+
+        The transactors learn the commit sizes from the row counts, see CommitSizes.
+        """
+
+        return [[query, file_name, None, row_count] for [query, file_name], row_count in zip(generator_file_list, row_counts)]
+
     @staticmethod
-    def save_file_static(generator, generator_file_list):
-        """Save File Static"""
+    def save_file_static(generator, generator_file_list, chunked=True):
+        """Save File Static
+
+        ETLs loading through query parameters send the rows to Neo4j instead, see ParameterTransactor.
+        During a bulk import, rows of queries that can be imported go to import files, see ImportTransactor.
+
+        With chunk_rows set, all CSV files roll over to new chunk files once
+        one of them has that many rows. Every finished chunk is loaded as a
+        query batch running the queries in order, while the rest of the
+        generator is written. A chunk is only queued once the one before it
+        finished loading, so chunks never overtake each other.
+        generator_file_list is left with the queries of the last chunk, for
+        the ETL to load as before, once the chunk before it finished too.
+        The queries go with the rows written to their files, see add_row_counts.
+        While the query batches of an ETL extracting ahead are held back,
+        the files do not roll over, so parsing never waits for its turn.
+
+        ETLs that collect the queries of all their sub types and load them
+        themselves, in the order they need (e.g. BGI loads the chromosomes
+        of its last batch before any genomic location), pass chunked=False.
+        They get one file per query, and loading through query parameters,
+        every query on all its rows back in generator_file_list.
+
+        With compression_level set, the files are written gzip compressed,
+        renamed to .csv.gz along with the queries loading them.
+
+        With dedup set, rows repeating the key of an earlier row of their
+        file are not written, see dedup_keys.
+        """
+
+        if ImportTransactor.enabled:
+            generator = ImportTransactor.save_rows_static(generator, generator_file_list)
+        elif ParameterTransactor.enabled and ParameterTransactor.save_rows_static(generator, generator_file_list,
+                                                                                  chunked):
+            return
 
-        with ExitStack() as stack:
-            # Open all necessary CSV files at once.
-            open_files = [stack.enter_context(open(os.path.join('tmp', file_name),'w',encoding='utf-8'))
+        if CSVTransactor.dedup:
+            generator = CSVTransactor.filter_rows(generator, list(generator_file_list))
+
+        if CSVTransactor.compression_level > 0:
+            # LOAD CSV reads gzip files as they are.
+            generator_file_list[:] = [CSVTransactor.rename_file(query, file_name, file_name + '.gz')
+                                      for [query, file_name] in generator_file_list]
+
+        if CSVTransactor.chunk_rows <= 0 or not chunked:
+            (_, row_counts) = CSVTransactor.save_chunk_static(generator, generator_file_list)
+            generator_file_list[:] = CSVTransactor.add_row_counts(generator_file_list, row_counts)
+            return
+
+        # So the rows are taken up where the last chunk stopped.
+        generator = iter(generator)
+        chunk = 1
+        batch_key = None
+        while True:
+            chunk_list = [CSVTransactor.rename_file(query, file_name, CSVTransactor.get_chunk_file_name(file_name, chunk))
                           for [query, file_name] in generator_file_list]
-            CSVTransactor.logger.debug(generator_file_list)
-            # Create a list with 'None' placeholder entries.
-            csv_file_writer = [None] * len(open_files)
+            (finished, row_counts) = CSVTransactor.save_chunk_static(generator, chunk_list, CSVTransactor.chunk_rows)
+            if finished and chunk == 1:
+                generator_file_list[:] = CSVTransactor.add_row_counts(generator_file_list, row_counts)
+                return
+            # Queries without rows in this chunk have nothing to load.
+            chunk_list = [query for query in CSVTransactor.add_row_counts(chunk_list, row_counts) if query[3] > 0]
+            # The rows of a chunk may depend on those of the one before, e.g. dropped by dedup as repeats.
+            Neo4jTransactor.wait_for_batch(batch_key)
+            if finished:
+                generator_file_list[:] = chunk_list
+                return
+
+            CSVTransactor.logger.info("Loading chunk %s of %s", chunk, generator_file_list[0][1])
+            batch_key = Neo4jTransactor.execute_query_batch(chunk_list)
+            chunk = chunk + 1
+
+    @staticmethod
+    def save_chunk_static(generator, generator_file_list, max_rows=None):
+        """Write the rows of generator to the CSV files of generator_file_list
+
+        Each file is written by its own CSVFileWriter thread, so the generator
+        goes on parsing while the rows are written.
+        Stops once a file has max_rows rows (if given) and query batches are not held back, at the end of a
+        generator batch.
+        Returns whether the generator is exhausted, and the rows written to each file.
+        """
+
+        CSVTransactor.logger.debug(generator_file_list)
+        row_counts = [0] * len(generator_file_list)
+        writers = []
+        try:
+            for [query, file_name] in generator_file_list:
+                writers.append(CSVFileWriter(file_name, CSVTransactor.compression_level))
+
             for generator_entry in generator:
                 for index, individual_list in enumerate(generator_entry):
-                    CSVTransactor.logger.debug(individual_list)
-                    current_filename = open_files[index].name  # Our current CSV output file.
-
                     # Remove None's from list which cause the write rows to crash
                     individual_list = [x for x in individual_list if x is not None]
 
                     if len(individual_list) == 0:
-                        CSVTransactor.logger.info("No data found when writing to %s. Skipping file.", current_filename)
+                        CSVTransactor.logger.info("No data found when writing to %s. Skipping file.",
+                                                  os.path.join('tmp', writers[index].file_name))
                         continue
 
-                    if csv_file_writer[index] is None:  # If we haven't yet created a DictWriter
-                        # for this particular file.
-                        CSVTransactor.logger.debug("Saving data to output file: %s",
-                                                   current_filename)
-                        try:
-                            csv_file_writer[index] = csv.DictWriter(
-                                                          open_files[index],
-                                                          fieldnames=list(individual_list[0]),
-                                                          quoting=csv.QUOTE_NONNUMERIC)
-                            csv_file_writer[index].writeheader()
-                        except csv.Error as error:
-                            CSVTransactor.logger.critical("Couldn't write to file: %s ",
-                                                          current_filename)
-                            CSVTransactor.logger.critical(error)
-
-                    # Write the remainder of the list
-                    csv_file_writer[index].writerows(individual_list)
-                    # content for this iteration.
-                    # logger.info("%s: Finished Writting %s entries to file: %s",
-                    #             self._get_name(),
-                    #             len(individual_list),
-                    #             current_filename)
+                    writers[index].put(individual_list)
+                    row_counts[index] = row_counts[index] + len(individual_list)
+
+                # Chunks held back would stop the generator until the ETL is scheduled, so none are cut.
+                if max_rows is not None and max(row_counts) >= max_rows and not Neo4jTransactor.is_submit_gate_closed():
+                    return (False, row_counts)
+            return (True, row_counts)
+        finally:
+            errors = []
+            for writer in writers:
+                try:
+                    writer.close()
+                except Exception as error:
+                    errors.append(error)
+            if errors:
+                raise errors[0]
@@ -2,9 +2,8 @@
 
 import logging
 import multiprocessing
-from time import sleep
 
-from etl import ETL
+from scheduler import ProcessWaiter, TransactorQueue
 
 
 class FileTransactor():
@@ -17,8 +16,10 @@ class FileTransactor():
 
     def __init__(self):
         manager = multiprocessing.Manager()
-        FileTransactor.queue = manager.Queue()
+        FileTransactor.queue = TransactorQueue()
         self.filetracking_queue = manager.list()
+        # Lets workers wait for a download another worker is doing without polling.
+        self.filetracking_condition = multiprocessing.Condition()
 
 
     @staticmethod
@@ -30,7 +31,7 @@ class FileTransactor():
 
         self.thread_pool = []
         for i in range(0, thread_count):
-            process = multiprocessing.Process(target=self.run, name=str(i), args=(self.filetracking_queue,))
+            process = multiprocessing.Process(target=self.run, name=str(i), args=(self.filetracking_queue, self.filetracking_condition))
             process.start()
             self.thread_pool.append(process)
 
@@ -46,7 +47,7 @@ class FileTransactor():
     def check_for_thread_errors(self):
         """Check for Thread Errors"""
 
-        ETL.wait_for_threads(self.thread_pool, FileTransactor.queue)
+        ProcessWaiter.wait_for_processes(self.thread_pool, FileTransactor.queue)
 
     def wait_for_queues(self):
         """Wait for Queues"""
@@ -61,7 +62,7 @@ class FileTransactor():
             thread.terminate()
         self.logger.debug("Finished Shutting down FileTransactor threads")
 
-    def run(self, filetracking_queue):
+    def run(self, filetracking_queue, filetracking_condition):
         """Run"""
 
         self.logger.debug("%s: Starting FileTransactor Thread Runner.", self._get_name())
@@ -73,11 +74,11 @@ class FileTransactor():
                 return
 
             self.logger.debug("%s: Pulled File Transaction Batch: %s QueueSize: %s ", self._get_name(), FileTransactor.count, FileTransactor.queue.qsize())
-            self.download_file(sub_type, filetracking_queue)
+            self.download_file(sub_type, filetracking_queue, filetracking_condition)
             FileTransactor.queue.task_done()
         #EOFError
 
-    def download_file(self, sub_type, filetracking_queue):
+    def download_file(self, sub_type, filetracking_queue, filetracking_condition):
         """Download File"""
 
         filepath = sub_type.get_filepath()
@@ -87,15 +88,23 @@ class FileTransactor():
 
         self.logger.debug("%s: Checking whether the file is currently downloading: %s", self._get_name(), url_to_download)
 
-        if url_to_download in filetracking_queue:
-            self.logger.debug("%s: The file is already downloading, waiting for it to finish: %s", self._get_name(), url_to_download)
-            while url_to_download in filetracking_queue:
-                sleep(1)
+        with filetracking_condition:
+            already_downloading = url_to_download in filetracking_queue
+            if already_downloading:
+                self.logger.debug("%s: The file is already downloading, waiting for it to finish: %s", self._get_name(), url_to_download)
+                filetracking_condition.wait_for(lambda: url_to_download not in filetracking_queue)
+            else:
+                filetracking_queue.append(url_to_download)
+
+        if already_downloading:
             self.logger.debug("%s: File no longer downloading, proceeding: %s", self._get_name(), url_to_download)
             sub_type.get_data()
         else:
             self.logger.debug("%s: File not currently downloading, initiating download: %s", self._get_name(), url_to_download)
-            filetracking_queue.append(url_to_download)
-            sub_type.get_data()
-            self.logger.debug("%s: Download complete. Removing item from download queue: %s", self._get_name(), url_to_download)
-            filetracking_queue.remove(url_to_download)
+            try:
+                sub_type.get_data()
+            finally:
+                self.logger.debug("%s: Download complete. Removing item from download queue: %s", self._get_name(), url_to_download)
+                with filetracking_condition:
+                    filetracking_queue.remove(url_to_download)
+                    filetracking_condition.notify_all()
@@ -0,0 +1,256 @@
+"""Import Template"""
+
+import re
+
+from scheduler import WriteLocks
+
+
+class ImportTemplate():
+    """A LOAD CSV query template translated to neo4j-admin database import rows
+
+    Only templates made of these clauses (inside CALL { WITH row ... }) are
+    translated, parse returns None for anything else:
+
+        MATCH (v:Label {key: row.column})
+        MERGE (v:Label:... {key: row.column})
+        MERGE (a)-[r:TYPE {property: value, ...}]->(b)
+        SET / ON CREATE SET v.property = value, ...
+
+    where value is row.column, a literal, or row.column converted by
+    toBoolean, toInteger, apoc.number.parseInt, toFloat or toString.
+    ON MATCH SET is left out, as the import creates every node once. Only
+    labels the import creates may be matched or merged, so no relationship
+    points at a node that is only created later. Unlike in Cypher, a missing
+    matched node only drops its relationships, not the nodes of its row, and
+    a MATCH only used as a filter is left out.
+
+    A node's global ID is its first label and its key, e.g. Gene:FB:FBgn0000001.
+    """
+
+    comment_pattern = re.compile(r'^\s*//.*$', re.MULTILINE)
+    header_pattern = re.compile(r"^\s*LOAD\s+CSV\s+WITH\s+HEADERS\s+FROM\s+'[^']*'\s+AS\s+row\s+"
+                                r"CALL\s*\{\s*WITH\s+row\b(.*)\}\s*IN\s+TRANSACTIONS\s+OF\s+\S+\s+ROWS\s*$",
+                                re.IGNORECASE | re.DOTALL)
+    clause_pattern = re.compile(r'(?<![.\w])(ON\s+CREATE\s+SET|ON\s+MATCH\s+SET|OPTIONAL\s+MATCH|MATCH|MERGE|'
+                                r'CREATE|SET|REMOVE|DETACH|DELETE|WITH|UNWIND|CALL|RETURN|FOREACH|WHERE|USING)\b',
+                                re.IGNORECASE)
+    node_pattern = re.compile(r'\(\s*(\w+)\s*((?::\s*\w+\s*)+)\{\s*(\w+)\s*:\s*row\.(\w+)\s*\}\s*\)')
+    relationship_pattern = re.compile(r'\(\s*(\w+)\s*\)\s*(<?)-\s*\[\s*(\w*)\s*:\s*(\w+)\s*(?:\{(.*)\})?\s*\]'
+                                      r'\s*-(>?)\s*\(\s*(\w+)\s*\)', re.DOTALL)
+    value = (r"(?:row\.(\w+)|(toBoolean|toInteger|apoc\.number\.parseInt|toFloat|toString)\(\s*row\.(\w+)\s*\)"
+             r"|'([^'\\]*)'|\"([^\"\\]*)\"|(-?\d+\.\d+)|(-?\d+)|(true|false))")
+    assignment_pattern = re.compile(r'\s*(\w+)\.(\w+)\s*=\s*' + value + r'\s*(?:,|$)', re.IGNORECASE)
+    map_pattern = re.compile(r'\s*(\w+)\s*:\s*' + value + r'\s*(?:,|$)', re.IGNORECASE)
+
+    conversion_types = {'toboolean': 'boolean', 'tointeger': 'long', 'apoc.number.parseint': 'long',
+                        'tofloat': 'double', 'tostring': 'string'}
+
+    def __init__(self):
+        # variable: {'labels': [...], 'key': column, 'properties': {name: value}}
+        self.nodes = {}
+        self.matched = {}
+        # [{'start': variable, 'end': variable, 'type': type, 'keys': {name: value}, 'properties': {name: value}}]
+        self.relationships = []
+        self.named_relationships = {}
+
+    @classmethod
+    def get_created_labels(cls, query):
+        """Return the labels of the nodes a query template merges or creates, translatable or not."""
+        labels = set()
+        clauses = WriteLocks.clause_pattern.split(query)
+        for keyword, text in zip(clauses[1::2], clauses[2::2]):
+            if keyword.upper() in ('MERGE', 'CREATE'):
+                for (_, node_labels) in WriteLocks.node_pattern.findall(text):
+                    labels.update(WriteLocks.label_pattern.findall(node_labels))
+        return labels
+
+    @classmethod
+    def parse_value(cls, match, offset):
+        """Return the (kind, value, type) of a value matched at group offset."""
+        (column, conversion, converted_column, single_quoted, double_quoted,
+         double, long, boolean) = match.groups()[offset:offset + 8]
+        if column is not None:
+            return ('column', column, 'string')
+        if conversion is not None:
+            return ('column', converted_column, cls.conversion_types[conversion.lower()])
+        if single_quoted is not None or double_quoted is not None:
+            return ('literal', single_quoted if single_quoted is not None else double_quoted, 'string')
+        if double is not None:
+            return ('literal', double, 'double')
+        if long is not None:
+            return ('literal', long, 'long')
+        return ('literal', boolean.lower(), 'boolean')
+
+    @classmethod
+    def parse_list(cls, pattern, text):
+        """Return the matches of pattern covering all of a comma separated text, None if something else is left."""
+        matches = []
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = pattern.match(text, position)
+            if match is None or match.end() == position:
+                return None
+            matches.append(match)
+            position = match.end()
+        return matches
+
+    @classmethod
+    def parse(cls, query, import_labels=None):
+        """Return the ImportTemplate of a query, None if it can not be translated.
+
+        import_labels are the labels the import creates, None to not check them.
+        """
+        header = cls.header_pattern.match(cls.comment_pattern.sub('', query))
+        if header is None:
+            return None
+
+        template = cls()
+        clauses = cls.clause_pattern.split(header.group(1))
+        if clauses[0].strip():
+            return None
+        for keyword, text in zip(clauses[1::2], clauses[2::2]):
+            keyword = ' '.join(keyword.upper().split())
+            text = text.strip()
+            if keyword in ('MATCH', 'MERGE'):
+                if template.parse_pattern(keyword, text) is None:
+                    return None
+            elif keyword in ('SET', 'ON CREATE SET', 'ON MATCH SET'):
+                assignments = cls.parse_list(cls.assignment_pattern, text)
+                if assignments is None:
+                    return None
+                for assignment in assignments:
+                    # Matched nodes are not created by this template, so their properties can not be set.
+                    target = template.nodes.get(assignment.group(1))
+                    if target is None:
+                        target = template.named_relationships.get(assignment.group(1))
+                    if target is None:
+                        return None
+                    if keyword != 'ON MATCH SET':
+                        target['properties'][assignment.group(2)] = cls.parse_value(assignment, 2)
+            else:
+                return None
+
+        if not template.nodes and not template.relationships:
+            return None
+        if import_labels is not None:
+            ends = [template.get_node(relationship[end]) for relationship in template.relationships for end in ('start', 'end')]
+            if any(node['labels'][0] not in import_labels for node in list(template.nodes.values()) + ends):
+                return None
+        return template
+
+    def parse_pattern(self, keyword, text):
+        """Add the node or relationship of a MATCH or MERGE clause, returns it or None if it can not be translated."""
+        node = self.node_pattern.fullmatch(text)
+        if node is not None:
+            (name, labels, key, column) = node.groups()
+            labels = [label.strip() for label in labels.split(':') if label.strip()]
+            if name in self.nodes or name in self.matched:
+                return None
+            entity = {'name': name, 'labels': labels, 'key': key, 'column': column, 'properties': {}}
+            if keyword == 'MATCH':
+                self.matched[name] = entity
+            else:
+                entity['properties'][key] = ('column', column, 'string')
+                self.nodes[name] = entity
+            return entity
+
+        relationship = self.relationship_pattern.fullmatch(text)
+        if relationship is None or keyword != 'MERGE':
+            return None
+        (start, incoming, name, relationship_type, keys, outgoing, end) = relationship.groups()
+        if incoming and outgoing:
+            return None
+        if incoming:
+            (start, end) = (end, start)
+        known = set(self.nodes) | set(self.matched)
+        if start not in known or end not in known:
+            return None
+        entity = {'name': name, 'start': start, 'end': end, 'type': relationship_type, 'keys': {}, 'properties': {}}
+        if keys is not None:
+            matches = self.parse_list(self.map_pattern, keys)
+            if matches is None:
+                return None
+            for match in matches:
+                entity['keys'][match.group(1)] = self.parse_value(match, 1)
+                entity['properties'][match.group(1)] = entity['keys'][match.group(1)]
+        self.relationships.append(entity)
+        if name:
+            self.named_relationships[name] = entity
+        return entity
+
+    def get_labels(self):
+        """Return the labels of the nodes the template creates (by their ID label)."""
+        return set(node['labels'][0] for node in self.nodes.values())
+
+    def get_node(self, name):
+        """Return a merged or matched node."""
+        return self.nodes.get(name) or self.matched[name]
+
+    def get_node_id(self, name, row):
+        """Return the global ID of a node for a row, None if its key is missing."""
+        node = self.get_node(name)
+        key = row.get(node['column'])
+        if key is None or key == '':
+            return None
+        return "%s:%s" % (node['labels'][0], key)
+
+    @staticmethod
+    def convert(value, value_type):
+        """Convert a value like the Cypher conversion would, to its text in an import file."""
+        if value is None or value == '':
+            return None
+        if value_type == 'boolean':
+            text = str(value).lower()
+            return text if text in ('true', 'false') else None
+        if value_type == 'long':
+            try:
+                return str(int(value))
+            except ValueError:
+                try:
+                    return str(int(float(value)))
+                except ValueError:
+                    return None
+        if value_type == 'double':
+            try:
+                return str(float(value))
+            except ValueError:
+                return None
+        return str(value)
+
+    def get_values(self, properties, row):
+        """Return the import file values of properties for a row."""
+        values = []
+        for (kind, value, value_type) in properties.values():
+            values.append(self.convert(row.get(value) if kind == 'column' else value, value_type))
+        return values
+
+    @staticmethod
+    def get_header(properties):
+        """Return the import file header columns of properties."""
+        return [name if value_type == 'string' else "%s:%s" % (name, value_type)
+                for name, (_, _, value_type) in properties.items()]
+
+    def get_node_header(self, name):
+        """Return the import file header of a node."""
+        return ['id:ID', ':LABEL'] + self.get_header(self.nodes[name]['properties'])
+
+    def get_node_line(self, name, row):
+        """Return the import file line of a node for a row, None if it has no key."""
+        node_id = self.get_node_id(name, row)
+        if node_id is None:
+            return None
+        return [node_id, ';'.join(self.nodes[name]['labels'])] + self.get_values(self.nodes[name]['properties'], row)
+
+    def get_relationship_header(self, index):
+        """Return the import file header of a relationship."""
+        return [':START_ID', ':END_ID', ':TYPE'] + self.get_header(self.relationships[index]['properties'])
+
+    def get_relationship_line(self, index, row):
+        """Return the import file line of a relationship for a row, None if a node is missing."""
+        relationship = self.relationships[index]
+        start = self.get_node_id(relationship['start'], row)
+        end = self.get_node_id(relationship['end'], row)
+        if start is None or end is None:
+            return None
+        return [start, end, relationship['type']] + self.get_values(relationship['properties'], row)
@@ -0,0 +1,195 @@
+"""Import Transactor"""
+
+from contextlib import ExitStack
+import csv
+import logging
+import os
+import posixpath
+import shlex
+import subprocess
+import sys
+
+from .import_template import ImportTemplate
+
+
+class ImportTransactor():
+    """Writes the rows of the generators as neo4j-admin database import files
+
+    With --bulk-import, the ETLs listed in BULK_IMPORT_ETLS write the rows
+    of the queries ImportTemplate can translate as node and relationship
+    files in tmp/import instead of CSV files for LOAD CSV, and build_store
+    creates a new database from all of them in one offline pass. Queries
+    that can not be translated are written as CSV files as usual and are
+    loaded afterwards.
+
+    Every process writes its own files, each with its header on the first
+    line. Duplicate nodes are skipped by neo4j-admin, duplicate
+    relationships are left out while writing.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    import_dir = os.path.join('tmp', 'import')
+    import_labels = set()
+    etl_names = set()
+    # Set in each ETL process, see select.
+    enabled = False
+    file_count = 0
+
+    @staticmethod
+    def get_import_labels(templates):
+        """Return the labels only created by query templates that can be translated
+
+        Relationships may only point at nodes of those labels, so a label
+        created by any template that can not be translated is left out,
+        until no template changes that any more.
+        """
+        import_labels = set()
+        for template in templates:
+            parsed = ImportTemplate.parse(template)
+            if parsed is not None:
+                import_labels.update(parsed.get_labels())
+
+        changed = True
+        while changed:
+            changed = False
+            for template in templates:
+                created_labels = ImportTemplate.get_created_labels(template) & import_labels
+                if created_labels and ImportTemplate.parse(template, import_labels) is None:
+                    import_labels = import_labels - created_labels
+                    changed = True
+        return import_labels
+
+    @staticmethod
+    def set_etl_names(etl_names, etl_classes):
+        """Set which ETLs write import files, and find the labels they import from the query templates of their classes
+
+        Removes the import files of an earlier run. Must be called before the ETLs are forked.
+        """
+        templates = [value for etl_class in etl_classes for value in vars(etl_class).values()
+                     if isinstance(value, str) and 'LOAD CSV' in value]
+        ImportTransactor.etl_names = set(etl_names)
+        ImportTransactor.import_labels = ImportTransactor.get_import_labels(templates)
+        ImportTransactor.logger.info("Importing %s of: %s", ", ".join(sorted(ImportTransactor.import_labels)),
+                                     ", ".join(sorted(etl_names)))
+
+        os.makedirs(ImportTransactor.import_dir, exist_ok=True)
+        for file_name in os.listdir(ImportTransactor.import_dir):
+            if file_name.startswith(('nodes-', 'relationships-')):
+                os.remove(os.path.join(ImportTransactor.import_dir, file_name))
+
+    @staticmethod
+    def select(etl_name):
+        """Write import files for the rows of this process if etl_name is imported"""
+
+        ImportTransactor.enabled = etl_name in ImportTransactor.etl_names
+
+    @staticmethod
+    def save_rows_static(generator, generator_file_list):
+        """Write the rows of the queries that can be imported to import files
+
+        Takes those queries out of generator_file_list and returns a
+        generator yielding the rows of the remaining ones, for their CSV files.
+        """
+
+        templates = [ImportTemplate.parse(query, ImportTransactor.import_labels) for [query, file_name] in generator_file_list]
+        imported = [(index, template) for index, template in enumerate(templates) if template is not None]
+        if not imported:
+            return generator
+
+        ImportTransactor.logger.info("Writing import files instead of: %s",
+                                     ", ".join(generator_file_list[index][1] for index, _ in imported))
+        remaining = [index for index, template in enumerate(templates) if template is None]
+        generator_file_list[:] = [generator_file_list[index] for index in remaining]
+        return ImportTransactor.write_rows(generator, imported, remaining)
+
+    @staticmethod
+    def open_file(stack, kind, name, header):
+        """Open a new import file in this process and write its header, returns its CSV writer"""
+
+        ImportTransactor.file_count = ImportTransactor.file_count + 1
+        file_name = "%s-%s-%s-%s.csv" % (kind, os.getpid(), ImportTransactor.file_count, name)
+        import_file = stack.enter_context(open(os.path.join(ImportTransactor.import_dir, file_name), 'w', encoding='utf-8'))
+        writer = csv.writer(import_file)
+        writer.writerow(header)
+        return writer
+
+    @staticmethod
+    def write_rows(generator, imported, remaining):
+        """Write the rows of the imported templates, yielding the rows of the remaining queries"""
+
+        with ExitStack() as stack:
+            # (template, index, kind, name, writer, hashes of what was written)
+            outputs = []
+            for (index, template) in imported:
+                for name in template.nodes:
+                    writer = ImportTransactor.open_file(stack, 'nodes', name, template.get_node_header(name))
+                    outputs.append((template, index, 'nodes', name, writer, set()))
+                for relationship_index, relationship in enumerate(template.relationships):
+                    writer = ImportTransactor.open_file(stack, 'relationships', relationship['type'],
+                                                        template.get_relationship_header(relationship_index))
+                    outputs.append((template, index, 'relationships', relationship_index, writer, set()))
+
+            for generator_entry in generator:
+                for (template, index, kind, name, writer, written) in outputs:
+                    for row in generator_entry[index]:
+                        if row is None:
+                            continue
+                        if kind == 'nodes':
+                            line = template.get_node_line(name, row)
+                            identity = None if line is None else hash(line[0])
+                        else:
+                            line = template.get_relationship_line(name, row)
+                            keys = template.relationships[name]['keys']
+                            identity = None if line is None else hash(tuple(line[:2]) + tuple(template.get_values(keys, row)))
+                        if line is None or identity in written:
+                            continue
+                        written.add(identity)
+                        writer.writerow(line)
+
+                yield [generator_entry[index] for index in remaining]
+
+    @staticmethod
+    def get_import_command(admin_command, neo4j_import_dir, database):
+        """Return the neo4j-admin command importing all files in tmp/import into a new database
+
+        neo4j_import_dir is where Neo4j sees the loader's tmp directory, as for LOAD CSV.
+        """
+
+        command = shlex.split(admin_command or 'neo4j-admin') + [
+            'database', 'import', 'full',
+            '--overwrite-destination=true',
+            '--skip-duplicate-nodes=true',
+            '--skip-bad-relationships=true',
+            '--multiline-fields=true']
+        for file_name in sorted(os.listdir(ImportTransactor.import_dir)):
+            path = posixpath.join(neo4j_import_dir, 'import', file_name)
+            if file_name.startswith('nodes-'):
+                command.append('--nodes=' + path)
+            elif file_name.startswith('relationships-'):
+                command.append('--relationships=' + path)
+        command.append(database)
+        return command
+
+    @staticmethod
+    def build_store(admin_command, neo4j_import_dir, database='neo4j'):
+        """Create the database from the import files with neo4j-admin, Neo4j must be stopped
+
+        Without an admin_command the command is only written to tmp/import/import.sh, to run by hand.
+        """
+
+        command = ImportTransactor.get_import_command(admin_command, neo4j_import_dir, database)
+        script_name = os.path.join(ImportTransactor.import_dir, 'import.sh')
+        with open(script_name, 'w', encoding='utf-8') as script:
+            script.write("#!/bin/sh\n" + " ".join(shlex.quote(part) for part in command) + "\n")
+
+        if not admin_command:
+            ImportTransactor.logger.warning("NEO4J_ADMIN_COMMAND is not set, build the database by running %s with Neo4j stopped.",
+                                            script_name)
+            return
+
+        ImportTransactor.logger.info("Building the database with neo4j-admin, see %s", script_name)
+        result = subprocess.run(command, check=False)
+        if result.returncode != 0:
+            ImportTransactor.logger.critical("neo4j-admin database import failed with exit code %s", result.returncode)
+            sys.exit(-1)
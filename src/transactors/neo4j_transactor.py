@@ -2,11 +2,14 @@
 
 import logging
 import multiprocessing
-import pickle
+import os
+import random
 import time
 from neo4j import GraphDatabase
-from etl import ETL
+from neo4j.exceptions import DriverError, Neo4jError
 from loader_common import ContextInfo
+from scheduler import (CommitSizes, DeadLetterJournal, Notification, PendingBatches, ProcessWaiter, QueryMetrics,
+                       RunManifest, TransactionJournal, TransactorQueue, WorkerPool, WriteLocks)
 
 
 class Neo4jTransactor():
@@ -15,6 +18,22 @@ class Neo4jTransactor():
     logger = logging.getLogger(__name__)
     count = 0
     queue = None
+    pending_batches = None
+    batch_finished = None
+    batch_owner = None
+    batch_priority = TransactorQueue.LOW
+    batch_partition = None
+    submit_gate = None
+    write_locks = None
+    # During a bulk import, batches are only recorded in the run manifest, to load with --resume.
+    defer_batches = False
+
+    # How many batches a worker may set aside while their write locks are taken.
+    max_deferred_batches = 2
+
+    # Transient errors are retried after base * 2^attempt seconds (capped, with jitter).
+    retry_base_delay = 1
+    retry_max_delay = 60
 
     def __init__(self):
         self.thread_pool = []
@@ -27,9 +46,10 @@ class Neo4jTransactor():
     def start_threads(self, thread_count):
         """Start Threads"""
 
-        manager = multiprocessing.Manager()
-        queue = manager.Queue()
-        Neo4jTransactor.queue = queue
+        Neo4jTransactor.queue = TransactorQueue()
+        Neo4jTransactor.pending_batches = PendingBatches()
+        Neo4jTransactor.batch_finished = Notification()
+        Neo4jTransactor.write_locks = WriteLocks()
 
         for i in range(0, thread_count):
             process = multiprocessing.Process(target=self.run, name=str(i))
@@ -45,17 +65,98 @@ class Neo4jTransactor():
         self.logger.info("Finished Shutting down Neo4jTransactor threads")
 
     @staticmethod
-    def execute_query_batch(query_batch):
-        """Execture Query Batch"""
+    def set_batch_owner(owner, submit_gate=None, priority=TransactorQueue.LOW):
+        """Set the name (e.g. the ETL) that query batches from this process are tracked under
+
+        If submit_gate (a multiprocessing Event) is given, query batches are held
+        back until it is set, so the CSV files can be written ahead of time.
+        The batches are queued with the given TransactorQueue priority.
+        """
+
+        Neo4jTransactor.batch_owner = owner
+        Neo4jTransactor.submit_gate = submit_gate
+        Neo4jTransactor.batch_priority = priority
+
+    @staticmethod
+    def set_batch_partition(partition):
+        """Set the data provider the query batches from this process are limited to, see WriteLocks"""
+
+        Neo4jTransactor.batch_partition = partition
+
+    @staticmethod
+    def execute_query_batch(query_batch, priority=None):
+        """Execture Query Batch
+
+        priority overrides the priority set with set_batch_owner, e.g. to let
+        small metadata queries jump ahead of the bulk loads.
+        Returns the key of the queued batch, for wait_for_batch, None if nothing was queued.
+        """
+
+        if len(query_batch) == 0:
+            return None
+
+        if RunManifest.acknowledged_queries:
+            # Resuming a load, so skip what Neo4j already acknowledged.
+            query_batch = [query for query in query_batch if not RunManifest.is_acknowledged(query[0], query[1])]
+            if len(query_batch) == 0:
+                Neo4jTransactor.logger.info("Query Batch already loaded, skipping")
+                return None
+
+        if Neo4jTransactor.is_submit_gate_closed():
+            Neo4jTransactor.logger.info("Waiting for %s to be scheduled before loading", Neo4jTransactor.batch_owner)
+            # Don't hold a worker slot or memory while waiting, the ETLs we wait for may need them.
+            WorkerPool.pause_job()
+            Neo4jTransactor.submit_gate.wait()
+            WorkerPool.resume_job()
+
+        if Neo4jTransactor.defer_batches:
+            RunManifest.record('batch_submitted', etl=Neo4jTransactor.batch_owner, queries=[query[:2] for query in query_batch])
+            return None
 
         Neo4jTransactor.count = Neo4jTransactor.count + 1
         Neo4jTransactor.logger.debug("Adding Query Batch: %s BatchSize: %s QueueSize: %s ", Neo4jTransactor.count, len(query_batch), Neo4jTransactor.queue.qsize())
-        Neo4jTransactor.queue.put((query_batch, Neo4jTransactor.count))
+        batch_key = (Neo4jTransactor.batch_owner, os.getpid(), Neo4jTransactor.count)
+        Neo4jTransactor.pending_batches.add(batch_key)
+        # Without the rows of parameter queries, those are not kept on disk and need their ETL to run again.
+        RunManifest.record('batch_submitted', etl=Neo4jTransactor.batch_owner, queries=[query[:2] for query in query_batch])
+        if priority is None:
+            priority = Neo4jTransactor.batch_priority
+        lock_keys = WriteLocks.get_lock_keys(query_batch, Neo4jTransactor.batch_partition)
+        Neo4jTransactor.queue.put((query_batch, Neo4jTransactor.count, batch_key, lock_keys, time.time()), priority)
+        return batch_key
+
+    @staticmethod
+    def is_submit_gate_closed():
+        """Check whether query batches of this process are held back until it is scheduled, see set_batch_owner"""
+
+        return Neo4jTransactor.submit_gate is not None and not Neo4jTransactor.submit_gate.is_set()
+
+    @staticmethod
+    def wait_for_batch(batch_key):
+        """Wait until the query batch queued under batch_key finished (or failed), see execute_query_batch"""
+
+        if batch_key is not None:
+            Neo4jTransactor.pending_batches.wait(batch_key)
+
+    @staticmethod
+    def has_pending_batches(owner):
+        """Check whether any query batch submitted under owner has not finished yet
+
+        Neo4jTransactor.batch_finished is sent every time a batch finishes.
+        """
+
+        return Neo4jTransactor.pending_batches.has_owner(owner)
 
     def check_for_thread_errors(self):
         """Check for Thread Errors"""
 
-        ETL.wait_for_threads(self.thread_pool, Neo4jTransactor.queue)
+        ProcessWaiter.wait_for_processes(self.thread_pool, Neo4jTransactor.queue)
+
+    @staticmethod
+    def get_queue_stats():
+        """Return the depth per priority and wait times of the query batch queue, for the logs"""
+
+        return Neo4jTransactor.queue.describe_stats()
 
     @staticmethod
     def wait_for_queues():
@@ -63,63 +164,189 @@ class Neo4jTransactor():
 
         Neo4jTransactor.queue.join()
 
+    @staticmethod
+    def is_transient(error):
+        """Check whether a failed query can succeed when retried
+
+        e.g. deadlocks, lock timeouts, leader switches and lost connections.
+        Anything else (syntax errors, constraint violations, ...) fails again.
+        """
+
+        return isinstance(error, (Neo4jError, DriverError)) and error.is_retryable()
+
+    @staticmethod
+    def is_memory_error(error):
+        """Check whether a query failed because its transactions needed too much memory"""
+
+        return isinstance(error, Neo4jError) and error.code is not None \
+            and ('OutOfMemory' in error.code or 'MemoryLimit' in error.code)
+
+    @staticmethod
+    def get_query_rows(query):
+        """Return the rows (None for a CSV file) and the row count (None if unknown) of a query of a batch
+
+        Queries are [query, file name], [query, file name, rows] from the
+        ParameterTransactor or [query, file name, None, row count] from the
+        CSVTransactor, which counted the rows it wrote to the file.
+        """
+
+        rows = query[2] if len(query) > 2 else None
+        if rows is not None:
+            return (rows, len(rows))
+        return (None, query[3] if len(query) > 3 else None)
+
+    @staticmethod
+    def get_retry_delay(attempt):
+        """Get the seconds to wait before retry number attempt (starting at 0)"""
+
+        delay = min(Neo4jTransactor.retry_max_delay, Neo4jTransactor.retry_base_delay * 2 ** attempt)
+        # Jitter, so transactors that deadlocked on each other do not retry in lockstep.
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def run_query(self, graph, neo4j_query, max_retries, rows=None, row_count=None):
+        """Run a query, retrying transient errors. Raises the error once it is permanent or retries run out
+
+        rows are passed as the $rows parameter of queries from the ParameterTransactor.
+        The commit size of the query is taken from CommitSizes, which learns from every run.
+        Without a graph (USING_PICKLE) the query is not run.
+        Returns the query as it ran and its ResultSummary (None if not run).
+        """
+
+        attempt = 0
+        while True:
+            (sized_query, commit_size) = CommitSizes.get_query(neo4j_query)
+            try:
+                summary = None
+                if graph is not None:
+                    start = time.time()
+                    with graph.session() as session:
+                        if rows is None:
+                            summary = session.run(sized_query).consume()
+                        else:
+                            summary = session.run(sized_query, rows=rows).consume()
+                    self.record_query_run(neo4j_query, commit_size, row_count, time.time() - start)
+                return (sized_query, summary)
+            except Exception as error:
+                delay = self.get_error_retry_delay(error, neo4j_query, commit_size, attempt, max_retries)
+                if delay is None:
+                    raise
+                attempt = attempt + 1
+                time.sleep(delay)
+
+    def record_query_run(self, neo4j_query, commit_size, row_count, seconds):
+        """Teach CommitSizes how long a query took"""
+
+        if commit_size is not None and row_count is not None:
+            CommitSizes.record(neo4j_query, commit_size, row_count, seconds)
+
+    def get_error_retry_delay(self, error, neo4j_query, commit_size, attempt, max_retries):
+        """Return the seconds to wait before retrying a failed query, None if it is not retried"""
+
+        if self.is_memory_error(error):
+            CommitSizes.record_memory_failure(neo4j_query, commit_size)
+        if attempt >= max_retries or not self.is_transient(error):
+            return None
+        delay = self.get_retry_delay(attempt)
+        self.logger.warning("%s: Transient error, retry %s of %s in %.1fs: %s", self._get_name(), attempt + 1, max_retries, delay, error)
+        return delay
+
+    def get_next_batch(self, deferred):
+        """Get the next query batch whose write locks are free, taking its locks
+
+        Batches conflicting with the running ones are set aside in deferred
+        and started once their locks are released, while the worker goes on
+        with other batches from the queue.
+        """
+
+        while True:
+            release_count = Neo4jTransactor.write_locks.get_release_count()
+            for batch in deferred:
+                if Neo4jTransactor.write_locks.acquire(batch[3]):
+                    deferred.remove(batch)
+                    return batch
+
+            if len(deferred) < Neo4jTransactor.max_deferred_batches:
+                # Only block on the queue when there is nothing set aside to come back to.
+                batch = Neo4jTransactor.queue.get(block=len(deferred) == 0)
+                if batch is not None:
+                    if Neo4jTransactor.write_locks.acquire(batch[3]):
+                        return batch
+                    self.logger.debug("%s: Query Batch %s waits for write locks: %s", self._get_name(), batch[1], sorted(batch[3]))
+                    deferred.append(batch)
+                    continue
+
+            # New batches are taken by the idle workers, but check the queue now and then.
+            Neo4jTransactor.write_locks.wait_for_release(release_count, timeout=1)
+
+    def fail_batch(self, batch, error):
+        """Move the first query of a batch, and the rest of the batch, to the dead letter journal"""
+
+        (query_batch, _, batch_key, _, _) = batch
+        # The rest of the batch may depend on this query, so it is set aside with it, in order.
+        self.logger.error("%s: Query for file %s failed, moving it and the %s queries after it to the dead letter journal: %s",
+                          self._get_name(), query_batch[0][1], len(query_batch) - 1, error)
+        DeadLetterJournal.record(batch_key[0], query_batch, error)
+        del query_batch[:]
+
+    def finish_query(self, batch, batch_start, start, result):
+        """Take the first query of a batch off it once it ran, recording it"""
+
+        (query_batch, query_counter, batch_key, _, submitted) = batch
+        (sized_query, summary) = result
+        (neo4j_query, filename) = query_batch[0][:2]
+        (rows, row_count) = self.get_query_rows(query_batch[0])
+        query_batch.pop(0)
+        RunManifest.record('query_acknowledged', query=RunManifest.get_query_key(neo4j_query, filename))
+
+        elapsed_time = time.time() - start
+        TransactionJournal.record(batch_key[0], "%s-%s-%s" % batch_key, sized_query, filename, rows, elapsed_time)
+        # Waiting in the queue and for write locks.
+        queue_seconds = batch_start - submitted
+        QueryMetrics.record(batch_key[0], neo4j_query, filename, queue_seconds, elapsed_time, row_count, summary)
+        self.logger.info("%s: Processed query for file: %s QueryNum: %s QueueSize: %s Time: %s", self._get_name(), filename, query_counter, Neo4jTransactor.queue.qsize(), time.strftime("%H:%M:%S", time.gmtime(elapsed_time)))
+
+    def finish_batch(self, batch, batch_start):
+        """Release the write locks of a batch and mark it done"""
+
+        (_, query_counter, batch_key, lock_keys, _) = batch
+        batch_elapsed_time = time.time() - batch_start
+        self.logger.debug("%s: Query Batch finished: %s Time: %s", self._get_name(), query_counter, time.strftime("%H:%M:%S", time.gmtime(batch_elapsed_time)))
+        Neo4jTransactor.write_locks.release(lock_keys)
+        Neo4jTransactor.pending_batches.remove(batch_key)
+        Neo4jTransactor.batch_finished.notify()
+        Neo4jTransactor.queue.task_done()
+
     def run(self):
         """Run"""
 
         context_info = ContextInfo()
+        max_retries = int(context_info.env["NEO4J_QUERY_RETRIES"])
+        graph = None
 
         if context_info.env["USING_PICKLE"] is False:
             uri = "bolt://" + context_info.env["NEO4J_HOST"] + ":" + str(context_info.env["NEO4J_PORT"])
             graph = GraphDatabase.driver(uri, auth=("neo4j", "neo4j"), max_connection_pool_size=-1, fetch_size=10000)
 
         self.logger.info("%s: Starting Neo4jTransactor Thread Runner: ", self._get_name())
+        deferred = []
         while True:
-            try:
-                (query_batch, query_counter) = Neo4jTransactor.queue.get()
-            except EOFError as error:
-                self.logger.info("Queue Closed exiting: %s", error)
-                return
-
-            self.logger.debug("%s: Processing query batch: %s BatchSize: %s", self._get_name(), query_counter, len(query_batch))
+            batch = self.get_next_batch(deferred)
+            query_batch = batch[0]
+            self.logger.debug("%s: Processing query batch: %s BatchSize: %s", self._get_name(), batch[1], len(query_batch))
             batch_start = time.time()
 
-            total_query_counter = 0
-
             while len(query_batch) > 0:
+                (neo4j_query, filename) = query_batch[0][:2]
+                (rows, row_count) = self.get_query_rows(query_batch[0])
 
-                (neo4j_query, filename) = query_batch.pop(0)
-
-                self.logger.debug("%s: Processing query for file: %s QueryNum: %s QueueSize: %s", self._get_name(), filename, query_counter, Neo4jTransactor.queue.qsize())
+                self.logger.debug("%s: Processing query for file: %s QueryNum: %s QueueSize: %s", self._get_name(), filename, batch[1], Neo4jTransactor.queue.qsize())
+                RunManifest.record('query_started', query=RunManifest.get_query_key(neo4j_query, filename))
                 start = time.time()
                 try:
-                    if context_info.env["USING_PICKLE"] is True:
-                        # Save VIA pickle rather then NEO
-                        file_name = "tmp/temp/transaction_%s_%s" % (query_counter, total_query_counter)
-                        with open(file_name, 'wb') as file:
-                            self.logger.debug("Writing to file: tmp/temp/transaction_%s_%s", query_counter, total_query_counter)
-                            pickle.dump(neo4j_query, file)
-                    else:
-                        with graph.session() as session:
-                            session.run(neo4j_query)
-
-                    end = time.time()
-                    elapsed_time = end - start
-                    self.logger.info("%s: Processed query for file: %s QueryNum: %s QueueSize: %s Time: %s", self._get_name(), filename, query_counter, Neo4jTransactor.queue.qsize(), time.strftime("%H:%M:%S", time.gmtime(elapsed_time)))
+                    result = self.run_query(graph, neo4j_query, max_retries, rows, row_count)
                 except Exception as error:
-                    self.logger.error(error)
-                    #self.logger.error("%s: Query Failed: %s", self._get_name(), neo4j_query)
-                    # TODO Extract and print NODE information from error message.
-                    # Would be helpful for troubleshooting.
-                    #TODO: write mechanism to prevent infinite retries on failure (can currently occur)
-                    self.logger.warning( "%s: Query Conflict, putting data back in Queue to run later. %s", self._get_name(), filename)
-                    query_batch.insert(0, (neo4j_query, filename))
-                    time.sleep(12)
-                    Neo4jTransactor.queue.put((query_batch, query_counter))
+                    self.fail_batch(batch, error)
                     break
+                self.finish_query(batch, batch_start, start, result)
 
-                total_query_counter = total_query_counter + 1
-
-            batch_end = time.time()
-            batch_elapsed_time = batch_end - batch_start
-            self.logger.debug("%s: Query Batch finished: %s BatchSize: %s Time: %s", self._get_name(), query_counter, len(query_batch), time.strftime("%H:%M:%S", time.gmtime(batch_elapsed_time)))
-            Neo4jTransactor.queue.task_done()
+            self.finish_batch(batch, batch_start)
@@ -0,0 +1,104 @@
+"""Parameter Transactor"""
+
+import logging
+import re
+
+from .neo4j_transactor import Neo4jTransactor
+
+
+class ParameterTransactor():
+    """Sends the rows of the generators straight to Neo4j as query parameters
+
+    Instead of writing CSV files for LOAD CSV, the LOAD CSV clause of each
+    query template is replaced by UNWIND $rows, and every batch the
+    generators yield becomes one query batch running the queries in order
+    on their rows. The ETLs listed in ETL_PARAMETER_LOADS use it.
+
+    Rows keep their types, so apoc.number.parseInt is replaced by toInteger,
+    which takes numbers as well as strings. Values stored without a
+    conversion keep their types too, e.g. numbers are no longer stored as
+    strings, which is why ETLs are switched over one by one.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    load_csv_pattern = re.compile(r"LOAD\s+CSV\s+WITH\s+HEADERS\s+FROM\s+'[^']*'\s+AS\s+(\w+)", re.IGNORECASE)
+    parse_int_pattern = re.compile(r'apoc\.number\.parseInt\(', re.IGNORECASE)
+
+    etl_names = set()
+    # Set in each ETL process, see select.
+    enabled = False
+
+    @staticmethod
+    def set_etl_names(etl_names):
+        """Set which ETLs load through parameters. Must be called before the ETLs are forked."""
+
+        if etl_names:
+            ParameterTransactor.logger.info("Loading through query parameters: %s", ", ".join(sorted(etl_names)))
+        ParameterTransactor.etl_names = set(etl_names)
+
+    @staticmethod
+    def select(etl_name):
+        """Use parameters for the rows of this process if etl_name loads through them"""
+
+        ParameterTransactor.enabled = etl_name in ParameterTransactor.etl_names
+
+    @staticmethod
+    def get_parameter_query(query):
+        """Return the query reading its rows from $rows instead of a CSV file, None if it does not load a CSV file"""
+
+        if ParameterTransactor.load_csv_pattern.search(query) is None:
+            return None
+
+        query = ParameterTransactor.load_csv_pattern.sub(r'UNWIND $rows AS \1', query, count=1)
+        return ParameterTransactor.parse_int_pattern.sub('toInteger(', query)
+
+    @staticmethod
+    def get_parameter_row(row):
+        """Return a row Neo4j takes as parameter. Values that are no plain types are sent as text, like in a CSV file"""
+
+        return {key: value if value is None or isinstance(value, (str, int, float, bool)) else str(value)
+                for key, value in row.items()}
+
+    @staticmethod
+    def save_rows_static(generator, generator_file_list, chunked=True):
+        """Send the rows of generator to Neo4j
+
+        Every generator batch is sent as a query batch while the rest is
+        parsed, and generator_file_list is emptied, as there are no CSV
+        files left to load. With chunked=False (see
+        CSVTransactor.save_file_static) nothing is sent: generator_file_list
+        is left with every query on the rows of every batch, each query on
+        all batches before the next query, as its CSV file would be loaded.
+        Returns False, without taking anything from the generator, if one of
+        the queries does not load a CSV file and can not take parameters.
+        """
+
+        queries = [ParameterTransactor.get_parameter_query(query) for [query, file_name] in generator_file_list]
+        if None in queries:
+            ParameterTransactor.logger.warning("Not all queries load a CSV file, writing CSV files instead")
+            return False
+
+        # With chunked=False, the queries on the rows of each batch, by query.
+        query_lists = [[] for _ in generator_file_list]
+        for batch_number, generator_entry in enumerate(generator):
+            query_batch = []
+            for index, individual_list in enumerate(generator_entry):
+                rows = [ParameterTransactor.get_parameter_row(row) for row in individual_list if row is not None]
+                if len(rows) == 0:
+                    continue
+                # Each batch stands in for its own CSV file, so the run manifest tells them apart.
+                file_name = "%s#%s" % (generator_file_list[index][1], batch_number)
+                if chunked:
+                    query_batch.append([queries[index], file_name, rows])
+                else:
+                    query_lists[index].append([queries[index], file_name, rows])
+
+            if query_batch:
+                Neo4jTransactor.execute_query_batch(query_batch)
+
+        if chunked:
+            del generator_file_list[:]
+        else:
+            generator_file_list[:] = [query for query_list in query_lists for query in query_list]
+        return True
@@ -0,0 +1,104 @@
+"""Row Filter"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+
+
+class RowFilter():
+    """Tells whether the key columns of a row were seen in an earlier row
+
+    Keys are kept as 16 byte hashes in a set, which is exact. Once there are
+    more than max_keys, they move to a SQLite file in the tmp directory,
+    with a Bloom filter in front of it: keys the filter has never seen are
+    new without a look at the file, and only the few it may have seen are
+    checked on disk. Memory stays bounded and no row is dropped by mistake.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Keys kept in memory before they spill to disk.
+    max_keys = 2000000
+    bloom_bits = 2 ** 27
+    bloom_hashes = 7
+
+    def __init__(self, key_columns):
+        self.key_columns = key_columns
+        self.keys = set()
+        self.database = None
+        self.database_file_name = None
+        self.bloom = None
+        self.dropped = 0
+
+    def get_key(self, row):
+        """Return the hash of the key columns of a row"""
+
+        values = tuple(row.get(column) for column in self.key_columns)
+        return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=16).digest()
+
+    def get_bloom_positions(self, key):
+        """Return the Bloom filter bits of a key, by double hashing its two halves"""
+
+        first = int.from_bytes(key[:8], 'little')
+        second = int.from_bytes(key[8:], 'little') | 1
+        return [(first + index * second) % self.bloom_bits for index in range(self.bloom_hashes)]
+
+    def add_to_bloom(self, key):
+        """Set the Bloom filter bits of a key"""
+
+        for position in self.get_bloom_positions(key):
+            self.bloom[position >> 3] |= 1 << (position & 7)
+
+    def may_be_in_bloom(self, key):
+        """Check whether all Bloom filter bits of a key are set"""
+
+        return all(self.bloom[position >> 3] & (1 << (position & 7)) for position in self.get_bloom_positions(key))
+
+    def spill(self):
+        """Move the keys from memory to a SQLite file behind a Bloom filter"""
+
+        self.logger.info("More than %s keys for %s, checking them on disk", self.max_keys, ", ".join(self.key_columns))
+        (file_descriptor, self.database_file_name) = tempfile.mkstemp(prefix='row_filter_', suffix='.sqlite', dir='tmp')
+        os.close(file_descriptor)
+        self.database = sqlite3.connect(self.database_file_name)
+        self.database.execute("PRAGMA journal_mode = OFF")
+        self.database.execute("PRAGMA synchronous = OFF")
+        self.database.execute("CREATE TABLE keys (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.database.executemany("INSERT INTO keys VALUES (?)", ((key,) for key in self.keys))
+        self.bloom = bytearray(self.bloom_bits // 8)
+        for key in self.keys:
+            self.add_to_bloom(key)
+        self.keys = set()
+
+    def is_new(self, row):
+        """Check whether no earlier row had the key of row, remembering it"""
+
+        key = self.get_key(row)
+        if self.database is None:
+            if key in self.keys:
+                self.dropped = self.dropped + 1
+                return False
+            self.keys.add(key)
+            if len(self.keys) > self.max_keys:
+                self.spill()
+            return True
+
+        if self.may_be_in_bloom(key) \
+                and self.database.execute("SELECT 1 FROM keys WHERE key = ?", (key,)).fetchone() is not None:
+            self.dropped = self.dropped + 1
+            return False
+        self.add_to_bloom(key)
+        self.database.execute("INSERT INTO keys VALUES (?)", (key,))
+        return True
+
+    def close(self):
+        """Forget the keys, removing the SQLite file if they spilled to disk"""
+
+        self.keys = set()
+        self.bloom = None
+        if self.database is not None:
+            self.database.close()
+            self.database = None
+            os.remove(self.database_file_name)
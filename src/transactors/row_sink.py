@@ -0,0 +1,163 @@
+"""Row Sink"""
+
+import logging
+import queue
+import re
+import threading
+import time
+
+from .csv_transactor import CSVTransactor
+
+
+class RowOutput():
+    """One named output of a RowSink, the rows loaded by one query"""
+
+    logger = logging.getLogger(__name__)
+
+    column_pattern = re.compile(r'\brow\.(\w+)')
+
+    def __init__(self, name, query, file_name):
+        self.name = name
+        self.query = query
+        self.file_name = file_name
+        # The columns the query reads, checked against the first row.
+        self.columns = sorted(set(self.column_pattern.findall(query)))
+        self.rows = []
+        self.row_count = 0
+
+    def add(self, row):
+        """Add a row (a dictionary of column -> value) to the next batch"""
+
+        if self.row_count == 0:
+            missing = [column for column in self.columns if column not in row]
+            if missing:
+                self.logger.warning("Rows of %s lack columns its query reads, loaded as null: %s",
+                                    self.name, ", ".join(missing))
+        self.rows.append(row)
+        self.row_count = self.row_count + 1
+
+    def take_rows(self):
+        """Return the rows of the batch, starting a new one"""
+
+        rows = self.rows
+        self.rows = []
+        return rows
+
+
+class RowSink():
+    """Named outputs for the rows of an ETL sub type, instead of yielding positional lists
+
+    Outputs are declared with add_output, in the order their queries run,
+    and the parser adds rows to them by name, ending each source record
+    with end_record:
+
+        sink = RowSink(batch_size)
+        sink.add_output('expression_entities', query, file_name)
+        with sink:
+            for record in records:
+                sink['expression_entities'].add({...})
+                sink.end_record()
+        Neo4jTransactor.execute_query_batch(sink.query_and_file_list)
+
+    Every batch_size records, the rows of all outputs are handed over as one
+    batch to CSVTransactor.save_file_static, running in a background thread
+    (so chunking, compression, dedup, parameter loads and bulk imports work
+    as for generators). Batches only end between records, so the rows of a
+    record are loaded together. At most max_batches wait to be written,
+    beyond that end_record waits. query_and_file_list is left with the
+    queries to load, as save_file_static leaves them.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Batches waiting for save_file_static before end_record waits.
+    max_batches = 2
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.outputs = []
+        self.outputs_by_name = {}
+        self.query_and_file_list = []
+        self.records = 0
+        self.batches = None
+        self.thread = None
+        self.finished = False
+        self.error = None
+        self.start_time = None
+        self.wait_seconds = 0
+
+    def add_output(self, name, query, file_name):
+        """Declare an output, whose rows query loads from file_name. Returns the output"""
+
+        output = RowOutput(name, query, file_name)
+        self.outputs.append(output)
+        self.outputs_by_name[name] = output
+        self.query_and_file_list.append([query, file_name])
+        return output
+
+    def __getitem__(self, name):
+        return self.outputs_by_name[name]
+
+    def get_batches(self):
+        """Yield the batches handed over, until the sink is closed"""
+
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                self.finished = True
+                return
+            yield batch
+
+    def run(self):
+        """Save the batches, taking them until the sink is closed even if saving fails"""
+
+        try:
+            CSVTransactor.save_file_static(self.get_batches(), self.query_and_file_list)
+        except Exception as error:
+            self.error = error
+        # So end_record and close never wait on a queue nobody takes from.
+        while not self.finished:
+            if self.batches.get() is None:
+                self.finished = True
+
+    def __enter__(self):
+        self.start_time = time.time()
+        self.batches = queue.Queue(self.max_batches)
+        self.finished = False
+        self.thread = threading.Thread(target=self.run, name="RowSink", daemon=True)
+        self.thread.start()
+        return self
+
+    def end_record(self):
+        """End the rows of a source record, handing the batch over every batch_size records"""
+
+        self.records = self.records + 1
+        if self.records >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Hand the rows added so far over as one batch"""
+
+        self.records = 0
+        batch = [output.take_rows() for output in self.outputs]
+        if not any(batch):
+            return
+        start = time.time()
+        self.batches.put(batch)
+        self.wait_seconds = self.wait_seconds + time.time() - start
+
+    def __exit__(self, error_type, error, traceback):
+        if error_type is None:
+            self.flush()
+        self.batches.put(None)
+        self.thread.join()
+        if error_type is not None:
+            return False
+
+        self.logger.info("%s rows in %.1fs, %.1fs of it waiting for the files to be written: %s",
+                         sum(output.row_count for output in self.outputs), time.time() - self.start_time,
+                         self.wait_seconds,
+                         ", ".join("%s %s" % (output.name, output.row_count) for output in self.outputs))
+        if self.error is not None:
+            raise self.error
+        return False